@@ -0,0 +1,333 @@
+import os
+import sys
+import json
+import time
+import signal
+import asyncio
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, Optional, Tuple
+
+from metrics import REGISTRY, inc, observe
+
+# Headless JSON API over the same pipeline as the UI and batch.py:
+#   POST /route   one OD query                  -> JSON (batch.py's per-pair record)
+#   POST /batch   {"pairs": [...], defaults}    -> NDJSON stream, one line per pair as it completes, then a summary
+#   POST /matrix  {"sources", "destinations"}   -> road distance/duration matrices
+#   GET  /health, /metrics
+# asyncio handles connections; each query runs on a bounded worker pool (the provider clients are blocking).
+API_HOST = os.environ.get('API_HOST', '127.0.0.1')
+API_PORT = int(os.environ.get('API_PORT', 8090))
+# Queries computed at once (worker threads, per process)
+API_WORKERS = int(os.environ.get('API_WORKERS', 16))
+# Server processes sharing the port (SO_REUSEPORT); scoring is CPU-bound Python, so one process tops out at one core
+API_PROCESSES = int(os.environ.get('API_PROCESSES', 1))
+# Queries admitted but waiting for a worker; beyond this /route and /matrix get 503 + Retry-After
+API_MAX_PENDING = int(os.environ.get('API_MAX_PENDING', 64))
+# Pairs of one /batch request in flight at once; the next pair starts only after a result line is flushed
+API_BATCH_IN_FLIGHT = int(os.environ.get('API_BATCH_IN_FLIGHT', 8))
+API_BATCH_MAX_PAIRS = int(os.environ.get('API_BATCH_MAX_PAIRS', 10000))
+API_MATRIX_MAX_ELEMENTS = int(os.environ.get('API_MATRIX_MAX_ELEMENTS', 250000))
+API_MAX_BODY_BYTES = int(os.environ.get('API_MAX_BODY_BYTES', 8 * 1024 * 1024))
+API_KEEPALIVE_S = float(os.environ.get('API_KEEPALIVE_S', 30.0))
+
+_PATHS = ('/route', '/batch', '/matrix', '/health', '/metrics')
+_REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed', 411: 'Length Required',
+            413: 'Payload Too Large', 500: 'Internal Server Error', 503: 'Service Unavailable'}
+
+
+class ApiError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+def _point(value, field: str) -> Tuple[float, float]:
+    try:
+        lat, lon = (float(v) for v in value)
+    except (TypeError, ValueError):
+        raise ApiError(400, f'{field} must be [lat, lon]')
+    if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+        raise ApiError(400, f'{field} out of range')
+    return lat, lon
+
+
+def query_options(q: Dict[str,Any]) -> Dict[str,Any]:
+    # batch.score_pair options from a request body; same defaults as the batch CLI
+    from pipeline import MODES, DEFAULT_WEIGHTS
+    try:
+        weights = dict(DEFAULT_WEIGHTS, **{k: float(v) for k, v in (q.get('weights') or {}).items() if k in DEFAULT_WEIGHTS})
+        modes = [m for m in (q.get('modes') or MODES) if m in MODES]
+        return {'modes': modes, 'alt_target': max(1, min(int(q.get('alt_target', 4)), 4)),
+                'ors_api_key': os.environ.get('ORS_API_KEY', ''), 'avoid_tolls': bool(q.get('avoid_tolls', False)),
+                'fuel_economy': float(q.get('fuel_economy', 15.0)), 'fuel_price': float(q.get('fuel_price', 110.0)),
+                'co2_g_per_km': float(q.get('co2_g_per_km', 120.0)), 'weights': weights,
+                'with_geometry': bool(q.get('geometry', False)), 'concurrent': False}
+    except (TypeError, ValueError) as e:
+        raise ApiError(400, f'invalid option: {e}')
+
+
+def route_query(q: Dict[str,Any], pair_id: str='0') -> Dict[str,Any]:
+    from batch import score_pair
+    if not isinstance(q, dict):
+        raise ApiError(400, 'query must be an object')
+    origin, dest = _point(q.get('origin'), 'origin'), _point(q.get('dest'), 'dest')
+    if origin == dest:
+        raise ApiError(400, 'Origin and destination are identical. Choose different points.')
+    rec = {'id': str(q.get('id', pair_id)), 'origin_lat': origin[0], 'origin_lon': origin[1],
+           'dest_lat': dest[0], 'dest_lon': dest[1]}
+    return score_pair(rec, query_options(q))
+
+
+def matrix_query(q: Dict[str,Any]) -> Dict[str,Any]:
+    import numpy as np
+    from providers import fetch_road_matrix
+    src = [_point(p, 'sources[]') for p in q.get('sources') or []]
+    dst = [_point(p, 'destinations[]') for p in q.get('destinations') or src]
+    if not src or not dst:
+        raise ApiError(400, 'sources (and optionally destinations) are required')
+    if len(src) * len(dst) > API_MATRIX_MAX_ELEMENTS:
+        raise ApiError(413, f'matrix larger than {API_MATRIX_MAX_ELEMENTS} elements')
+    provider = 'ors' if q.get('provider') == 'ors' else 'osrm'
+    res = fetch_road_matrix(src, dst, provider, os.environ.get('ORS_API_KEY', ''))
+
+    def cells(a, decimals):
+        out = np.round(a, decimals).astype(object)
+        out[np.isnan(a)] = None
+        return out.tolist()
+    return {'distance_km': cells(res['distance_km'], 3), 'duration_min': cells(res['duration_min'], 2),
+            'blocks': res['blocks'], 'errors': res['errors']}
+
+
+class RoutingService:
+    def __init__(self, workers: int=API_WORKERS, max_pending: int=API_MAX_PENDING, batch_in_flight: int=API_BATCH_IN_FLIGHT):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.batch_in_flight = batch_in_flight
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='api-worker')
+        self.pending = 0
+
+    def admit(self):
+        if self.pending >= self.max_pending:
+            inc('api_rejected_total')
+            raise ApiError(503, 'server busy, retry later')
+
+    async def call(self, fn, *args):
+        # pending counts queries waiting for or holding a worker; asyncio is single-threaded, so no lock needed
+        self.pending += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self.pool, fn, *args)
+        finally:
+            self.pending -= 1
+
+    def health(self) -> Dict[str,Any]:
+        return {'status': 'ok', 'workers': self.workers, 'running': min(self.pending, self.workers),
+                'queued': max(self.pending - self.workers, 0), 'max_pending': self.max_pending}
+
+
+async def _read_request(reader: asyncio.StreamReader):
+    try:
+        head = await asyncio.wait_for(reader.readuntil(b'\r\n\r\n'), API_KEEPALIVE_S)
+    except (asyncio.IncompleteReadError, asyncio.TimeoutError, asyncio.LimitOverrunError, ConnectionError):
+        return None
+    lines = head.decode('latin-1').split('\r\n')
+    try:
+        method, target, version = lines[0].split(' ', 2)
+    except ValueError:
+        raise ApiError(400, 'malformed request line')
+    headers = {}
+    for line in lines[1:]:
+        if ':' in line:
+            k, v = line.split(':', 1)
+            headers[k.strip().lower()] = v.strip()
+    if 'chunked' in headers.get('transfer-encoding', '').lower():
+        raise ApiError(411, 'chunked request bodies are not supported; send Content-Length')
+    length = headers.get('content-length') or '0'
+    if not length.isdecimal():
+        raise ApiError(400, 'invalid Content-Length')
+    length = int(length)
+    if length > API_MAX_BODY_BYTES:
+        raise ApiError(413, f'body larger than {API_MAX_BODY_BYTES} bytes')
+    body = await reader.readexactly(length) if length else b''
+    keep_alive = headers.get('connection', '').lower() != 'close' and version != 'HTTP/1.0'
+    return method, target.split('?', 1)[0], body, keep_alive
+
+
+def _head(status: int, ctype: str, extra: Dict[str,str], keep_alive: bool) -> bytes:
+    lines = [f'HTTP/1.1 {status} {_REASONS.get(status, "")}', f'Content-Type: {ctype}',
+             f'Connection: {"keep-alive" if keep_alive else "close"}']
+    lines += [f'{k}: {v}' for k, v in extra.items()]
+    return ('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1')
+
+
+async def _send(writer: asyncio.StreamWriter, status: int, payload, keep_alive: bool, ctype: str='application/json',
+                extra: Optional[Dict[str,str]]=None):
+    body = payload if isinstance(payload, bytes) else json.dumps(payload, ensure_ascii=False).encode()
+    writer.write(_head(status, ctype, dict(extra or {}, **{'Content-Length': str(len(body))}), keep_alive) + body)
+    await writer.drain()
+
+
+async def _send_chunk(writer: asyncio.StreamWriter, data: bytes):
+    writer.write(b'%x\r\n%s\r\n' % (len(data), data))
+    # backpressure: a slow reader pauses the batch here instead of results piling up in memory
+    await writer.drain()
+
+
+class RoutingApi:
+    def __init__(self, service: Optional[RoutingService]=None):
+        self.service = service or RoutingService()
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            keep_alive = True
+            while keep_alive:
+                start = time.perf_counter()
+                path, status = '?', 500
+                # an unreadable request leaves the stream position unknown: answer, then close
+                keep_alive = False
+                try:
+                    req = await _read_request(reader)
+                    if req is None:
+                        break
+                    method, path, body, keep_alive = req
+                    status = await self.dispatch(method, path, body, writer, keep_alive)
+                except ApiError as e:
+                    status = e.status
+                    extra = {'Retry-After': '1'} if e.status == 503 else None
+                    await _send(writer, e.status, {'error': str(e)}, keep_alive, extra=extra)
+                except (ConnectionError, asyncio.IncompleteReadError):
+                    break
+                except Exception as e:
+                    await _send(writer, 500, {'error': f'{type(e).__name__}: {e}'}, keep_alive)
+                observe('api_request_seconds', time.perf_counter() - start, path=path if path in _PATHS else 'other', status=status)
+        finally:
+            writer.close()
+
+    async def dispatch(self, method: str, path: str, body: bytes, writer, keep_alive: bool) -> int:
+        if path == '/health':
+            await _send(writer, 200, self.service.health(), keep_alive)
+            return 200
+        if path == '/metrics':
+            await _send(writer, 200, REGISTRY.to_prometheus().encode(), keep_alive, ctype='text/plain; version=0.0.4')
+            return 200
+        if path not in _PATHS:
+            raise ApiError(404, 'not found')
+        if method != 'POST':
+            raise ApiError(405, 'use POST')
+        try:
+            q = json.loads(body or b'{}')
+        except ValueError:
+            raise ApiError(400, 'body is not valid JSON')
+        if not isinstance(q, dict):
+            raise ApiError(400, 'body must be a JSON object')
+        self.service.admit()
+        if path == '/batch':
+            return await self.stream_batch(q, writer, keep_alive)
+        fn = route_query if path == '/route' else matrix_query
+        await _send(writer, 200, await self.service.call(fn, q), keep_alive)
+        return 200
+
+    async def stream_batch(self, q: Dict[str,Any], writer, keep_alive: bool) -> int:
+        pairs = q.get('pairs')
+        if not isinstance(pairs, list) or not pairs:
+            raise ApiError(400, 'pairs must be a non-empty list')
+        if len(pairs) > API_BATCH_MAX_PAIRS:
+            raise ApiError(413, f'more than {API_BATCH_MAX_PAIRS} pairs')
+        defaults = {k: v for k, v in q.items() if k != 'pairs'}
+        writer.write(_head(200, 'application/x-ndjson', {'Transfer-Encoding': 'chunked'}, keep_alive))
+        done = failed = 0
+        in_flight = set()
+        items = iter(enumerate(pairs))
+
+        async def one(i, pair):
+            merged = dict(defaults, **pair) if isinstance(pair, dict) else pair
+            try:
+                self.service.admit()
+                return await self.service.call(route_query, merged, str(i))
+            except Exception as e:
+                pid = str(pair.get('id', i)) if isinstance(pair, dict) else str(i)
+                return {'id': pid, 'error': str(e) if isinstance(e, ApiError) else f'{type(e).__name__}: {e}'}
+
+        item = next(items, None)
+        try:
+            while True:
+                while item is not None and len(in_flight) < self.service.batch_in_flight:
+                    # pairs share the API_MAX_PENDING budget with /route: while the service is full, wait for this
+                    # batch's own pairs to finish; with none of them running, the pair gets the 503 error line
+                    if in_flight and self.service.pending >= self.service.max_pending:
+                        break
+                    in_flight.add(asyncio.ensure_future(one(*item)))
+                    item = next(items, None)
+                    await asyncio.sleep(0)  # let it count itself as pending before the next check
+                if not in_flight:
+                    break
+                finished, in_flight = await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+                for fut in finished:
+                    rec = fut.result()
+                    failed += 'error' in rec
+                    done += 'error' not in rec
+                    await _send_chunk(writer, json.dumps(rec, ensure_ascii=False).encode() + b'\n')
+        finally:
+            # client gone (or any other exit): drop pairs still queued for a worker
+            for fut in in_flight:
+                fut.cancel()
+        await _send_chunk(writer, json.dumps({'summary': {'done': done, 'failed': failed}}).encode() + b'\n')
+        writer.write(b'0\r\n\r\n')
+        await writer.drain()
+        return 200
+
+
+async def serve(host: str=API_HOST, port: int=API_PORT, api: Optional[RoutingApi]=None, ready=None, reuse_port: bool=False):
+    api = api or RoutingApi()
+    server = await asyncio.start_server(api.handle, host, port, limit=64 * 1024, reuse_port=reuse_port or None)
+    if ready is not None:
+        ready(server)
+    async with server:
+        await server.serve_forever()
+
+
+def _serve_process(host: str, port: int, workers: int, max_pending: int, reuse_port: bool, announce: bool):
+    api = RoutingApi(RoutingService(workers, max_pending))
+
+    def ready(server):
+        if announce:
+            host, port = server.sockets[0].getsockname()[:2]
+            print(f'routing API on http://{host}:{port}', file=sys.stderr, flush=True)
+    try:
+        asyncio.run(serve(host, port, api, ready, reuse_port=reuse_port))
+    except KeyboardInterrupt:
+        pass
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description='JSON routing API (route, batch, matrix)')
+    ap.add_argument('--host', default=API_HOST)
+    ap.add_argument('--port', type=int, default=API_PORT)
+    ap.add_argument('--workers', type=int, default=API_WORKERS)
+    ap.add_argument('--max-pending', type=int, default=API_MAX_PENDING)
+    ap.add_argument('--processes', type=int, default=API_PROCESSES)
+    args = ap.parse_args(argv)
+    multi = args.processes > 1
+    if multi and not args.port:
+        ap.error('--processes > 1 needs a fixed --port')
+    children = []
+    # SIGTERM unwinds like Ctrl-C so the finally below stops the child processes
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    if multi:
+        import multiprocessing
+        ctx = multiprocessing.get_context('spawn')
+        for _ in range(args.processes - 1):
+            child = ctx.Process(target=_serve_process, args=(args.host, args.port, args.workers, args.max_pending, True, False),
+                                daemon=True)
+            child.start()
+            children.append(child)
+    try:
+        _serve_process(args.host, args.port, args.workers, args.max_pending, multi, True)
+    finally:
+        for child in children:
+            child.terminate()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
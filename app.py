@@ -1,11 +1,12 @@
 import streamlit as st
-import pandas as pd
-import numpy as np
-import altair as alt
 
-from providers import fetch_road_routes, build_rail_routes, build_flight_routes
-from optimization import road_cost_emissions, score_df
-from map_utils import draw_map
+from metrics import REGISTRY, ensure_metrics_server
+from places import STATIC_FROM, STATIC_TO, FROM_LABELS, TO_LABELS
+from warm import ensure_background_warmer
+from startup import lazy_import, IMPORT_PROFILE, cached_profile_report, lazy_import_times
+
+# pandas/numpy/altair/folium and the routing pipeline are imported on first use (see startup.py),
+# so the first page render only pays for Streamlit itself
 
 st.set_page_config(page_title="Multi‑Modal (Road + Rail + Flight) Route Optimizer", layout="wide")
 
@@ -18,133 +19,17 @@ if css_path.exists():
 st.markdown('<div class="header-gradient">🧭 Multi‑Modal Route Optimizer</div>', unsafe_allow_html=True)
 st.caption("Road, Rail, Flight — choose 3–4 alternatives per mode. Recommended path highlighted.")
 
+metrics_url = ensure_metrics_server()
+
 # Sidebar inputs
 st.sidebar.header("Configuration")
 use_static = st.sidebar.checkbox("Use static points", value=True)
-static_from = {
-    "Kolkata (Esplanade)": (22.5667, 88.3667),
-    "Howrah Maidan": (22.5892, 88.3475),
-    "Garia": (22.4629, 88.3968),
-    "Behala": (22.49814, 88.31084),
-    "Jadavpur": (22.50251, 88.36761),
-    "Alipore": (22.53917, 88.32728),
-    "Connaught Place": (28.63278, 77.21972),
-    "Karol Bagh": (28.6629, 77.2100),
-    "Hauz Khas": (28.5471, 77.2040),
-    "Dwarka": (28.58452, 77.04918),
-    "Rohini": (28.7383, 77.0822),
-    "New Delhi (city core)": (28.6448, 77.21672),
-    "Lajpat Nagar": (28.56927, 77.24411),
-    "Chandni Chowk": (28.656, 77.2310),
-    "Greater Kailash": (28.54434, 77.23971),
-    "Janakpuri": (28.62, 77.09444),
-    "Bandra": (19.054444, 72.840556),
-    "Andheri": (19.114424, 72.867943),
-    "Juhu": (19.1, 72.83),
-    "Colaba": (18.91, 72.81),
-    "Dadar": (19.021, 72.841),
-    "Malad": (19.186111, 72.848611),
-    "Powai": (19.1164, 72.9047),
-    "Borivali": (19.23, 72.86),
-    "Chembur": (19.051, 72.894),
-    "Kurla": (19.059984, 72.889999),
-    "Banjara Hills": (17.415, 78.440),
-    "Gachibowli": (17.4372, 78.3444),
-    "Jubilee Hills": (17.4165, 78.4382),
-    "HITEC City": (17.44155, 78.38264),
-    "Secunderabad": (17.43993, 78.49828),
-    "Madhapur": (17.44167, 78.39167),
-    "Kondapur": (17.483, 78.417),
-    "Ameerpet": (17.437462, 78.448288),
-    "Koti": (17.38564, 78.48371),
-    "Mehdipatnam": (17.3959, 78.4312),
-    "Koramangala": (12.934533, 77.626579),
-    "Indiranagar": (12.971891, 77.641151),
-    "Whitefield": (12.971389, 77.750130),
-    "Jayanagar": (12.925, 77.595),
-    "Bellandur": (12.94721, 77.57894),
-    "M G Road": (12.973801, 77.611885),
-    "Electronic City": (12.840711, 77.676369),
-    "Malleshwaram": (13.0031, 77.5643),
-    "Yelahanka": (13.1007, 77.5963),
-    "HSR Layout": (12.94722, 77.57895),
-    "Kochi": (9.931194, 76.267306),
-    "Thiruvananthapuram": (8.524111, 76.936611),
-    "Kozhikode": (11.24802, 75.7804),
-    "Thrissur": (10.51667, 76.21667),
-    "Alappuzha": (9.49004, 76.3264),
-    "Kannur": (11.8689, 75.35546),
-    "Kollam": (8.88113, 76.58469),
-    "Kottayam": (9.58692, 76.52132),
-    "Malappuram": (11.04019, 76.08237),
-    "Varkala": (8.7333, 76.7167),
-}
-static_to = {
-    "Salt Lake (Sector V)": (22.5792, 88.4317),
-    "Kharagpur": (22.3400, 87.3250),
-    "Bhubaneswar": (20.2961, 85.8250),
-    "Delhi": (28.6315, 77.2167),
-    "Garia": (22.4629, 88.3968),
-    "Behala": (22.49814, 88.31084),
-    "Jadavpur": (22.50251, 88.36761),
-    "Alipore": (22.53917, 88.32728),
-    "Connaught Place": (28.63278, 77.21972),
-    "Karol Bagh": (28.6629, 77.2100),
-    "Hauz Khas": (28.5471, 77.2040),
-    "Dwarka": (28.58452, 77.04918),
-    "Rohini": (28.7383, 77.0822),
-    "New Delhi (city core)": (28.6448, 77.21672),
-    "Lajpat Nagar": (28.56927, 77.24411),
-    "Chandni Chowk": (28.656, 77.2310),
-    "Greater Kailash": (28.54434, 77.23971),
-    "Janakpuri": (28.62, 77.09444),
-    "Bandra": (19.054444, 72.840556),
-    "Andheri": (19.114424, 72.867943),
-    "Juhu": (19.1, 72.83),
-    "Colaba": (18.91, 72.81),
-    "Dadar": (19.021, 72.841),
-    "Malad": (19.186111, 72.848611),
-    "Powai": (19.1164, 72.9047),
-    "Borivali": (19.23, 72.86),
-    "Chembur": (19.051, 72.894),
-    "Kurla": (19.059984, 72.889999),
-    "Banjara Hills": (17.415, 78.440),
-    "Gachibowli": (17.4372, 78.3444),
-    "Jubilee Hills": (17.4165, 78.4382),
-    "HITEC City": (17.44155, 78.38264),
-    "Secunderabad": (17.43993, 78.49828),
-    "Madhapur": (17.44167, 78.39167),
-    "Kondapur": (17.483, 78.417),
-    "Ameerpet": (17.437462, 78.448288),
-    "Koti": (17.38564, 78.48371),
-    "Mehdipatnam": (17.3959, 78.4312),
-    "Koramangala": (12.934533, 77.626579),
-    "Indiranagar": (12.971891, 77.641151),
-    "Whitefield": (12.971389, 77.750130),
-    "Jayanagar": (12.925, 77.595),
-    "Bellandur": (12.94721, 77.57894),
-    "M G Road": (12.973801, 77.611885),
-    "Electronic City": (12.840711, 77.676369),
-    "Malleshwaram": (13.0031, 77.5643),
-    "Yelahanka": (13.1007, 77.5963),
-    "HSR Layout": (12.94722, 77.57895),
-    "Kochi": (9.931194, 76.267306),
-    "Thiruvananthapuram": (8.524111, 76.936611),
-    "Kozhikode": (11.24802, 75.7804),
-    "Thrissur": (10.51667, 76.21667),
-    "Alappuzha": (9.49004, 76.3264),
-    "Kannur": (11.8689, 75.35546),
-    "Kollam": (8.88113, 76.58469),
-    "Kottayam": (9.58692, 76.52132),
-    "Malappuram": (11.04019, 76.08237),
-    "Varkala": (8.7333, 76.7167),
-}
 
 if use_static:
-    origin_label = st.sidebar.selectbox("From", list(static_from.keys()), index=0)
-    dest_label = st.sidebar.selectbox("To", list(static_to.keys()), index=0)
-    origin = static_from[origin_label]
-    dest = static_to[dest_label]
+    origin_label = st.sidebar.selectbox("From", FROM_LABELS, index=0)
+    dest_label = st.sidebar.selectbox("To", TO_LABELS, index=0)
+    origin = STATIC_FROM[origin_label]
+    dest = STATIC_TO[dest_label]
 else:
     origin = (
         st.sidebar.number_input("From Lat", value=22.5667, format="%.6f"),
@@ -174,64 +59,56 @@ avoid_tolls = st.sidebar.checkbox("Road: avoid tollways", value=False)
 alt_target = st.sidebar.slider("Alternatives per mode", 3, 4, 4)
 
 ORS_API_KEY = st.secrets.get("ORS_API_KEY", "")
+# WARM_ON_START=1: precompute the static catalog into the warm store in a background thread (once per process)
+ensure_background_warmer(ORS_API_KEY)
 
 run = st.sidebar.button("🔎 Compute & Optimize")
 
-for key in ['routes','df','scored_df','best_idx','origin','dest','message']:
+for key in ['routes','df','scored_df','best_idx','sweep','origin','dest','message','pipeline','active']:
     if key not in st.session_state:
         st.session_state[key] = None
 
-if run:
+# After the first Compute, alt_target / road KPI / weight changes re-run only their own stages on every rerun;
+# origin, destination, modes or avoid_tolls changes need a click because they hit the network.
+# The pipeline (and everything it imports) is only loaded once a Compute has been requested.
+pipe = None
+if run or st.session_state.active:
+    if st.session_state.pipeline is None:
+        st.session_state.pipeline = lazy_import('pipeline').StagedPipeline()
+    pipe = st.session_state.pipeline
+if run and origin == dest:
+    st.session_state.message = "Origin and destination are identical. Choose different points."
+elif run or (pipe is not None and pipe.has_fetched(pipe.fetch_key(origin, dest, mode_select, ORS_API_KEY, avoid_tolls))):
     try:
-        if origin == dest:
-            st.session_state.message = "Origin and destination are identical. Choose different points."
+        result = pipe.run(origin, dest, mode_select, alt_target, ORS_API_KEY, avoid_tolls,
+                          fuel_economy, fuel_price, co2_g_per_km, weights, refetch=run)
+        st.session_state.active = True
+        if not result['routes']:
+            st.session_state.message = "No routes found/built. Try different points or modes."
+            st.session_state.routes = None
         else:
-            all_routes = []
-            if 'road' in mode_select:
-                road_routes = fetch_road_routes(origin, dest, alt_target, ORS_API_KEY, avoid_tolls)
-                for r in road_routes:
-                    cost_inr, emissions_kg = road_cost_emissions(r.get('distance_km',0.0), fuel_economy, fuel_price, co2_g_per_km)
-                    r['cost_inr'] = cost_inr
-                    r['emissions_kg'] = emissions_kg
-                    r['mode'] = 'road'
-                all_routes.extend(road_routes)
-            if 'rail' in mode_select:
-                all_routes.extend(build_rail_routes(origin, dest, alt_target=alt_target))
-            if 'flight' in mode_select:
-                all_routes.extend(build_flight_routes(origin, dest, alt_target=alt_target))
-
-            if not all_routes:
-                st.session_state.message = "No routes found/built. Try different points or modes."
-                st.session_state.routes = None
-            else:
-                rows = []
-                for i, r in enumerate(all_routes):
-                    rows.append({
-                        'Route': i,
-                        'mode': r.get('mode','road'),
-                        'distance_km': round(r.get('distance_km',0.0),2),
-                        'duration_min': round(r.get('duration_min',0.0),2),
-                        'cost_inr': r.get('cost_inr',0.0),
-                        'emissions_kg': r.get('emissions_kg',0.0),
-                        'roads_summary': r.get('roads_summary',''),
-                    })
-                df = pd.DataFrame(rows)
-                scored_df, best_idx = score_df(df, weights)
-
-                st.session_state.routes = all_routes
-                st.session_state.df = df
-                st.session_state.scored_df = scored_df
-                st.session_state.best_idx = best_idx
-                st.session_state.origin = origin
-                st.session_state.dest = dest
-                st.session_state.message = None
+            st.session_state.routes = result['routes']
+            st.session_state.df = result['df']
+            st.session_state.scored_df = result['scored_df']
+            st.session_state.best_idx = result['best_idx']
+            st.session_state.sweep = result['sweep']
+            st.session_state.origin = origin
+            st.session_state.dest = dest
+            st.session_state.message = None
     except Exception as e:
         st.session_state.message = f"Unexpected error: {e}"
+elif st.session_state.active:
+    st.sidebar.info("Origin, destination, modes or toll setting changed, or the last fetch was incomplete — click Compute & Optimize to fetch routes.")
 
 if st.session_state.message:
     st.error(st.session_state.message)
 
 if st.session_state.routes and st.session_state.scored_df is not None:
+    pd = lazy_import('pandas')
+    np = lazy_import('numpy')
+    alt = lazy_import('altair')
+    SWEEP_AXIS_VALUES = lazy_import('optimization').SWEEP_AXIS_VALUES
+    sweep = st.session_state.sweep
     st.subheader("All Available Routes")
     df = st.session_state.scored_df.copy()
     df['Tag'] = np.where(df['tag']=='recommended', "<span class='badge recommended'>Recommended</span>", "<span class='badge alt'>Alt</span>")
@@ -251,15 +128,67 @@ if st.session_state.routes and st.session_state.scored_df is not None:
 
     st.markdown("<hr class='hr-soft'>", unsafe_allow_html=True)
 
+    st.subheader("Weight Sensitivity")
+    base = st.session_state.df
+    labels = np.array([f"#{i} {m}" for i, m in zip(base['Route'], base['mode'])])
+    share_df = pd.DataFrame({'route': labels, 'share': sweep.shares()})
+    share_df = share_df[share_df['share'] > 0]
+    nearest = lambda v: SWEEP_AXIS_VALUES[int(np.argmin(np.abs(np.asarray(SWEEP_AXIS_VALUES) - v)))]
+    W = sweep.weights
+    sel = (W[:, 0] == nearest(weights['distance_km'])) & (W[:, 3] == nearest(weights['emissions_kg']))
+    heat_df = pd.DataFrame({'Time weight': W[sel, 1], 'Cost weight': W[sel, 2], 'winner': labels[sweep.winners[sel]]})
+    s1, s2 = st.columns(2)
+    with s1:
+        st.altair_chart(alt.Chart(share_df).mark_bar().encode(
+            x=alt.X('share:Q', title='Share of weight grid won', axis=alt.Axis(format='%')),
+            y=alt.Y('route:N', sort='-x', title=None), color=alt.Color('route:N', legend=None),
+            tooltip=['route', alt.Tooltip('share:Q', format='.1%')]), use_container_width=True)
+    with s2:
+        st.altair_chart(alt.Chart(heat_df).mark_rect().encode(
+            x='Time weight:O', y=alt.Y('Cost weight:O', sort='descending'), color=alt.Color('winner:N', title='Winner'),
+            tooltip=['Time weight', 'Cost weight', 'winner']), use_container_width=True)
+    st.caption(f"Winner by Time × Cost weight at Distance≈{nearest(weights['distance_km'])}, CO₂≈{nearest(weights['emissions_kg'])}. "
+               f"Nearest swept point to your sliders recommends {labels[sweep.lookup(weights)]}.")
+
+    st.markdown("<hr class='hr-soft'>", unsafe_allow_html=True)
+
     st.subheader("Route Visualization")
     rec_route_id = int(best_row['Route']) if st.session_state.best_idx != -1 else 0
-    draw_map(st.session_state.origin, st.session_state.dest, st.session_state.routes, rec_route_id)
+    lazy_import('map_utils').draw_map(st.session_state.origin, st.session_state.dest, st.session_state.routes, rec_route_id)
 
     st.markdown("<hr class='hr-soft'>", unsafe_allow_html=True)
 
     st.subheader("Turn‑by‑turn / Stops — Recommended")
-    steps_df = pd.DataFrame(st.session_state.routes[rec_route_id].get('steps', []))
+    steps_df = lazy_import('routes').as_route(st.session_state.routes[rec_route_id]).steps.to_frame()
     if not steps_df.empty:
         steps_df = steps_df[["name","instruction","distance_m","duration_s"]]
         steps_df.rename(columns={"name":"Road/Stop","instruction":"Instruction","distance_m":"Segment (m)","duration_s":"Segment (s)"}, inplace=True)
     st.dataframe(steps_df, use_container_width=True)
+
+# Debug panel: process-wide timings/counters (latest values, rendered last so this rerun is included)
+with st.sidebar.expander("Debug: metrics", expanded=False):
+    snap = REGISTRY.snapshot()
+    label = lambda m: m['name'] + ('{' + ','.join(f"{k}={v}" for k, v in m['labels'].items()) + '}' if m['labels'] else '')
+    if snap['histograms']:
+        pd = lazy_import('pandas')
+        st.dataframe(pd.DataFrame([{'metric': label(h), 'n': h['count'],
+                                    'mean': h['mean'], 'p50': h['p50'], 'p95': h['p95']} for h in snap['histograms']]),
+                     use_container_width=True, hide_index=True)
+    if snap['counters']:
+        pd = lazy_import('pandas')
+        st.dataframe(pd.DataFrame([{'metric': label(c), 'value': c['value']} for c in snap['counters']]),
+                     use_container_width=True, hide_index=True)
+    st.download_button("Prometheus text", REGISTRY.to_prometheus(), file_name="metrics.prom")
+    if metrics_url:
+        st.caption(f"Scrape {metrics_url}/metrics")
+
+if IMPORT_PROFILE:
+    with st.sidebar.expander("Debug: import profile", expanded=False):
+        rep = cached_profile_report()
+        st.caption(f"Before first Compute: {rep['eager_s'] * 1000:.0f} ms ({rep['eager_modules']} modules); "
+                   f"deferred to first use: {rep['lazy_s'] * 1000:.0f} ms ({rep['lazy_modules']} modules).")
+        st.dataframe([{'module': r['module'], 'cumulative ms': round(r['cumulative_s'] * 1000, 1)} for r in rep['top']],
+                     use_container_width=True, hide_index=True)
+        loaded = lazy_import_times()
+        if loaded:
+            st.caption("Loaded lazily in this process: " + ", ".join(f"{m} {t * 1000:.0f} ms" for m, t in loaded.items()))
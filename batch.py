@@ -0,0 +1,220 @@
+import os
+import sys
+import csv
+import json
+import time
+import argparse
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, wait, FIRST_COMPLETED
+from typing import Dict, Any, Iterator, List, Optional, Set
+
+from geometry_utils import encode_polyline, as_latlon_array
+from pipeline import compute_and_score, MODES, DEFAULT_WEIGHTS
+
+# Headless batch scoring: python batch.py pairs.csv scored.jsonl --workers 8
+# Input rows need origin_lat, origin_lon, dest_lat, dest_lon (optional id); CSV or JSONL.
+PARQUET_ROW_GROUP = 1000
+
+
+def read_pairs(path: str) -> Iterator[Dict[str,Any]]:
+    if path.endswith('.jsonl') or path.endswith('.ndjson'):
+        with open(path, encoding='utf-8') as fh:
+            for n, line in enumerate(fh):
+                if line.strip():
+                    rec = json.loads(line)
+                    rec.setdefault('id', str(n))
+                    yield rec
+    else:
+        with open(path, newline='', encoding='utf-8') as fh:
+            for n, rec in enumerate(csv.DictReader(fh)):
+                rec['id'] = rec.get('id') or str(n)
+                yield rec
+
+
+def score_pair(rec: Dict[str,Any], opts: Dict[str,Any]) -> Dict[str,Any]:
+    origin = (float(rec['origin_lat']), float(rec['origin_lon']))
+    dest = (float(rec['dest_lat']), float(rec['dest_lon']))
+    routes, _, scored_df, best_idx = compute_and_score(origin, dest, opts['modes'], opts['alt_target'], opts['ors_api_key'],
+                                                       opts['avoid_tolls'], opts['fuel_economy'], opts['fuel_price'],
+                                                       opts['co2_g_per_km'], opts['weights'], concurrent=opts.get('concurrent', True))
+    out = {'id': str(rec['id']), 'origin': list(origin), 'dest': list(dest), 'routes': [], 'recommended': None}
+    if scored_df is None:
+        return out
+    for row in scored_df.to_dict('records'):
+        item = {k: row[k] for k in ('Route', 'mode', 'distance_km', 'duration_min', 'cost_inr', 'emissions_kg',
+                                    'roads_summary', 'score', 'tag')}
+        item['Route'] = int(item['Route'])
+        item['score'] = float(item['score'])
+        if opts['with_geometry']:
+            item['polyline'] = encode_polyline(as_latlon_array(routes[item['Route']].get('coords_latlon')).tolist())
+        out['routes'].append(item)
+    out['recommended'] = out['routes'][0]['Route'] if best_idx != -1 else None
+    return out
+
+
+class JsonlSink:
+    # write/close return the ids now durably on disk; only those are checkpointed
+    def __init__(self, path: str):
+        self.fh = open(path, 'a', encoding='utf-8')
+
+    def write(self, rec: Dict[str,Any]) -> List[str]:
+        self.fh.write(json.dumps(rec, ensure_ascii=False) + '\n')
+        self.fh.flush()
+        return [rec['id']]
+
+    def close(self) -> List[str]:
+        self.fh.close()
+        return []
+
+
+class ParquetSink:
+    # One flattened row per scored route. Every flush writes a complete part file (footer included), so what is on
+    # disk is always readable and a crash loses only unflushed, not yet checkpointed, pairs.
+    def __init__(self, path: str):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        self.pa, self.pq = pa, pq
+        self.stem = path[:-len('.parquet')]
+        self.part = 0
+        self.rows = []
+        self.ids = []
+
+    def next_path(self) -> str:
+        while True:
+            path = f'{self.stem}.parquet' if self.part == 0 else f'{self.stem}.part{self.part}.parquet'
+            self.part += 1
+            if not os.path.exists(path):
+                return path
+
+    def write(self, rec: Dict[str,Any]) -> List[str]:
+        for r in rec['routes']:
+            self.rows.append(dict(r, id=rec['id'], origin_lat=rec['origin'][0], origin_lon=rec['origin'][1],
+                                  dest_lat=rec['dest'][0], dest_lon=rec['dest'][1],
+                                  recommended=r['Route'] == rec['recommended']))
+        self.ids.append(rec['id'])
+        if len(self.rows) >= PARQUET_ROW_GROUP:
+            return self.flush()
+        return []
+
+    def flush(self) -> List[str]:
+        if self.rows:
+            self.pq.write_table(self.pa.Table.from_pylist(self.rows), self.next_path())
+        ids, self.rows, self.ids = self.ids, [], []
+        return ids
+
+    def close(self) -> List[str]:
+        return self.flush()
+
+
+class Checkpoint:
+    def __init__(self, path: str):
+        self.path = path
+        self.done: Set[str] = set()
+        if os.path.exists(path):
+            with open(path, encoding='utf-8') as fh:
+                self.done = {line.strip() for line in fh if line.strip()}
+        self.fh = open(path, 'a', encoding='utf-8')
+
+    def mark(self, pair_id: str):
+        self.done.add(pair_id)
+        self.fh.write(pair_id + '\n')
+        self.fh.flush()
+
+    def close(self):
+        self.fh.close()
+
+
+class Progress:
+    def __init__(self, every_s: float=5.0, stream=sys.stderr):
+        self.every_s = every_s
+        self.stream = stream
+        self.start = self.last = time.monotonic()
+        self.done = self.failed = self.skipped = 0
+
+    def tick(self, force: bool=False):
+        now = time.monotonic()
+        if not force and now - self.last < self.every_s:
+            return
+        self.last = now
+        elapsed = max(now - self.start, 1e-9)
+        self.stream.write(f'[batch] done={self.done} failed={self.failed} skipped={self.skipped} '
+                          f'elapsed={elapsed:.1f}s rate={self.done / elapsed:.2f} pairs/s\n')
+        self.stream.flush()
+
+
+def run_batch(input_path: str, output_path: str, opts: Dict[str,Any], workers: int=8, executor: str='thread',
+              checkpoint_path: Optional[str]=None, progress_every_s: float=5.0) -> Progress:
+    sink = ParquetSink(output_path) if output_path.endswith('.parquet') else JsonlSink(output_path)
+    ckpt = Checkpoint(checkpoint_path or output_path + '.ckpt')
+    errors = JsonlSink(output_path + '.errors.jsonl')
+    progress = Progress(progress_every_s)
+    pool_cls = ProcessPoolExecutor if executor == 'process' else ThreadPoolExecutor
+    max_in_flight = max(1, workers) * 2
+    try:
+        with pool_cls(max_workers=max(1, workers)) as pool:
+            pending = {}
+
+            def drain():
+                done, _ = wait(list(pending), return_when=FIRST_COMPLETED)
+                for fut in done:
+                    rec = pending.pop(fut)
+                    try:
+                        result = fut.result()
+                    except Exception as e:
+                        progress.failed += 1
+                        errors.write({'id': str(rec['id']), 'error': f'{type(e).__name__}: {e}'})
+                        continue
+                    for pair_id in sink.write(result):
+                        ckpt.mark(pair_id)
+                    progress.done += 1
+                progress.tick()
+
+            for rec in read_pairs(input_path):
+                if str(rec['id']) in ckpt.done:
+                    progress.skipped += 1
+                    continue
+                # bounded in-flight work: the input is streamed, never fully loaded
+                while len(pending) >= max_in_flight:
+                    drain()
+                pending[pool.submit(score_pair, rec, opts)] = rec
+            while pending:
+                drain()
+    finally:
+        for pair_id in sink.close():
+            ckpt.mark(pair_id)
+        ckpt.close()
+        errors.close()
+        progress.tick(force=True)
+    return progress
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description='Compute and score multi-modal routes for a file of OD pairs')
+    ap.add_argument('input', help='CSV or JSONL with origin_lat, origin_lon, dest_lat, dest_lon[, id]')
+    ap.add_argument('output', help='.jsonl or .parquet')
+    ap.add_argument('--workers', type=int, default=8)
+    ap.add_argument('--executor', choices=('thread', 'process'), default='thread')
+    ap.add_argument('--checkpoint', default=None, help='completed-id file (default: <output>.ckpt)')
+    ap.add_argument('--modes', default=','.join(MODES))
+    ap.add_argument('--alt-target', type=int, default=4)
+    ap.add_argument('--avoid-tolls', action='store_true')
+    ap.add_argument('--fuel-economy', type=float, default=15.0)
+    ap.add_argument('--fuel-price', type=float, default=110.0)
+    ap.add_argument('--co2-g-per-km', type=float, default=120.0)
+    ap.add_argument('--weights', default='', help='e.g. distance_km=1,duration_min=2,cost_inr=1,emissions_kg=1')
+    ap.add_argument('--with-geometry', action='store_true', help='include encoded polylines')
+    ap.add_argument('--progress-every', type=float, default=5.0)
+    args = ap.parse_args(argv)
+    weights = dict(DEFAULT_WEIGHTS)
+    for part in filter(None, args.weights.split(',')):
+        k, v = part.split('=')
+        weights[k.strip()] = float(v)
+    opts = {'modes': [m.strip() for m in args.modes.split(',') if m.strip()], 'alt_target': args.alt_target,
+            'ors_api_key': os.environ.get('ORS_API_KEY', ''), 'avoid_tolls': args.avoid_tolls,
+            'fuel_economy': args.fuel_economy, 'fuel_price': args.fuel_price, 'co2_g_per_km': args.co2_g_per_km,
+            'weights': weights, 'with_geometry': args.with_geometry}
+    progress = run_batch(args.input, args.output, opts, args.workers, args.executor, args.checkpoint, args.progress_every)
+    return 1 if progress.failed and not progress.done else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,439 @@
+import os
+import sys
+import gzip
+import json
+import time
+import random
+import argparse
+import platform
+import statistics
+import tempfile
+import tracemalloc
+from typing import Dict, Any, List, Callable, Tuple, Optional
+import numpy as np
+
+# Offline benchmarks for the hot path: python bench.py [--quick] [--only parse,score] [--save-baseline bench.json]
+# Provider responses for FIXTURE_TRIPS are replayed from the gzipped fixtures versioned in bench_fixtures/, so a
+# baseline and the run compared against it parse the same bytes; --record replaces them with live responses
+# (needs network). Synthetic inputs (polylines) and any missing fixture are generated in the stub server's
+# response shapes and cached in BENCH_CACHE_DIR.
+BENCH_FIXTURES_DIR = os.environ.get('BENCH_FIXTURES_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'bench_fixtures'))
+BENCH_CACHE_DIR = os.path.join(tempfile.gettempdir(), 'route_bench_fixtures')
+REGRESSION_THRESHOLD = 0.25
+MIN_TIME_S = 0.5
+MAX_REPEAT = 200
+
+# (name, origin, dest, points_per_km): ~15 km inside Kolkata and ~1,300 km Kolkata -> Delhi
+FIXTURE_TRIPS = (
+    ('urban', (22.5726, 88.3639), (22.4707, 88.4000), 40.0),
+    ('long', (22.5726, 88.3639), (28.6139, 77.2090), 20.0),
+)
+POLYLINE_SIZES = (10_000, 100_000, 1_000_000)
+HUB_CATALOG_SIZES = (1_000, 10_000, 100_000)
+# single-frame sizes: the app (~12 routes) and a large frame; Pareto within one frame is O(n^2)
+SCORE_ROWS = (12, 1_000)
+SCORE_BATCH_ROWS = (12_000, 120_000)
+SCORE_GROUP_SIZE = 12
+HUB_QUERIES = 200
+# complete graph (dense pair-KPI matrices) vs k-nearest-neighbour graph (Yen's search)
+HUB_GRAPH_SIZES = (200, 2_000)
+# local road router: synthetic n x n street grids, queried with random node pairs
+ROAD_GRID_SIZES = (100, 300)
+LOCAL_ROUTE_QUERIES = 20
+# --quick drops the largest sizes
+QUICK_SKIP = ('[1000k]', '[100k]', '[120k]', '[90k]')
+
+_cases: List[Tuple[str, Callable]] = []
+
+
+def case(name: str):
+    # setup(args) -> (fn, units, unit_name[, teardown]); only fn() is timed, teardown() runs after the case
+    def register(setup):
+        _cases.append((name, setup))
+        return setup
+    return register
+
+
+def _fixture_path(name: str) -> str:
+    return os.path.join(BENCH_FIXTURES_DIR, name + '.json.gz')
+
+
+def write_fixture(name: str, data):
+    # mtime=0 keeps re-recorded files byte-identical when the responses are
+    os.makedirs(BENCH_FIXTURES_DIR, exist_ok=True)
+    with open(_fixture_path(name), 'wb') as raw, gzip.GzipFile(fileobj=raw, mode='wb', mtime=0) as fh:
+        fh.write(json.dumps(data, separators=(',', ':')).encode())
+
+
+def load_fixture(name: str, make: Callable[[], Any]):
+    path = _fixture_path(name)
+    if os.path.exists(path):
+        with gzip.open(path, 'rt', encoding='utf-8') as fh:
+            return json.load(fh)
+    cached = os.path.join(BENCH_CACHE_DIR, name + '.json')
+    if os.path.exists(cached):
+        with open(cached, encoding='utf-8') as fh:
+            return json.load(fh)
+    data = make()
+    os.makedirs(BENCH_CACHE_DIR, exist_ok=True)
+    with open(cached, 'w', encoding='utf-8') as fh:
+        json.dump(data, fh)
+    return data
+
+
+def record_fixtures(ors_api_key: str):
+    # Overwrites the versioned trip fixtures with live provider responses
+    from providers import ORSClient, OSRMClient, RouteCache
+    cache = RouteCache(path=None)
+    for trip, origin, dest, _ in FIXTURE_TRIPS:
+        responses = {'osrm': OSRMClient.fetch(origin, dest, cache=cache)}
+        if ors_api_key:
+            responses['ors'] = ORSClient(ors_api_key, cache=cache).fetch(origin, dest, 3)
+        for provider, data in responses.items():
+            if data.get('error'):
+                print(f'[bench] {provider} {trip}: {data["error"]}', file=sys.stderr)
+                continue
+            write_fixture(f'{provider}_{trip}', data)
+
+
+def synth_coords(n_points: int, seed: int=0) -> np.ndarray:
+    # random walk with road-like ~10-50 m steps
+    rng = np.random.default_rng(seed)
+    steps = rng.normal(0.0, 2e-4, size=(n_points, 2)) + np.array([1e-4, -1.5e-4])
+    return np.round(np.cumsum(steps, axis=0) + np.array([22.5, 88.3]), 5)
+
+
+def synth_polyline(n_points: int, seed: int=0) -> str:
+    from geometry_utils import encode_polyline
+    return load_fixture(f'polyline_{n_points}', lambda: encode_polyline(synth_coords(n_points, seed).tolist()))
+
+
+def synth_catalog(n_hubs: int, seed: int=0):
+    from hubs import HubCatalog
+    rng = np.random.default_rng(seed)
+    coords = np.column_stack((rng.uniform(8.0, 34.0, n_hubs), rng.uniform(68.0, 97.0, n_hubs)))
+    return HubCatalog([f'Hub {i}' for i in range(n_hubs)], coords, kind='rail')
+
+
+def _trip_fixture(provider: str, trip: str):
+    from stub_server import osrm_route_response, ors_directions_response
+    _, origin, dest, ppk = next(t for t in FIXTURE_TRIPS if t[0] == trip)
+    make = (lambda: osrm_route_response(origin, dest, 3, ppk)) if provider == 'osrm' else \
+        (lambda: ors_directions_response(origin, dest, 3, ppk))
+    return load_fixture(f'{provider}_{trip}', make)
+
+
+def _points(resp: Dict[str, Any], provider: str) -> int:
+    from providers import ORSClient, OSRMClient
+    parse = OSRMClient.parse if provider == 'osrm' else ORSClient.parse
+    return sum(len(r['coords_latlon']) for r in parse(resp))
+
+
+for _n in POLYLINE_SIZES:
+    @case(f'decode_polyline[{_n // 1000}k]')
+    def _decode(args, n=_n):
+        from geometry_utils import decode_polyline
+        poly = synth_polyline(n)
+        return (lambda: decode_polyline(poly)), n, 'points'
+
+for _provider in ('osrm', 'ors'):
+    for _trip, *_ in FIXTURE_TRIPS:
+        @case(f'{_provider}_parse[{_trip}]')
+        def _parse(args, provider=_provider, trip=_trip):
+            from providers import ORSClient, OSRMClient
+            resp = _trip_fixture(provider, trip)
+            parse = OSRMClient.parse if provider == 'osrm' else ORSClient.parse
+            return (lambda: parse(resp, lean=True)), _points(resp, provider), 'points'
+
+        @case(f'{_provider}_parse_eager[{_trip}]')
+        def _parse_eager(args, provider=_provider, trip=_trip):
+            # PARSE_LEAN=0: geometry, steps and road summaries for every alternative
+            from providers import ORSClient, OSRMClient
+            resp = _trip_fixture(provider, trip)
+            parse = OSRMClient.parse if provider == 'osrm' else ORSClient.parse
+            return (lambda: parse(resp, lean=False)), _points(resp, provider), 'points'
+
+        @case(f'{_provider}_json_load[{_trip}]')
+        def _json_load(args, provider=_provider, trip=_trip):
+            import fastjson
+            raw = json.dumps(_trip_fixture(provider, trip)).encode()
+            return (lambda: fastjson.loads(raw)), len(raw), 'bytes'
+
+for _n in HUB_CATALOG_SIZES:
+    @case(f'hub_catalog_build[{_n // 1000}k]')
+    def _catalog_build(args, n=_n):
+        from hubs import HubCatalog
+        cat = synth_catalog(n)
+        return (lambda: HubCatalog(cat.names, cat.coords, kind='rail')), n, 'hubs'
+
+    @case(f'nearest_hubs[{_n // 1000}k]')
+    def _nearest(args, n=_n):
+        from providers import _nearest_hubs
+        cat = synth_catalog(n)
+        rng = np.random.default_rng(1)
+        queries = np.column_stack((rng.uniform(8.0, 34.0, HUB_QUERIES), rng.uniform(68.0, 97.0, HUB_QUERIES))).tolist()
+
+        def run():
+            for q in queries:
+                _nearest_hubs(q, cat, 4)
+        return run, HUB_QUERIES, 'queries'
+
+for _n in HUB_GRAPH_SIZES:
+    @case(f'hub_graph_build[{_n}]')
+    def _graph_build(args, n=_n):
+        from hub_graph import HubGraph
+        from optimization import rail_kpis
+        cat = synth_catalog(n)
+        return (lambda: HubGraph.from_catalog(cat, rail_kpis)), n, 'hubs'
+
+    @case(f'hub_itineraries[{_n}]')
+    def _itineraries(args, n=_n):
+        from hub_graph import HubGraph
+        from optimization import rail_kpis
+        cat = synth_catalog(n)
+        graph = HubGraph.from_catalog(cat, rail_kpis)
+        rng = np.random.default_rng(5)
+        legs = []
+        for _ in range(HUB_QUERIES // 10):
+            (oi, ok), (di, dk) = (cat.nearest((rng.uniform(10, 30), rng.uniform(70, 95)), k=8) for _ in range(2))
+            legs.append((dict(zip(oi.tolist(), (ok * 3.0).tolist())), dict(zip(di.tolist(), (dk * 3.0).tolist()))))
+
+        def run():
+            for access, egress in legs:
+                graph.k_best_itineraries(access, egress, 8)
+        return run, len(legs), 'queries'
+
+# alternatives x points per alternative; half of them jittered copies of the others
+DEDUPE_SIZES = ((36, 10_000),)
+
+for _count, _points_each in DEDUPE_SIZES:
+    @case(f'dedupe_routes[{_count}x{_points_each // 1000}k]')
+    def _dedupe(args, count=_count, points_each=_points_each):
+        from dedupe import dedupe_routes
+        from routes import Route
+        from stub_server import synth_path
+        rng = np.random.default_rng(4)
+        origin, dest = FIXTURE_TRIPS[1][1], FIXTURE_TRIPS[1][2]
+        routes = []
+        for k in range(count):
+            path = np.array(synth_path(origin, dest, points_each, 0.05 * (k % (count // 2))))
+            if k >= count // 2:
+                path += rng.normal(0, 5e-4, path.shape)
+            routes.append(Route.build('road', 1630.0, 1200.0, path))
+        return (lambda: dedupe_routes(routes, 4)), count, 'routes'
+
+
+# a metro with neighbouring stations (Howrah/Sealdah) to another metro, on the built-in hub catalogs
+HUB_ROUTE_TRIP = ('Garia', 'Connaught Place')
+
+
+@case('hub_routes[metro]')
+def _hub_routes(args):
+    # rail + flight builders end to end; setup also checks that itineraries dropped as near-duplicates are
+    # backfilled up to alt_target
+    from places import CITY_POINTS
+    from providers import build_rail_routes, build_flight_routes
+    origin, dest = (CITY_POINTS[p] for p in HUB_ROUTE_TRIP)
+    for mode, build in (('rail', build_rail_routes), ('flight', build_flight_routes)):
+        for alt_target in (3, 4):
+            got = len(build(origin, dest, alt_target))
+            if got != alt_target:
+                raise RuntimeError(f'{mode} {HUB_ROUTE_TRIP}: {got} of {alt_target} routes after de-duplication')
+
+    def run():
+        build_rail_routes(origin, dest, 4)
+        build_flight_routes(origin, dest, 4)
+    return run, 1, 'pairs'
+
+
+def synth_road_grid(n: int, seed: int=0):
+    # n x n jittered street grid (~200 m blocks), both directions, mixed speeds, 10% of edges missing
+    from road_graph import RoadGraph
+    rng = np.random.default_rng(seed)
+    ii, jj = np.meshgrid(np.arange(n), np.arange(n), indexing='ij')
+    lat = (22.4 + ii * 0.002 + rng.normal(0, 2e-4, ii.shape)).ravel()
+    lon = (88.2 + jj * 0.002 + rng.normal(0, 2e-4, ii.shape)).ravel()
+    idx = ii * n + jj
+    pairs = [(idx[:-1, :], idx[1:, :]), (idx[:, :-1], idx[:, 1:])]
+    src = np.concatenate([a.ravel() for a, b in pairs] + [b.ravel() for a, b in pairs])
+    dst = np.concatenate([b.ravel() for a, b in pairs] + [a.ravel() for a, b in pairs])
+    keep = rng.random(len(src)) >= 0.1
+    g = RoadGraph.from_edges(lat, lon, src[keep], dst[keep], rng.choice([25, 40, 60, 80], int(keep.sum())),
+                             [f'Road {i}' for i in range(50)], rng.integers(0, 50, int(keep.sum())))
+    g.add_landmarks()
+    return g
+
+
+for _n in ROAD_GRID_SIZES:
+    @case(f'local_route[{_n * _n // 1000}k]')
+    def _local_route(args, n=_n):
+        g = synth_road_grid(n)
+        rng = np.random.default_rng(3)
+        pts = np.column_stack((g.lat, g.lon))[rng.integers(0, len(g), (LOCAL_ROUTE_QUERIES, 2))]
+
+        def run():
+            for o, d in pts.tolist():
+                g.routes(tuple(o), tuple(d), 1)
+        return run, LOCAL_ROUTE_QUERIES, 'queries'
+
+
+def _kpi_frame(n: int, seed: int=2):
+    import pandas as pd
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({'Route': np.arange(n), 'mode': rng.choice(['road', 'rail', 'flight'], n),
+                         'distance_km': rng.uniform(5, 2000, n), 'duration_min': rng.uniform(10, 2000, n),
+                         'cost_inr': rng.uniform(50, 20000, n), 'emissions_kg': rng.uniform(1, 400, n),
+                         'roads_summary': ''})
+
+
+SCORE_WEIGHTS = {'distance_km': 1.0, 'duration_min': 2.0, 'cost_inr': 1.0, 'emissions_kg': 0.5}
+
+for _n in SCORE_ROWS:
+    @case(f'score_df[{_n}]')
+    def _score(args, n=_n):
+        from optimization import score_df
+        df = _kpi_frame(n)
+        return (lambda: score_df(df, SCORE_WEIGHTS)), n, 'rows'
+
+for _n in SCORE_BATCH_ROWS:
+    @case(f'score_batch[{_n // 1000}k]')
+    def _score_batch(args, n=_n):
+        # batch-mode shape: many OD pairs of SCORE_GROUP_SIZE routes each
+        from optimization import score_batch, SCORE_COLUMNS
+        X = _kpi_frame(n)[list(SCORE_COLUMNS)].to_numpy()
+        groups = np.arange(n) // SCORE_GROUP_SIZE
+        return (lambda: score_batch(X, SCORE_WEIGHTS, groups)), n, 'rows'
+
+for _trip, *_ in FIXTURE_TRIPS:
+    @case(f'pipeline_e2e[{_trip}]')
+    def _e2e(args, trip=_trip):
+        # full compute_and_score against an in-process stub (HTTP + JSON + parse + hubs + KPIs + score),
+        # route cache emptied before every call and an empty in-memory warm store, so nothing is served precomputed
+        import providers as P
+        import transport as T
+        import warm as W
+        from pipeline import compute_and_score
+        from stub_server import start_stub_server, StubConfig
+        _, origin, dest, ppk = next(t for t in FIXTURE_TRIPS if t[0] == trip)
+        saved = P.OSRM_URL, P._route_cache, T._transports.get('osrm'), W._store
+        server, url = start_stub_server(config=StubConfig(points_per_km=ppk))
+        P.OSRM_URL = url + '/route/v1/driving/{coords}?alternatives=true&overview=full&steps=true'
+        T.set_transport('osrm', T.ProviderTransport('osrm', rate_per_s=1e6, burst=1e6))
+        P._route_cache = P.RouteCache(path=None)
+        W.set_warm_store(W.WarmStore(path=':memory:'))
+
+        def run():
+            P._route_cache.clear()
+            compute_and_score(origin, dest, ('road', 'rail', 'flight'), 4, '', False, 15.0, 110.0, 120.0)
+
+        def teardown():
+            P.OSRM_URL, P._route_cache, transport, store = saved
+            with T._transports_lock:
+                if transport is None:
+                    T._transports.pop('osrm', None)
+                else:
+                    T._transports['osrm'] = transport
+            W.set_warm_store(store)
+            server.shutdown()
+            server.server_close()
+        return run, 1, 'pairs', teardown
+
+
+def time_case(fn: Callable, min_time_s: float, max_repeat: int) -> List[float]:
+    fn()  # warm-up: lazy imports, caches, hub graphs
+    samples, total = [], 0.0
+    while len(samples) < 3 or (total < min_time_s and len(samples) < max_repeat):
+        t0 = time.perf_counter()
+        fn()
+        dt = time.perf_counter() - t0
+        samples.append(dt)
+        total += dt
+    return samples
+
+
+def peak_memory(fn: Callable) -> int:
+    # separate traced call; tracing slows the timed runs down too much to combine them
+    tracemalloc.start()
+    try:
+        fn()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def run_cases(args) -> List[Dict[str, Any]]:
+    only = [s for s in (args.only or '').split(',') if s]
+    results = []
+    for name, setup in _cases:
+        if only and not any(s in name for s in only):
+            continue
+        if args.quick and any(tag in name for tag in QUICK_SKIP):
+            continue
+        fn, units, unit_name, *teardown = setup(args)
+        try:
+            samples = time_case(fn, args.min_time, MAX_REPEAT)
+            median = statistics.median(samples)
+            results.append({'name': name, 'median_s': median, 'min_s': min(samples), 'repeats': len(samples),
+                            'units': units, 'unit': unit_name, 'throughput': units / median if median else 0.0,
+                            'peak_bytes': peak_memory(fn)})
+        finally:
+            for cleanup in teardown:
+                cleanup()
+        print(_row(results[-1]), flush=True)
+    return results
+
+
+def _row(r: Dict[str, Any], base: Optional[Dict[str, Any]]=None) -> str:
+    line = (f"{r['name']:<28} {r['median_s'] * 1e3:>10.3f} ms {r['min_s'] * 1e3:>10.3f} ms "
+            f"{r['throughput']:>14,.0f} {r['unit']}/s {r['peak_bytes'] / 1e6:>9.2f} MB")
+    if base is not None:
+        line += f"  {r['median_s'] / base['median_s'] - 1.0:+7.1%}"
+    return line
+
+
+def compare(results: List[Dict[str, Any]], baseline: Dict[str, Any], threshold: float) -> List[str]:
+    base = {r['name']: r for r in baseline.get('results', [])}
+    regressions = []
+    print(f"\n{'case':<28} {'median':>13} {'min':>13} {'throughput':>20} {'peak':>12}  vs baseline")
+    for r in results:
+        b = base.get(r['name'])
+        print(_row(r, b) + ('' if b is None else ('  REGRESSION' if r['median_s'] > b['median_s'] * (1.0 + threshold) else '')))
+        if b is not None and r['median_s'] > b['median_s'] * (1.0 + threshold):
+            regressions.append(r['name'])
+    return regressions
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description='Offline benchmarks for decoding, parsing, hub lookup, scoring and the pipeline')
+    ap.add_argument('--only', default='', help='comma-separated substrings of case names')
+    ap.add_argument('--quick', action='store_true', help='skip the largest cases')
+    ap.add_argument('--min-time', type=float, default=MIN_TIME_S, help='seconds of timed runs per case')
+    ap.add_argument('--baseline', default='', help='compare against this baseline JSON')
+    ap.add_argument('--save-baseline', default='', help='write results to this JSON')
+    ap.add_argument('--threshold', type=float, default=REGRESSION_THRESHOLD, help='allowed median slowdown (0.25 = 25%%)')
+    ap.add_argument('--record', action='store_true', help='record live OSRM/ORS responses into the fixtures dir first')
+    ap.add_argument('--list', action='store_true')
+    args = ap.parse_args(argv)
+    if args.list:
+        print('\n'.join(name for name, _ in _cases))
+        return 0
+    if args.record:
+        record_fixtures(os.environ.get('ORS_API_KEY', ''))
+    random.seed(0)
+    print(f"{'case':<28} {'median':>13} {'min':>13} {'throughput':>20} {'peak':>12}")
+    results = run_cases(args)
+    if args.save_baseline:
+        with open(args.save_baseline, 'w', encoding='utf-8') as fh:
+            json.dump({'python': platform.python_version(), 'numpy': np.__version__, 'machine': platform.machine(),
+                       'created': time.strftime('%Y-%m-%dT%H:%M:%S'), 'results': results}, fh, indent=1)
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as fh:
+            regressions = compare(results, json.load(fh), args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) beyond {args.threshold:.0%}: {', '.join(regressions)}", file=sys.stderr)
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
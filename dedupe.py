@@ -0,0 +1,164 @@
+import os
+from typing import Callable, List, Sequence, Tuple, Iterable, Optional
+import numpy as np
+from geometry_utils import EARTH_RADIUS_KM
+from metrics import inc, timed
+from routes import Route, as_route
+
+# Near-duplicate alternatives (ORS and OSRM returning the same road, itineraries through neighbouring hubs)
+# are collapsed before scoring. Two routes of the same mode are duplicates when their distances agree within
+# DEDUP_LENGTH_RATIO and, with both resampled to DEDUP_SAMPLES points evenly spaced by arc length, no pair of
+# corresponding points is further apart than DEDUP_TOLERANCE x distance (at least DEDUP_MIN_KM). That point-wise
+# maximum is an upper bound on the discrete Fréchet distance. DEDUP_TOLERANCE=0 turns de-duplication off.
+DEDUP_TOLERANCE = float(os.environ.get('DEDUP_TOLERANCE', 0.01))
+DEDUP_MIN_KM = float(os.environ.get('DEDUP_MIN_KM', 0.05))
+DEDUP_LENGTH_RATIO = 0.05
+DEDUP_SAMPLES = 64
+# Lines are first thinned to at most this many evenly strided vertices; a chord deviates from a smooth road
+# by far less than the tolerance, and it keeps dozens of 10k-point alternatives within a few milliseconds
+DEDUP_MAX_POINTS = 512
+# Builders start with this many candidates per requested alternative so that dropped duplicates can be backfilled,
+# and double the pool while fewer than the requested number survive, up to DEDUP_MAX_POOL candidates
+DEDUP_POOL_FACTOR = 2
+DEDUP_MAX_POOL = int(os.environ.get('DEDUP_MAX_POOL', 64))
+
+KM_PER_DEG = EARTH_RADIUS_KM * np.pi / 180.0
+
+
+def project_km(coords: np.ndarray) -> np.ndarray:
+    # sinusoidal projection: x/y in km, distances accurate locally (all duplicate tests are local)
+    lat = coords[:, 0]
+    return np.column_stack((coords[:, 1] * np.cos(np.radians(lat)), lat)) * KM_PER_DEG
+
+
+def thin(coords: np.ndarray, max_points: int=DEDUP_MAX_POINTS) -> np.ndarray:
+    if len(coords) <= max_points:
+        return coords
+    return coords[np.linspace(0, len(coords) - 1, max_points).round().astype(np.int64)]
+
+
+def _concat(lines: Sequence[np.ndarray]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    # one projected point buffer for all lines, plus each line's start offset and length
+    lens = np.array([len(line) for line in lines], dtype=np.int64)
+    starts = np.concatenate(([0], np.cumsum(lens)[:-1]))
+    return project_km(np.concatenate(lines)), starts, lens
+
+
+def bboxes(pts: np.ndarray, starts: np.ndarray) -> np.ndarray:
+    # (m, 4) min_x, min_y, max_x, max_y per line
+    return np.hstack((np.minimum.reduceat(pts, starts, axis=0), np.maximum.reduceat(pts, starts, axis=0)))
+
+
+def resample(pts: np.ndarray, starts: np.ndarray, lens: np.ndarray, samples: int=DEDUP_SAMPLES) -> np.ndarray:
+    # (m, samples, 2): points at evenly spaced arc-length fractions of each line (every line needs >= 2 points),
+    # found for all lines at once with one searchsorted over [2*line + fraction] keys
+    m = len(lens)
+    line = np.repeat(np.arange(m), lens)
+    seg = np.hypot(*np.diff(pts, axis=0, prepend=pts[:1]).T)
+    seg[starts] = 0.0
+    arc = np.cumsum(seg)
+    arc -= np.repeat(arc[starts], lens)
+    total = arc[starts + lens - 1]
+    key = 2.0 * line + arc / np.repeat(np.where(total > 0, total, 1.0), lens)
+    target = (2.0 * np.arange(m)[:, None] + np.linspace(0.0, 1.0, samples)[None, :]).ravel()
+    lo = np.repeat(starts, samples)
+    j = np.clip(np.searchsorted(key, target, side='right') - 1, lo, lo + np.repeat(lens, samples) - 2)
+    span = key[j + 1] - key[j]
+    frac = np.clip(np.divide(target - key[j], span, out=np.zeros_like(span), where=span > 0), 0.0, 1.0)
+    out = pts[j] + frac[:, None] * (pts[j + 1] - pts[j])
+    return out.reshape(m, samples, 2)
+
+
+def duplicate_pairs(routes: Sequence[Route], tolerance: float=DEDUP_TOLERANCE, min_km: float=DEDUP_MIN_KM,
+                    samples: int=DEDUP_SAMPLES) -> np.ndarray:
+    # (p, 2) index pairs i < j of near-duplicate routes. Distance and bounding-box prefilters run first, so
+    # geometry is decoded and resampled only for routes that could still have a duplicate.
+    n = len(routes)
+    if n < 2 or tolerance <= 0:
+        return np.empty((0, 2), dtype=np.int64)
+    modes = np.array([r.mode for r in routes], dtype=object)
+    length = np.array([r.distance_km for r in routes], dtype=np.float64)
+    tol = np.maximum(min_km, tolerance * length)
+    i, j = np.triu_indices(n, 1)
+    longer = np.maximum(length[i], length[j])
+    keep = (modes[i] == modes[j]) & (np.abs(length[i] - length[j]) <= DEDUP_LENGTH_RATIO * longer)
+    i, j = i[keep], j[keep]
+    if not len(i):
+        return np.empty((0, 2), dtype=np.int64)
+    need = np.unique(np.concatenate((i, j)))
+    lines = {k: thin(routes[k].coords_latlon) for k in need.tolist()}
+    need = np.array([k for k, line in lines.items() if len(line) >= 2], dtype=np.int64)
+    keep = np.isin(i, need) & np.isin(j, need)
+    i, j = i[keep], j[keep]
+    if not len(i):
+        return np.empty((0, 2), dtype=np.int64)
+    pts, starts, lens = _concat([lines[k] for k in need.tolist()])
+    slot = np.full(n, -1, dtype=np.int64)
+    slot[need] = np.arange(len(need))
+    box = bboxes(pts, starts)
+    pair_tol = np.maximum(tol[i], tol[j])
+    keep = np.all(np.abs(box[slot[i]] - box[slot[j]]) <= pair_tol[:, None], axis=1)
+    i, j, pair_tol = i[keep], j[keep], pair_tol[keep]
+    if not len(i):
+        return np.empty((0, 2), dtype=np.int64)
+    # resample only the lines still in a candidate pair
+    used = np.unique(np.concatenate((slot[i], slot[j])))
+    point_mask = np.repeat(np.isin(np.arange(len(need)), used), lens)
+    sub_lens = lens[used]
+    sub = resample(pts[point_mask], np.concatenate(([0], np.cumsum(sub_lens)[:-1])), sub_lens, samples)
+    pos = np.full(len(need), -1, dtype=np.int64)
+    pos[used] = np.arange(len(used))
+    gap = np.hypot(*(sub[pos[slot[i]]] - sub[pos[slot[j]]]).transpose(2, 0, 1)).max(axis=1)
+    dup = gap <= pair_tol
+    return np.column_stack((i[dup], j[dup]))
+
+
+def _dedupe(routes: List[Route], limit: int, tolerance: float, min_km: float) -> Tuple[List[Route], int]:
+    pairs = duplicate_pairs(routes, tolerance, min_km)
+    if not len(pairs):
+        return routes[:limit], 0
+    earlier = {}
+    for a, b in pairs.tolist():
+        earlier.setdefault(b, []).append(a)
+    kept, keep, dropped = [], np.zeros(len(routes), dtype=bool), 0
+    for k, r in enumerate(routes):
+        if len(kept) >= limit:
+            break
+        if any(keep[a] for a in earlier.get(k, ())):
+            dropped += 1
+            continue
+        keep[k] = True
+        kept.append(r)
+    return kept, dropped
+
+
+@timed('dedupe_seconds')
+def dedupe_routes(routes: Iterable, limit: Optional[int]=None, tolerance: float=DEDUP_TOLERANCE,
+                  min_km: float=DEDUP_MIN_KM) -> List[Route]:
+    # Input order is priority: a route is dropped when an earlier kept route duplicates it, and later routes
+    # backfill until `limit` routes are kept
+    routes = [as_route(r) for r in routes]
+    kept, dropped = _dedupe(routes, len(routes) if limit is None else limit, tolerance, min_km)
+    if dropped:
+        inc('routes_deduplicated_total', dropped)
+    return kept
+
+
+@timed('dedupe_seconds')
+def dedupe_candidates(candidates: Callable[[int], List[Route]], limit: int, tolerance: float=DEDUP_TOLERANCE,
+                      min_km: float=DEDUP_MIN_KM, max_pool: int=DEDUP_MAX_POOL) -> List[Route]:
+    # candidates(n) returns the n best routes in priority order, fewer once it runs out. The pool starts at
+    # DEDUP_POOL_FACTOR x limit and doubles until `limit` distinct routes survive, the candidates are exhausted
+    # or max_pool is reached; fewer than `limit` routes come back only in the last two cases.
+    if tolerance <= 0:
+        return candidates(limit)[:limit]
+    pool = limit * DEDUP_POOL_FACTOR
+    while True:
+        routes = candidates(pool)
+        kept, dropped = _dedupe(routes, limit, tolerance, min_km)
+        if len(kept) >= limit or len(routes) < pool or pool >= max_pool:
+            break
+        pool = min(pool * 2, max_pool)
+    if dropped:
+        inc('routes_deduplicated_total', dropped)
+    return kept
@@ -0,0 +1,30 @@
+import json
+from typing import Any, Union
+
+# JSON for provider responses and cache rows: orjson when installed (optional, several times faster on
+# multi-MB route responses), otherwise the standard library. Both return plain dicts/lists.
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+BACKEND = 'orjson' if orjson is not None else 'json'
+
+
+def loads(data: Union[bytes, str]) -> Any:
+    if orjson is not None:
+        try:
+            return orjson.loads(data)
+        except orjson.JSONDecodeError:
+            pass  # NaN/Infinity literals, which only the standard module accepts
+    return json.loads(data)
+
+
+def dumps(value: Any) -> str:
+    # compact separators, like json.dumps(..., separators=(',', ':'))
+    if orjson is not None:
+        try:
+            return orjson.dumps(value, option=orjson.OPT_SERIALIZE_NUMPY).decode()
+        except TypeError:
+            pass
+    return json.dumps(value, separators=(',', ':'))
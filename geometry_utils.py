@@ -1,11 +1,199 @@
 import math
-from typing import Tuple
+from typing import Tuple, List, Sequence, Any
+import numpy as np
+
+EARTH_RADIUS_KM = 6371.0088
+# Upper bound on temporaries per haversine_matrix block (bytes)
+MATRIX_CHUNK_BYTES = 64 * 1024 * 1024
+
 
 def haversine_km(a: Tuple[float, float], b: Tuple[float, float]) -> float:
-    R = 6371.0088
+    R = EARTH_RADIUS_KM
     lat1, lon1 = map(math.radians, a)
     lat2, lon2 = map(math.radians, b)
     dlat = lat2 - lat1
     dlon = lon2 - lon1
     h = math.sin(dlat/2)**2 + math.cos(lat1)*math.cos(lat2)*math.sin(dlon/2)**2
     return 2*R*math.asin(math.sqrt(h))
+
+
+def _radians(points, dtype) -> np.ndarray:
+    return np.radians(np.asarray(points, dtype=dtype).reshape(-1, 2))
+
+
+def _haversine_rad(lat1, lon1, lat2, lon2) -> np.ndarray:
+    h = np.sin((lat2 - lat1) * 0.5) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) * 0.5) ** 2
+    return (2.0 * EARTH_RADIUS_KM) * np.arcsin(np.sqrt(np.minimum(h, 1.0)))
+
+
+def haversine_pairwise(a, b, dtype=np.float64) -> np.ndarray:
+    # (N,2) x (N,2) [lat, lon] degrees -> (N,) km, row i of a against row i of b
+    ra, rb = _radians(a, dtype), _radians(b, dtype)
+    return _haversine_rad(ra[:, 0], ra[:, 1], rb[:, 0], rb[:, 1]).astype(dtype, copy=False)
+
+
+def haversine_one_to_many(point, points, dtype=np.float64) -> np.ndarray:
+    p, rb = _radians(point, dtype)[0], _radians(points, dtype)
+    return _haversine_rad(p[0], p[1], rb[:, 0], rb[:, 1]).astype(dtype, copy=False)
+
+
+def iter_haversine_matrix(a, b, dtype=np.float64, max_bytes: int=MATRIX_CHUNK_BYTES):
+    # Yield (row_start, block) pieces of the |a| x |b| distance matrix, each block sized so its
+    # temporaries stay under max_bytes; use directly when the full matrix should not be materialized
+    ra, rb = _radians(a, dtype), _radians(b, dtype)
+    lat2, lon2, cos2 = rb[:, 0][None, :], rb[:, 1][None, :], np.cos(rb[:, 0])[None, :]
+    rows = max(1, int(max_bytes // (4 * max(len(rb), 1) * np.dtype(dtype).itemsize)))
+    for start in range(0, len(ra), rows):
+        lat1 = ra[start:start + rows, 0][:, None]
+        lon1 = ra[start:start + rows, 1][:, None]
+        h = np.sin((lat2 - lat1) * 0.5) ** 2 + np.cos(lat1) * cos2 * np.sin((lon2 - lon1) * 0.5) ** 2
+        yield start, ((2.0 * EARTH_RADIUS_KM) * np.arcsin(np.sqrt(np.minimum(h, 1.0)))).astype(dtype, copy=False)
+
+
+def haversine_matrix(a, b, dtype=np.float64, max_bytes: int=MATRIX_CHUNK_BYTES, out: np.ndarray=None) -> np.ndarray:
+    n, m = np.asarray(a).reshape(-1, 2).shape[0], np.asarray(b).reshape(-1, 2).shape[0]
+    if out is None:
+        out = np.empty((n, m), dtype=dtype)
+    for start, block in iter_haversine_matrix(a, b, dtype, max_bytes):
+        out[start:start + len(block)] = block
+    return out
+
+
+def encode_polyline(coords, precision: int=5) -> str:
+    factor = 10 ** precision
+    out, prev_lat, prev_lon = [], 0, 0
+    for lat, lon in coords:
+        ilat, ilon = int(round(lat * factor)), int(round(lon * factor))
+        for delta in (ilat - prev_lat, ilon - prev_lon):
+            v = ~(delta << 1) if delta < 0 else (delta << 1)
+            while v >= 0x20:
+                out.append(chr((0x20 | (v & 0x1f)) + 63))
+                v >>= 5
+            out.append(chr(v + 63))
+        prev_lat, prev_lon = ilat, ilon
+    return ''.join(out)
+
+
+def _polyline_deltas(data: bytes) -> np.ndarray:
+    # Each value is a run of 5-bit chunks (+63); the 0x20 bit is clear on a run's last chunk
+    chunks = np.frombuffer(data, dtype=np.uint8).astype(np.int64) - 63
+    if chunks.size and (chunks.min() < 0 or chunks.max() > 0x3f):
+        raise ValueError('invalid polyline character')
+    ends = np.flatnonzero((chunks & 0x20) == 0)
+    if chunks.size and (ends.size == 0 or ends[-1] != chunks.size - 1):
+        raise ValueError('truncated polyline')
+    starts = np.empty_like(ends)
+    starts[:1] = 0
+    starts[1:] = ends[:-1] + 1
+    shift = 5 * (np.arange(chunks.size) - np.repeat(starts, ends - starts + 1))
+    acc = np.cumsum((chunks & 0x1f) << shift)
+    values = acc[ends] - np.concatenate(([0], acc[ends[:-1]]))
+    return np.where(values & 1, ~(values >> 1), values >> 1)
+
+
+def decode_polyline(polyline: str, precision: int=5) -> np.ndarray:
+    deltas = _polyline_deltas(polyline.encode('ascii'))
+    if deltas.size % 2:
+        raise ValueError('polyline has an odd number of values')
+    return np.cumsum(deltas.reshape(-1, 2), axis=0) / float(10 ** precision)
+
+
+def decode_polylines(polylines: Sequence[str], precision: int=5) -> List[np.ndarray]:
+    # Decode many polylines in one pass; the returned arrays are views into a single buffer
+    if not polylines:
+        return []
+    data = ''.join(polylines).encode('ascii')
+    deltas = _polyline_deltas(data)
+    terminal = ((np.frombuffer(data, dtype=np.uint8) - 63) & 0x20) == 0
+    bounds = np.concatenate(([0], np.cumsum([len(p) for p in polylines])))
+    counts = np.diff(np.concatenate(([0], np.cumsum(terminal)))[bounds])
+    if np.any(counts % 2):
+        raise ValueError('polyline has an odd number of values')
+    npts = counts // 2
+    ends = np.cumsum(npts)
+    coords = np.cumsum(deltas.reshape(-1, 2), axis=0)
+    # restart the running sum at each polyline boundary
+    carry = np.vstack((np.zeros((1, 2), dtype=np.int64), coords))[ends - npts]
+    coords = (coords - np.repeat(carry, npts, axis=0)) / float(10 ** precision)
+    return np.split(coords, ends[:-1])
+
+
+def as_latlon_array(geometry: Any, precision: int=5) -> np.ndarray:
+    # Normalize any route geometry to an (N,2) float64 [lat, lon] array
+    if geometry is None:
+        return np.empty((0, 2))
+    if isinstance(geometry, np.ndarray):
+        return geometry.reshape(-1, 2).astype(np.float64, copy=False)
+    if isinstance(geometry, str):
+        return decode_polyline(geometry, precision)
+    if isinstance(geometry, dict):
+        if geometry.get('type') != 'LineString':
+            return np.empty((0, 2))
+        lonlat = np.asarray(geometry.get('coordinates', []), dtype=np.float64)
+        return lonlat[:, [1, 0]] if lonlat.ndim == 2 else np.empty((0, 2))
+    arr = np.asarray(geometry, dtype=np.float64)
+    return arr.reshape(-1, 2) if arr.size else np.empty((0, 2))
+
+
+def pixel_tolerance_deg(zoom: float, pixels: float=1.0) -> float:
+    # Web Mercator degrees per screen pixel at the equator for a 256 px tile pyramid
+    return pixels * 360.0 / (256.0 * 2.0 ** zoom)
+
+
+def fit_zoom(points, width_px: int=900, height_px: int=560, max_zoom: int=18) -> int:
+    pts = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+    if not len(pts):
+        return 0
+    span_lat = max(float(np.ptp(pts[:, 0])), 1e-9)
+    span_lon = max(float(np.ptp(pts[:, 1])), 1e-9)
+    z = min(math.log2(width_px * 360.0 / (256.0 * span_lon)), math.log2(height_px * 180.0 / (256.0 * span_lat)))
+    return int(max(0, min(max_zoom, math.floor(z))))
+
+
+def simplify_line(coords, tolerance_deg: float) -> np.ndarray:
+    # Douglas-Peucker; every open segment is split in the same vectorized pass, so there are
+    # O(depth) NumPy rounds instead of one Python call per segment
+    pts = as_latlon_array(coords)
+    if len(pts) <= 2 or tolerance_deg <= 0:
+        return pts
+    # local equirectangular plane so lat/lon offsets are comparable
+    xy = np.column_stack((pts[:, 1] * math.cos(math.radians(float(pts[:, 0].mean()))), pts[:, 0]))
+    # pre-thin: consecutive points in the same tolerance/2 grid cell collapse to the first one
+    cell = np.floor(xy / (tolerance_deg * 0.5))
+    thin = np.empty(len(xy), dtype=bool)
+    thin[0] = thin[-1] = True
+    thin[1:-1] = np.any(cell[1:-1] != cell[:-2], axis=1)
+    pts, xy = pts[thin], xy[thin]
+    n = len(pts)
+    keep = np.zeros(n, dtype=bool)
+    keep[[0, -1]] = True
+    starts, ends = np.array([0]), np.array([n - 1])
+    tol2 = tolerance_deg * tolerance_deg
+    while len(starts):
+        sizes = ends - starts - 1
+        live = sizes > 0
+        starts, ends, sizes = starts[live], ends[live], sizes[live]
+        if not len(starts):
+            break
+        seg = np.repeat(np.arange(len(starts)), sizes)
+        offsets = np.concatenate(([0], np.cumsum(sizes)[:-1]))
+        idx = starts[seg] + 1 + (np.arange(len(seg)) - offsets[seg])
+        a, b = xy[starts[seg]], xy[ends[seg]]
+        ab = b - a
+        ap = xy[idx] - a
+        len2 = np.einsum('ij,ij->i', ab, ab)
+        t = np.clip(np.einsum('ij,ij->i', ap, ab) / np.where(len2 > 0, len2, 1.0), 0.0, 1.0)
+        d = ap - ab * t[:, None]
+        d2 = np.einsum('ij,ij->i', d, d)
+        seg_max = np.maximum.reduceat(d2, offsets)
+        split = seg_max > tol2
+        if not split.any():
+            break
+        # first index reaching each segment's maximum
+        hits = np.flatnonzero(d2 == seg_max[seg])
+        first = hits[np.unique(seg[hits], return_index=True)[1]]
+        mid = idx[first][split]
+        keep[mid] = True
+        starts = np.concatenate((starts[split], mid))
+        ends = np.concatenate((mid, ends[split]))
+    return pts[keep]
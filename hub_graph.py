@@ -0,0 +1,337 @@
+import os
+import csv
+import heapq
+import threading
+from typing import Dict, List, Tuple, Sequence, Optional, Callable
+import numpy as np
+from geometry_utils import haversine_pairwise, haversine_matrix
+from hubs import HubCatalog, get_catalog
+
+KPI_WEIGHTS = ('distance_km', 'duration_min', 'cost_inr', 'emissions_kg')
+
+# Hub-to-hub connections (CSV: src,dst[,distance_km,duration_min,cost_inr,emissions_kg][,directed]);
+# without a file every hub pair is connected directly, or the k nearest hubs for big catalogs
+HUB_EDGE_PATHS = {
+    'rail': os.environ.get('RAIL_EDGES_PATH', ''),
+    'flight': os.environ.get('AIR_EDGES_PATH', ''),
+}
+COMPLETE_GRAPH_MAX_HUBS = 200
+KNN_EDGES = 8
+HOT_HUB_COUNT = int(os.environ.get('HOT_HUB_COUNT', 64))
+# Access/egress legs are reached by other means, so the search prices them above trunk km;
+# this keeps itineraries anchored on nearby hubs instead of long "walks" to a far hub
+ACCESS_LEG_FACTOR = 3.0
+# Boarding and alighting at the same hub is only an itinerary when origin and destination are both this close to it
+SINGLE_HUB_MAX_LEG_KM = 25.0
+
+SOURCE, TARGET = -1, -2
+
+
+class HubGraph:
+    def __init__(self, catalog: HubCatalog, src, dst, weights: Dict[str, np.ndarray], leg_rates: Dict[str, float]):
+        n = len(catalog)
+        src = np.asarray(src, dtype=np.int64)
+        dst = np.asarray(dst, dtype=np.int64)
+        order = np.lexsort((dst, src))
+        self.catalog = catalog
+        self.n = n
+        self.indptr = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(np.bincount(src, minlength=n), out=self.indptr[1:])
+        self.indices = dst[order]
+        self.weights = {k: np.asarray(v, dtype=np.float64)[order] for k, v in weights.items()}
+        # per-km cost of an access/egress leg for each KPI weight (the mode's linear KPI model)
+        self.leg_rates = leg_rates
+        # A* stays admissible when the heuristic is great-circle km times the cheapest per-km edge rate
+        edge_km = self.weights['distance_km']
+        self.heuristic_rates = {}
+        for k, w in self.weights.items():
+            ok = edge_km > 0
+            ratio = float(np.min(w[ok] / edge_km[ok])) if ok.any() else 0.0
+            self.heuristic_rates[k] = max(0.0, min(ratio, leg_rates.get(k, ratio)))
+        self._hot: Dict[str, Dict[int, Tuple[np.ndarray, np.ndarray]]] = {}
+        # CSR order is (src, dst)-sorted, so src * n + dst is a sorted key for vectorized edge lookups
+        self._edge_keys = np.repeat(np.arange(n, dtype=np.int64), np.diff(self.indptr)) * n + self.indices
+        # (n, n, 4) hub-to-hub KPIs in KPI_WEIGHTS order for complete graphs (from_catalog), else None
+        self.pair_kpis: Optional[np.ndarray] = None
+
+    @property
+    def n_edges(self) -> int:
+        return len(self.indices)
+
+    @staticmethod
+    def _leg_kpis(distance_km: np.ndarray, kpis: Callable) -> Dict[str, np.ndarray]:
+        # kpis maps an array of distances (any shape) to duration/cost/CO2 arrays, e.g. optimization.rail_kpis
+        d = np.asarray(distance_km, dtype=np.float64)
+        duration, cost, emissions = (np.asarray(v, dtype=np.float64) for v in kpis(d))
+        return {'distance_km': d, 'duration_min': duration, 'cost_inr': cost, 'emissions_kg': emissions}
+
+    @classmethod
+    def _rates(cls, kpis: Callable) -> Dict[str, float]:
+        probe = 1e6
+        w = cls._leg_kpis(np.array([probe]), kpis)
+        return {k: float(v[0]) / probe for k, v in w.items()}
+
+    @classmethod
+    def from_catalog(cls, catalog: HubCatalog, kpis: Callable, k_neighbors: int=KNN_EDGES) -> 'HubGraph':
+        n = len(catalog)
+        if n <= COMPLETE_GRAPH_MAX_HUBS:
+            # dense hub-to-hub distance and KPI matrices, computed once per catalog; the edges index into them
+            pair = cls._leg_kpis(haversine_matrix(catalog.coords, catalog.coords), kpis)
+            src, dst = np.nonzero(~np.eye(n, dtype=bool))
+            graph = cls(catalog, src, dst, {k: v[src, dst] for k, v in pair.items()}, cls._rates(kpis))
+            graph.pair_kpis = np.stack([pair[k] for k in KPI_WEIGHTS], axis=-1)
+            return graph
+        idx, _ = catalog.nearest_many(catalog.coords, k=min(k_neighbors + 1, n))
+        src = np.repeat(np.arange(n), idx.shape[1] - 1)
+        dst = idx[:, 1:].ravel()
+        # symmetric: keep each undirected pair once per direction
+        pairs = np.unique(np.concatenate((np.column_stack((src, dst)), np.column_stack((dst, src)))), axis=0)
+        src, dst = pairs[:, 0], pairs[:, 1]
+        dist = haversine_pairwise(catalog.coords[src], catalog.coords[dst])
+        return cls(catalog, src, dst, cls._leg_kpis(dist, kpis), cls._rates(kpis))
+
+    @classmethod
+    def from_file(cls, catalog: HubCatalog, path: str, kpis: Callable) -> 'HubGraph':
+        lookup = {str(nm): i for i, nm in enumerate(catalog.names)}
+        lookup.update({catalog.label(i): i for i in range(len(catalog))})
+        if catalog.codes is not None:
+            lookup.update({str(c): i for i, c in enumerate(catalog.codes) if c})
+        src, dst, cols = [], [], {k: [] for k in KPI_WEIGHTS}
+        with open(path, newline='', encoding='utf-8') as fh:
+            for rec in csv.DictReader(fh):
+                a, b = lookup.get(rec.get('src', '')), lookup.get(rec.get('dst', ''))
+                if a is None or b is None or a == b:
+                    continue
+                directed = str(rec.get('directed', '')).lower() in ('1', 'true', 'yes')
+                for u, v in ((a, b),) if directed else ((a, b), (b, a)):
+                    src.append(u)
+                    dst.append(v)
+                    for k in KPI_WEIGHTS:
+                        cols[k].append(float(rec[k]) if rec.get(k) not in (None, '') else np.nan)
+        src_a, dst_a = np.asarray(src, dtype=np.int64), np.asarray(dst, dtype=np.int64)
+        # missing per-edge KPIs fall back to the mode model on the great-circle distance
+        dist = np.asarray(cols['distance_km'], dtype=np.float64)
+        gc = haversine_pairwise(catalog.coords[src_a], catalog.coords[dst_a]) if len(src_a) else np.empty(0)
+        dist = np.where(np.isnan(dist), gc, dist)
+        model = cls._leg_kpis(dist, kpis)
+        weights = {k: np.where(np.isnan(np.asarray(cols[k], dtype=np.float64)), model[k], np.asarray(cols[k], dtype=np.float64))
+                   for k in KPI_WEIGHTS}
+        weights['distance_km'] = dist
+        return cls(catalog, src_a, dst_a, weights, cls._rates(kpis))
+
+    def edge_weight(self, u: int, v: int, weight: str) -> float:
+        lo, hi = self.indptr[u], self.indptr[u + 1]
+        j = lo + int(np.searchsorted(self.indices[lo:hi], v))
+        if j >= hi or self.indices[j] != v:
+            raise KeyError((u, v))
+        return float(self.weights[weight][j])
+
+    def edge_kpis(self, u: int, v: int) -> Dict[str, float]:
+        lo, hi = self.indptr[u], self.indptr[u + 1]
+        j = lo + int(np.searchsorted(self.indices[lo:hi], v))
+        return {k: float(w[j]) for k, w in self.weights.items()}
+
+    def path_kpis(self, paths: Sequence[Sequence[int]]) -> np.ndarray:
+        # (len(paths), 4) KPI totals over each hub path's edges, in KPI_WEIGHTS order
+        hops = np.array([len(p) - 1 for p in paths], dtype=np.int64)
+        out = np.zeros((len(paths), len(KPI_WEIGHTS)))
+        if not hops.sum():
+            return out
+        u = np.fromiter((a for p in paths for a in p[:-1]), dtype=np.int64, count=int(hops.sum()))
+        v = np.fromiter((b for p in paths for b in p[1:]), dtype=np.int64, count=int(hops.sum()))
+        if self.pair_kpis is not None:
+            w = self.pair_kpis[u, v]
+        else:
+            j = np.searchsorted(self._edge_keys, u * self.n + v)
+            missing = (j >= len(self._edge_keys)) | (self._edge_keys[np.minimum(j, len(self._edge_keys) - 1)] != u * self.n + v)
+            if missing.any():
+                raise KeyError((int(u[missing][0]), int(v[missing][0])))
+            w = np.column_stack([self.weights[k][j] for k in KPI_WEIGHTS])
+        np.add.at(out, np.repeat(np.arange(len(paths)), hops), w)
+        return out
+
+    # --- precomputed single-source tables for hot hubs ---
+
+    def _dijkstra(self, source: int, weight: str) -> Tuple[np.ndarray, np.ndarray]:
+        w = self.weights[weight]
+        dist = np.full(self.n, np.inf)
+        pred = np.full(self.n, -1, dtype=np.int64)
+        dist[source] = 0.0
+        heap = [(0.0, source)]
+        indptr, indices = self.indptr, self.indices
+        while heap:
+            d, u = heapq.heappop(heap)
+            if d > dist[u]:
+                continue
+            for j in range(indptr[u], indptr[u + 1]):
+                v = indices[j]
+                nd = d + w[j]
+                if nd < dist[v]:
+                    dist[v] = nd
+                    pred[v] = u
+                    heapq.heappush(heap, (nd, int(v)))
+        return dist, pred
+
+    def precompute(self, hubs: Optional[Sequence[int]]=None, weight: str='distance_km'):
+        if hubs is None:
+            degree = np.diff(self.indptr)
+            hubs = np.argsort(-degree, kind='stable')[:HOT_HUB_COUNT]
+        table = self._hot.setdefault(weight, {})
+        for h in np.asarray(hubs).tolist():
+            if h not in table:
+                table[h] = self._dijkstra(h, weight)
+        return self
+
+    def hot_path(self, s: int, t: int, weight: str='distance_km') -> Optional[Tuple[float, List[int]]]:
+        row = self._hot.get(weight, {}).get(s)
+        if row is None or not np.isfinite(row[0][t]):
+            return None
+        path, u = [t], t
+        while u != s:
+            u = int(row[1][u])
+            path.append(u)
+        return float(row[0][t]), path[::-1]
+
+    # --- itinerary search over a virtual source/target wired to the access/egress hubs ---
+
+    def _search(self, start: int, access: Dict[int, float], egress: Dict[int, float], h: np.ndarray, weight: str,
+                banned_nodes: set, banned_edges: set) -> Optional[Tuple[float, List[int]]]:
+        w = self.weights[weight]
+        indptr, indices = self.indptr, self.indices
+        best = {start: 0.0}
+        pred: Dict[int, int] = {}
+        heap = [(0.0, 0.0, start)]
+        while heap:
+            _, g, u = heapq.heappop(heap)
+            if g > best.get(u, np.inf):
+                continue
+            if u == TARGET:
+                path = [u]
+                while path[-1] != start:
+                    path.append(pred[path[-1]])
+                return g, path[::-1]
+            if u == SOURCE:
+                nbrs = access.items()
+            else:
+                nbrs = [(int(indices[j]), float(w[j])) for j in range(indptr[u], indptr[u + 1])]
+                if u in egress:
+                    nbrs.append((TARGET, egress[u]))
+            for v, c in nbrs:
+                if v in banned_nodes or (u, v) in banned_edges:
+                    continue
+                nd = g + c
+                if nd < best.get(v, np.inf):
+                    best[v] = nd
+                    pred[v] = u
+                    heapq.heappush(heap, (nd + (h[v] if v >= 0 else 0.0), nd, v))
+        return None
+
+    def _path_cost(self, path: List[int], access: Dict[int, float], egress: Dict[int, float], weight: str) -> float:
+        cost = 0.0
+        for u, v in zip(path, path[1:]):
+            if u == SOURCE:
+                cost += access[v]
+            elif v == TARGET:
+                cost += egress[u]
+            else:
+                cost += self.edge_weight(u, v, weight)
+        return cost
+
+    def _first_from_hot(self, access: Dict[int, float], egress: Dict[int, float], weight: str):
+        table = self._hot.get(weight, {})
+        if not access or any(o not in table for o in access):
+            return None
+        origins, dests = list(access), list(egress)
+        dist = np.array([table[o][0][dests] for o in origins])
+        total = np.array([access[o] for o in origins])[:, None] + dist + np.array([egress[d] for d in dests])[None, :]
+        i, j = np.unravel_index(int(np.argmin(total)), total.shape)
+        if not np.isfinite(total[i, j]):
+            return None
+        _, hubs = self.hot_path(origins[i], dests[j], weight)
+        return float(total[i, j]), [SOURCE] + hubs + [TARGET]
+
+    def direct_itineraries(self, access: Dict[int, float], egress: Dict[int, float], k: int,
+                           weight: str='distance_km') -> List[Tuple[float, List[int]]]:
+        # Complete graphs only. Every KPI is linear in great-circle km, so a transfer o -> x -> d never beats the
+        # direct o -> d hop; the k best itineraries are the k cheapest cells of the access x egress grid, picked
+        # with argpartition. Fewer than k come back only when the grid has no more usable cells.
+        o = np.fromiter(access, dtype=np.int64, count=len(access))
+        d = np.fromiter(egress, dtype=np.int64, count=len(egress))
+        o_cost = np.fromiter(access.values(), dtype=np.float64, count=len(o))
+        d_cost = np.fromiter(egress.values(), dtype=np.float64, count=len(d))
+        cost = o_cost[:, None] + self.pair_kpis[o[:, None], d[None, :], KPI_WEIGHTS.index(weight)] + d_cost[None, :]
+        # o == d cells are single-hub itineraries; with a long access or egress leg they only repeat a real hop
+        cap = SINGLE_HUB_MAX_LEG_KM * self.leg_rates[weight] * ACCESS_LEG_FACTOR
+        cost[(o[:, None] == d[None, :]) & ((o_cost[:, None] > cap) | (d_cost[None, :] > cap))] = np.inf
+        cost = cost.ravel()
+        cells = np.flatnonzero(np.isfinite(cost))
+        k = min(k, cells.size)
+        if k <= 0:
+            return []
+        top = cells[np.argpartition(cost[cells], k - 1)[:k]] if k < cells.size else cells
+        top = top[np.argsort(cost[top], kind='stable')]
+        i, j = np.unravel_index(top, (len(o), len(d)))
+        return [(float(cost[t]), [a] if a == b else [a, b]) for t, a, b in zip(top.tolist(), o[i].tolist(), d[j].tolist())]
+
+    def k_best_itineraries(self, access: Dict[int, float], egress: Dict[int, float], k: int,
+                           weight: str='distance_km') -> List[Tuple[float, List[int]]]:
+        # Yen's k-shortest loopless paths from SOURCE to TARGET; returns (cost, hub index list)
+        if not access or not egress or k <= 0:
+            return []
+        if self.pair_kpis is not None:
+            return self.direct_itineraries(access, egress, k, weight)
+        rate = self.heuristic_rates.get(weight, 0.0)
+        targets = list(egress)
+        if rate > 0:
+            to_targets = haversine_matrix(self.catalog.coords, self.catalog.coords[targets])
+            h = np.min(to_targets * rate + np.array([egress[t] for t in targets])[None, :], axis=1)
+        else:
+            h = np.zeros(self.n)
+        first = self._first_from_hot(access, egress, weight) or self._search(SOURCE, access, egress, h, weight, set(), set())
+        if first is None:
+            return []
+        found = [first]
+        seen = {tuple(first[1])}
+        candidates: List[Tuple[float, List[int]]] = []
+        while len(found) < k:
+            prev = found[-1][1]
+            for i in range(len(prev) - 1):
+                spur, root = prev[i], prev[:i + 1]
+                banned_edges = {(p[i], p[i + 1]) for _, p in found if len(p) > i + 1 and p[:i + 1] == root}
+                banned_nodes = set(root[:-1])
+                spur_path = self._search(spur, access, egress, h, weight, banned_nodes, banned_edges)
+                if spur_path is None:
+                    continue
+                path = root[:-1] + spur_path[1]
+                key = tuple(path)
+                if key in seen:
+                    continue
+                seen.add(key)
+                heapq.heappush(candidates, (self._path_cost(path, access, egress, weight), path))
+            if not candidates:
+                break
+            found.append(heapq.heappop(candidates))
+        return [(cost, path[1:-1]) for cost, path in found]
+
+
+_graphs: Dict[str, HubGraph] = {}
+_graphs_lock = threading.Lock()
+
+
+def get_graph(kind: str, kpis: Callable) -> HubGraph:
+    with _graphs_lock:
+        if kind not in _graphs:
+            catalog = get_catalog(kind)
+            path = HUB_EDGE_PATHS.get(kind, '')
+            if path and os.path.exists(path):
+                graph = HubGraph.from_file(catalog, path, kpis)
+            else:
+                graph = HubGraph.from_catalog(catalog, kpis)
+            # hot-hub tables only help sparse graphs; complete ones answer from their pair matrices
+            _graphs[kind] = graph if graph.pair_kpis is not None else graph.precompute()
+        return _graphs[kind]
+
+
+def set_graph(kind: str, graph: HubGraph):
+    with _graphs_lock:
+        _graphs[kind] = graph
@@ -0,0 +1,151 @@
+import os
+import csv
+import threading
+from typing import Dict, Tuple, Sequence, Optional, List
+import numpy as np
+from geometry_utils import EARTH_RADIUS_KM, haversine_one_to_many, haversine_matrix
+
+# Rail & Flight hubs (India) — simplified; used when no catalog file is configured
+RAIL_HUBS = {
+    'Howrah (HWH)': (22.5893, 88.3570),
+    'Sealdah (SDAH)': (22.5697, 88.3736),
+    'New Delhi (NDLS)': (28.6430, 77.2215),
+    'Chennai Central (MAS)': (13.0823, 80.2750),
+    'Mumbai CSMT (CSMT)': (18.9398, 72.8356),
+    'Secunderabad (SC)': (17.4350, 78.5011),
+}
+
+AIR_HUBS = {
+    'Kolkata CCU': (22.6547, 88.4467),
+    'Delhi DEL': (28.5562, 77.1000),
+    'Mumbai BOM': (19.0952, 72.8741),
+    'Bengaluru BLR': (13.1992, 77.7063),
+    'Chennai MAA': (12.9941, 80.1809),
+    'Hyderabad HYD': (17.2400, 78.4294),
+}
+
+# Full national catalogs (CSV or Parquet with name/lat/lon columns, optional code)
+HUB_CATALOG_PATHS = {
+    'rail': os.environ.get('RAIL_HUBS_PATH', ''),
+    'flight': os.environ.get('AIR_HUBS_PATH', ''),
+}
+DEFAULT_HUBS = {'rail': RAIL_HUBS, 'flight': AIR_HUBS}
+
+# Below this size a vectorized scan beats building/querying a tree
+INDEX_MIN_SIZE = 64
+
+_LAT_COLS = ('lat', 'latitude', 'lat_deg')
+_LON_COLS = ('lon', 'lng', 'longitude', 'lon_deg')
+_NAME_COLS = ('name', 'station_name', 'airport_name', 'hub')
+
+
+class HubCatalog:
+    def __init__(self, names: Sequence[str], coords, codes: Optional[Sequence[str]]=None, kind: str='rail'):
+        self.kind = kind
+        self.names = np.asarray(list(names), dtype=str)
+        self.codes = np.asarray(list(codes), dtype=str) if codes is not None else None
+        self.coords = np.ascontiguousarray(np.asarray(coords, dtype=np.float64).reshape(-1, 2))
+        if len(self.names) != len(self.coords):
+            raise ValueError('hub names and coordinates differ in length')
+        self._tree = None
+        if len(self.coords) >= INDEX_MIN_SIZE:
+            try:
+                from sklearn.neighbors import BallTree
+                self._tree = BallTree(np.radians(self.coords), metric='haversine')
+            except ImportError:
+                self._tree = None
+
+    def __len__(self) -> int:
+        return len(self.coords)
+
+    @classmethod
+    def from_dict(cls, hubs: Dict[str,Tuple[float,float]], kind: str='rail') -> 'HubCatalog':
+        return cls(list(hubs), [hubs[n] for n in hubs], kind=kind)
+
+    @classmethod
+    def from_file(cls, path: str, kind: str='rail') -> 'HubCatalog':
+        if path.endswith('.parquet'):
+            import pandas as pd
+            frame = pd.read_parquet(path)
+            cols = {c.lower(): c for c in frame.columns}
+            rows = {k: frame[v].tolist() for k, v in cols.items()}
+        else:
+            with open(path, newline='', encoding='utf-8') as fh:
+                reader = csv.DictReader(fh)
+                rows = {c.lower(): [] for c in reader.fieldnames or []}
+                keys = list(zip(reader.fieldnames or [], rows))
+                for rec in reader:
+                    for src, dst in keys:
+                        rows[dst].append(rec[src])
+        pick = lambda options: next((rows[c] for c in options if c in rows), None)
+        names, lats, lons = pick(_NAME_COLS), pick(_LAT_COLS), pick(_LON_COLS)
+        if names is None or lats is None or lons is None:
+            raise ValueError(f'{path}: need name, lat and lon columns')
+        coords = np.column_stack((np.asarray(lats, dtype=np.float64), np.asarray(lons, dtype=np.float64)))
+        keep = np.isfinite(coords).all(axis=1)
+        codes = rows.get('code')
+        return cls([n for n, k in zip(names, keep) if k], coords[keep],
+                   [c for c, k in zip(codes, keep) if k] if codes is not None else None, kind=kind)
+
+    def label(self, i: int) -> str:
+        name = str(self.names[i])
+        if self.codes is not None and self.codes[i] and f'({self.codes[i]})' not in name:
+            return f'{name} ({self.codes[i]})'
+        return name
+
+    def nearest(self, point: Tuple[float,float], k: int=4) -> Tuple[np.ndarray, np.ndarray]:
+        k = min(int(k), len(self))
+        if k <= 0:
+            return np.empty(0, dtype=np.intp), np.empty(0)
+        if self._tree is not None:
+            dist, idx = self._tree.query(np.radians([point]), k=k)
+            return idx[0], dist[0] * EARTH_RADIUS_KM
+        d = haversine_one_to_many(point, self.coords)
+        idx = np.argpartition(d, k - 1)[:k] if k < len(d) else np.arange(len(d))
+        idx = idx[np.argsort(d[idx], kind='stable')]
+        return idx, d[idx]
+
+    def nearest_many(self, points, k: int=4) -> Tuple[np.ndarray, np.ndarray]:
+        pts = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        k = min(int(k), len(self))
+        if self._tree is not None:
+            dist, idx = self._tree.query(np.radians(pts), k=k)
+            return idx, dist * EARTH_RADIUS_KM
+        d = haversine_matrix(pts, self.coords)
+        idx = np.argsort(d, axis=1, kind='stable')[:, :k]
+        return idx, np.take_along_axis(d, idx, axis=1)
+
+    def within(self, point: Tuple[float,float], radius_km: float) -> Tuple[np.ndarray, np.ndarray]:
+        if self._tree is not None:
+            idx, dist = self._tree.query_radius(np.radians([point]), r=radius_km / EARTH_RADIUS_KM,
+                                                return_distance=True, sort_results=True)
+            return idx[0], dist[0] * EARTH_RADIUS_KM
+        d = haversine_one_to_many(point, self.coords)
+        idx = np.flatnonzero(d <= radius_km)
+        idx = idx[np.argsort(d[idx], kind='stable')]
+        return idx, d[idx]
+
+
+_catalogs: Dict[str, HubCatalog] = {}
+_catalogs_lock = threading.Lock()
+
+
+def get_catalog(kind: str) -> HubCatalog:
+    # Loaded once per process: the configured file if present, else the built-in hub dict
+    with _catalogs_lock:
+        if kind not in _catalogs:
+            path = HUB_CATALOG_PATHS.get(kind, '')
+            if path and os.path.exists(path):
+                _catalogs[kind] = HubCatalog.from_file(path, kind=kind)
+            else:
+                _catalogs[kind] = HubCatalog.from_dict(DEFAULT_HUBS[kind], kind=kind)
+        return _catalogs[kind]
+
+
+def set_catalog(kind: str, catalog: HubCatalog):
+    with _catalogs_lock:
+        _catalogs[kind] = catalog
+
+
+def catalog_hubs(catalog: HubCatalog, idx) -> List[Tuple[str, Tuple[float,float]]]:
+    return [(catalog.label(i), (float(catalog.coords[i, 0]), float(catalog.coords[i, 1]))) for i in np.asarray(idx).tolist()]
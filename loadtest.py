@@ -0,0 +1,184 @@
+import os
+import sys
+import json
+import time
+import random
+import socket
+import asyncio
+import argparse
+import subprocess
+from typing import Dict, Any, List, Optional, Tuple
+
+# Load test for api.py: starts the OSRM/ORS stub and the API as subprocesses (so the client, server and upstream do
+# not share a GIL), then drives the API with N keep-alive clients per concurrency level and prints throughput and
+# latency percentiles. python loadtest.py --concurrency 1,4,16,64 --duration 10 --stub-latency 0.05
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def wait_ready(host: str, port: int, timeout_s: float=30.0):
+    deadline = time.monotonic() + timeout_s
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection((host, port), timeout=0.5).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f'nothing listening on {host}:{port} after {timeout_s:.0f}s')
+
+
+def start_stack(stub_latency: float, points_per_km: float, workers: int, max_pending: int, processes: int, cache: bool) -> Tuple[str, List[subprocess.Popen]]:
+    stub_port, api_port = free_port(), free_port()
+    stub = subprocess.Popen([sys.executable, 'stub_server.py', '--port', str(stub_port), '--latency', str(stub_latency),
+                             '--points-per-km', str(points_per_km)],
+                            cwd=HERE, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    wait_ready('127.0.0.1', stub_port)
+    stub_url = f'http://127.0.0.1:{stub_port}'
+    env = dict(os.environ, OSRM_BASE_URL=stub_url, ORS_BASE_URL=stub_url, OSRM_RATE_PER_S='1e6', ORS_RATE_PER_S='1e6',
+               METRICS_PORT='0')
+    if not cache:
+        # every request goes upstream: no disk route cache, no warm store
+        env.update(ROUTE_CACHE_PATH='', WARM_STORE_PATH='')
+    api = subprocess.Popen([sys.executable, 'api.py', '--port', str(api_port), '--workers', str(workers),
+                            '--max-pending', str(max_pending), '--processes', str(processes)], cwd=HERE, env=env,
+                           stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    wait_ready('127.0.0.1', api_port)
+    return f'127.0.0.1:{api_port}', [api, stub]
+
+
+class Client:
+    # minimal HTTP/1.1 keep-alive client (Content-Length and chunked responses)
+    def __init__(self, host: str, port: int):
+        self.host, self.port = host, port
+        self.reader = self.writer = None
+
+    async def request(self, method: str, path: str, payload: Optional[Dict[str,Any]]=None) -> Tuple[int, bytes]:
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        body = json.dumps(payload).encode() if payload is not None else b''
+        self.writer.write(f'{method} {path} HTTP/1.1\r\nHost: {self.host}\r\nContent-Type: application/json\r\n'
+                          f'Content-Length: {len(body)}\r\n\r\n'.encode() + body)
+        await self.writer.drain()
+        head = (await self.reader.readuntil(b'\r\n\r\n')).decode('latin-1').split('\r\n')
+        status = int(head[0].split(' ')[1])
+        headers = {k.strip().lower(): v.strip() for k, v in (h.split(':', 1) for h in head[1:] if ':' in h)}
+        if headers.get('transfer-encoding') == 'chunked':
+            parts = []
+            while True:
+                size = int((await self.reader.readuntil(b'\r\n')).strip(), 16)
+                data = await self.reader.readexactly(size + 2)
+                if not size:
+                    break
+                parts.append(data[:-2])
+            data = b''.join(parts)
+        else:
+            data = await self.reader.readexactly(int(headers.get('content-length', 0)))
+        if headers.get('connection') == 'close':
+            await self.close()
+        return status, data
+
+    async def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            self.reader = self.writer = None
+
+
+def make_payload(endpoint: str, pairs: List[Tuple], rng: random.Random, batch_size: int, matrix_size: int) -> Dict[str,Any]:
+    if endpoint == 'batch':
+        return {'pairs': [{'origin': o, 'dest': d} for o, d in rng.sample(pairs, batch_size)]}
+    if endpoint == 'matrix':
+        pts = [o for o, _ in rng.sample(pairs, matrix_size)]
+        return {'sources': pts, 'destinations': pts}
+    o, d = rng.choice(pairs)
+    return {'origin': o, 'dest': d}
+
+
+async def run_level(addr: str, endpoint: str, concurrency: int, duration_s: float, pairs, batch_size: int,
+                    matrix_size: int, seed: int) -> Dict[str,Any]:
+    host, port = addr.rsplit(':', 1)
+    latencies, statuses = [], {}
+    stop_at = time.perf_counter() + duration_s
+
+    async def worker(k: int):
+        rng = random.Random(seed + k)
+        client = Client(host, int(port))
+        try:
+            while time.perf_counter() < stop_at:
+                payload = make_payload(endpoint, pairs, rng, batch_size, matrix_size)
+                t0 = time.perf_counter()
+                try:
+                    status, _ = await client.request('POST', '/' + endpoint, payload)
+                except (ConnectionError, asyncio.IncompleteReadError):
+                    status = 0
+                    await client.close()
+                latencies.append(time.perf_counter() - t0)
+                statuses[status] = statuses.get(status, 0) + 1
+                if status == 503:
+                    await asyncio.sleep(0.05)
+        finally:
+            await client.close()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker(k) for k in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    ok = statuses.get(200, 0)
+    lat = sorted(latencies) or [0.0]
+    pct = lambda q: lat[min(len(lat) - 1, int(q * len(lat)))]
+    per_request = batch_size if endpoint == 'batch' else 1
+    return {'concurrency': concurrency, 'requests': len(latencies), 'ok': ok, 'rejected': statuses.get(503, 0),
+            'errors': len(latencies) - ok - statuses.get(503, 0), 'rps': ok / elapsed,
+            'pairs_per_s': ok * per_request / elapsed if endpoint != 'matrix' else None,
+            'p50_ms': pct(0.5) * 1000, 'p95_ms': pct(0.95) * 1000, 'p99_ms': pct(0.99) * 1000}
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description='Load-test the routing API against the local OSRM/ORS stub')
+    ap.add_argument('--endpoint', choices=('route', 'batch', 'matrix'), default='route')
+    ap.add_argument('--concurrency', default='1,4,16,64', help='comma-separated client counts')
+    ap.add_argument('--duration', type=float, default=10.0, help='seconds per concurrency level')
+    ap.add_argument('--stub-latency', type=float, default=0.05, help='upstream latency per provider call (s)')
+    ap.add_argument('--stub-points-per-km', type=float, default=2.0, help='stub polyline density (its CPU cost)')
+    ap.add_argument('--workers', type=int, default=16, help='API worker threads per process')
+    ap.add_argument('--processes', type=int, default=1, help='API server processes')
+    ap.add_argument('--max-pending', type=int, default=64)
+    ap.add_argument('--batch-size', type=int, default=20)
+    ap.add_argument('--matrix-size', type=int, default=25)
+    ap.add_argument('--cache', action='store_true', help='keep the route cache and warm store enabled')
+    ap.add_argument('--api', default=None, help='host:port of a running API (skips starting stub + API)')
+    ap.add_argument('--seed', type=int, default=0)
+    ap.add_argument('--json', action='store_true', help='print results as JSON')
+    args = ap.parse_args(argv)
+    sys.path.insert(0, HERE)
+    from warm import catalog_pairs
+    pairs = [(list(o), list(d)) for o, d in catalog_pairs()]
+    procs = []
+    addr = args.api
+    if addr is None:
+        addr, procs = start_stack(args.stub_latency, args.stub_points_per_km, args.workers, args.max_pending,
+                                   args.processes, args.cache)
+    try:
+        results = []
+        for c in (int(x) for x in args.concurrency.split(',') if x.strip()):
+            res = asyncio.run(run_level(addr, args.endpoint, c, args.duration, pairs, args.batch_size, args.matrix_size,
+                                        args.seed))
+            results.append(res)
+            if not args.json:
+                extra = f"  {res['pairs_per_s']:8.1f} pairs/s" if args.endpoint == 'batch' else ''
+                print(f"c={c:<4d} {res['rps']:8.1f} req/s{extra}  p50 {res['p50_ms']:7.1f} ms  p95 {res['p95_ms']:7.1f} ms  "
+                      f"p99 {res['p99_ms']:7.1f} ms  ok={res['ok']} 503={res['rejected']} err={res['errors']}", flush=True)
+        if args.json:
+            print(json.dumps({'endpoint': args.endpoint, 'stub_latency_s': args.stub_latency, 'results': results}, indent=2))
+    finally:
+        for p in procs:
+            p.terminate()
+            p.wait()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
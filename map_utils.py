@@ -1,5 +1,12 @@
+import time
+import hashlib
+from collections import OrderedDict
+import numpy as np
 import folium
 from streamlit_folium import st_folium
+from metrics import observe
+from geometry_utils import as_latlon_array, simplify_line, pixel_tolerance_deg, fit_zoom
+from routes import Route
 
 # Per-mode colors
 COLORS = {
@@ -11,33 +18,92 @@ COLORS = {
     'flight_alt': ['#60a5fa', '#14b8a6', '#eab308', '#22d3ee'],
 }
 
+# Geometry is simplified to ~LOD_PIXELS at LOD_ZOOM_HEADROOM levels past the fitted zoom,
+# so zooming in a couple of steps still looks smooth
+LOD_PIXELS = 1.0
+LOD_ZOOM_HEADROOM = 2
+COORD_DECIMALS = 5
+MAP_CACHE_SIZE = 8
+MAP_HEIGHT = 560
+
+_map_cache: 'OrderedDict[tuple, folium.Map]' = OrderedDict()
 
-def draw_map(origin, dest, routes, rec_idx: int):
-    center_lat = (origin[0] + dest[0]) / 2.0
-    center_lon = (origin[1] + dest[1]) / 2.0
-    m = folium.Map(location=[center_lat, center_lon], zoom_start=6, tiles='CartoDB dark_matter')
-    folium.CircleMarker(location=list(origin), radius=6, color='#22d3ee', fill=True, fill_opacity=0.95, popup='From').add_to(m)
-    folium.CircleMarker(location=list(dest), radius=6, color='#f59e0b', fill=True, fill_opacity=0.95, popup='To').add_to(m)
 
+def route_coords(r) -> np.ndarray:
+    if isinstance(r, Route):
+        return r.coords_latlon
+    return as_latlon_array(r.get('coords_latlon', r.get('geometry')))
+
+
+def routes_fingerprint(routes) -> str:
+    h = hashlib.blake2b(digest_size=16)
+    for r in routes:
+        h.update(repr((r.get('mode', 'road'), r.get('distance_km', 0), r.get('duration_min', 0))).encode())
+        h.update(route_coords(r).tobytes())
+    return h.hexdigest()
+
+
+def route_features(routes, rec_idx: int, tolerance_deg: float):
+    # One LineString per route (plus a glow underlay for the recommended one), styles in properties
+    features, glow = [], None
     for idx, r in enumerate(routes):
         mode = r.get('mode', 'road')
         rec = (idx == rec_idx)
+        coords = simplify_line(route_coords(r), tolerance_deg)
+        if not len(coords):
+            continue
+        line = np.round(coords[:, [1, 0]], COORD_DECIMALS).tolist()
         color = COLORS[f'{mode}_rec'] if rec else COLORS[f'{mode}_alt'][idx % len(COLORS[f'{mode}_alt'])]
-        weight = 10 if rec else 6
         tooltip = f"{mode.title()} • {'Recommended' if rec else 'Alternative'} #{idx} • {r.get('distance_km',0):.1f} km, {r.get('duration_min',0):.1f} min"
-
-        coords = r.get('coords_latlon', [])
-        if coords:
-            if rec:
-                folium.PolyLine(coords, color='#000000', weight=14, opacity=0.35).add_to(m)
-            folium.PolyLine(coords, color=color, weight=weight, opacity=0.98, tooltip=tooltip).add_to(m)
+        feature = {'type': 'Feature', 'geometry': {'type': 'LineString', 'coordinates': line},
+                   'properties': {'tooltip': tooltip, 'color': color, 'weight': 10 if rec else 6, 'opacity': 0.98}}
+        if rec:
+            glow = {'type': 'Feature', 'geometry': feature['geometry'],
+                    'properties': {'tooltip': tooltip, 'color': '#000000', 'weight': 14, 'opacity': 0.35}}
+            # drawn last so the recommended route sits on top
+            rec_feature = feature
         else:
-            geom = r.get('geometry')
-            if isinstance(geom, dict) and geom.get('type') == 'LineString':
-                coords = [(lat, lon) for lon, lat in geom.get('coordinates', [])]
-                if rec:
-                    folium.PolyLine(coords, color='#000000', weight=14, opacity=0.35).add_to(m)
-                folium.PolyLine(coords, color=color, weight=weight, opacity=0.98, tooltip=tooltip).add_to(m)
+            features.append(feature)
+    if glow is not None:
+        features = [glow] + features + [rec_feature]
+    return {'type': 'FeatureCollection', 'features': features}
 
+
+def build_map(origin, dest, routes, rec_idx: int) -> folium.Map:
+    pts = [origin, dest] + [route_coords(r) for r in routes]
+    bounds = np.vstack([np.asarray(p, dtype=np.float64).reshape(-1, 2) for p in pts])
+    zoom = fit_zoom(bounds, height_px=MAP_HEIGHT)
+    tolerance = pixel_tolerance_deg(zoom + LOD_ZOOM_HEADROOM, LOD_PIXELS)
+
+    center_lat = (origin[0] + dest[0]) / 2.0
+    center_lon = (origin[1] + dest[1]) / 2.0
+    m = folium.Map(location=[center_lat, center_lon], zoom_start=zoom, tiles='CartoDB dark_matter')
+    folium.CircleMarker(location=list(origin), radius=6, color='#22d3ee', fill=True, fill_opacity=0.95, popup='From').add_to(m)
+    folium.CircleMarker(location=list(dest), radius=6, color='#f59e0b', fill=True, fill_opacity=0.95, popup='To').add_to(m)
+
+    folium.GeoJson(
+        route_features(routes, rec_idx, tolerance),
+        name='Routes',
+        style_function=lambda f: {k: f['properties'][k] for k in ('color', 'weight', 'opacity')},
+        tooltip=folium.GeoJsonTooltip(fields=['tooltip'], labels=False),
+    ).add_to(m)
     folium.LayerControl().add_to(m)
-    return st_folium(m, height=560)
+    return m
+
+
+def draw_map(origin, dest, routes, rec_idx: int):
+    # Maps are cached per route set / recommendation, so reruns that only touch other widgets reuse the rendered map
+    start = time.perf_counter()
+    key = (routes_fingerprint(routes), rec_idx, tuple(origin), tuple(dest))
+    m = _map_cache.get(key)
+    fresh = m is None
+    if fresh:
+        m = build_map(origin, dest, routes, rec_idx)
+        _map_cache[key] = m
+        while len(_map_cache) > MAP_CACHE_SIZE:
+            _map_cache.popitem(last=False)
+    _map_cache.move_to_end(key)
+    # no returned objects: panning/zooming the map does not trigger a Streamlit rerun
+    out = st_folium(m, height=MAP_HEIGHT, returned_objects=[], render=fresh)
+    observe('map_render_seconds', time.perf_counter() - start, cache='miss' if fresh else 'hit')
+    return out
@@ -0,0 +1,209 @@
+import os
+import json
+import time
+import bisect
+import functools
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from typing import Dict, Any, Tuple, Optional
+
+# In-process counters and histograms for the hot path (provider calls, parsing, scoring, map rendering).
+# Recording is a dict lookup plus a bisect under one lock, cheap enough to leave on; METRICS_ENABLED=0 turns it off.
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', '1') != '0'
+# Serve /metrics (Prometheus text) and /metrics.json on this port when > 0
+METRICS_PORT = int(os.environ.get('METRICS_PORT', '0') or 0)
+METRICS_HOST = os.environ.get('METRICS_HOST', '127.0.0.1')
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+BYTES_BUCKETS = (1e3, 4e3, 16e3, 64e3, 256e3, 1e6, 4e6, 16e6, 64e6)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+class Histogram:
+    __slots__ = ('buckets', 'counts', 'sum', 'count')
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q: float) -> float:
+        # linear interpolation inside the bucket holding the q-th observation
+        if not self.count:
+            return 0.0
+        rank, seen = q * self.count, 0
+        for i, c in enumerate(self.counts):
+            if c and seen + c >= rank:
+                lo = self.buckets[i - 1] if i > 0 else 0.0
+                hi = self.buckets[i] if i < len(self.buckets) else self.buckets[-1]
+                return lo + (hi - lo) * (rank - seen) / c
+            seen += c
+        return self.buckets[-1]
+
+
+def _labels(labels: Dict[str, Any]) -> Labels:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _fmt_labels(labels: Labels, extra: str='') -> str:
+    parts = [f'{k}="{v}"' for k, v in labels] + ([extra] if extra else [])
+    return '{' + ','.join(parts) + '}' if parts else ''
+
+
+def _le(bound) -> str:
+    return 'le="%s"' % (bound if isinstance(bound, str) else f'{bound:g}')
+
+
+class Registry:
+    def __init__(self, enabled: bool=METRICS_ENABLED):
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._counters: Dict[str, Dict[Labels, float]] = {}
+        self._hists: Dict[str, Dict[Labels, Histogram]] = {}
+
+    def inc(self, name: str, value: float=1.0, **labels):
+        if not self.enabled:
+            return
+        key = _labels(labels)
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0.0) + value
+
+    def observe(self, name: str, value: float, buckets=LATENCY_BUCKETS, **labels):
+        if not self.enabled:
+            return
+        key = _labels(labels)
+        with self._lock:
+            series = self._hists.setdefault(name, {})
+            hist = series.get(key)
+            if hist is None:
+                hist = series[key] = Histogram(buckets)
+            hist.observe(value)
+
+    def timer(self, name: str, **labels) -> '_Timer':
+        return _Timer(self, name, labels)
+
+    def timed(self, name: str, **labels):
+        def wrap(fn):
+            @functools.wraps(fn)
+            def inner(*args, **kwargs):
+                with self.timer(name, **labels):
+                    return fn(*args, **kwargs)
+            return inner
+        return wrap
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._hists.clear()
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            counters = [{'name': n, 'labels': dict(k), 'value': v}
+                        for n, series in sorted(self._counters.items()) for k, v in series.items()]
+            hists = [{'name': n, 'labels': dict(k), 'count': h.count, 'sum': h.sum,
+                      'mean': h.sum / h.count if h.count else 0.0,
+                      'p50': h.quantile(0.5), 'p95': h.quantile(0.95), 'p99': h.quantile(0.99)}
+                     for n, series in sorted(self._hists.items()) for k, h in series.items()]
+        return {'counters': counters, 'histograms': hists}
+
+    def to_json(self) -> str:
+        return json.dumps(self.snapshot())
+
+    def to_prometheus(self) -> str:
+        lines = []
+        with self._lock:
+            for name, series in sorted(self._counters.items()):
+                lines.append(f'# TYPE {name} counter')
+                for key, v in series.items():
+                    lines.append(f'{name}{_fmt_labels(key)} {v:g}')
+            for name, series in sorted(self._hists.items()):
+                lines.append(f'# TYPE {name} histogram')
+                for key, h in series.items():
+                    cum = 0
+                    for le, c in zip(h.buckets, h.counts):
+                        cum += c
+                        lines.append(f'{name}_bucket{_fmt_labels(key, _le(le))} {cum}')
+                    lines.append(f'{name}_bucket{_fmt_labels(key, _le("+Inf"))} {h.count}')
+                    lines.append(f'{name}_sum{_fmt_labels(key)} {h.sum:g}')
+                    lines.append(f'{name}_count{_fmt_labels(key)} {h.count}')
+        return '\n'.join(lines) + '\n'
+
+
+class _Timer:
+    __slots__ = ('registry', 'name', 'labels', 'start')
+
+    def __init__(self, registry: Registry, name: str, labels: Dict[str, Any]):
+        self.registry, self.name, self.labels = registry, name, labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.registry.observe(self.name, time.perf_counter() - self.start, **self.labels)
+        return False
+
+
+REGISTRY = Registry()
+inc = REGISTRY.inc
+observe = REGISTRY.observe
+timer = REGISTRY.timer
+timed = REGISTRY.timed
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    registry: Registry = REGISTRY
+
+    def log_message(self, fmt, *args):
+        pass
+
+    def do_GET(self):
+        path = self.path.split('?', 1)[0]
+        if path == '/metrics':
+            body, ctype = self.registry.to_prometheus().encode(), 'text/plain; version=0.0.4'
+        elif path == '/metrics.json':
+            body, ctype = self.registry.to_json().encode(), 'application/json'
+        else:
+            self.send_response(404)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', ctype)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def start_metrics_server(host: str=METRICS_HOST, port: int=METRICS_PORT, registry: Registry=REGISTRY):
+    handler = type('ConfiguredMetricsHandler', (MetricsHandler,), {'registry': registry})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f'http://{host}:{server.server_address[1]}'
+
+
+_server = None
+_server_lock = threading.Lock()
+
+
+def ensure_metrics_server() -> Optional[str]:
+    # Started once per process, only when METRICS_PORT is configured
+    global _server
+    if METRICS_PORT <= 0:
+        return None
+    with _server_lock:
+        if _server is None:
+            try:
+                _server = start_metrics_server()
+            except OSError:
+                # another process (e.g. a second Streamlit worker) already owns the port
+                _server = (None, None)
+        return _server[1]
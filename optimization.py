@@ -1,50 +1,233 @@
+import os
+import json
 import numpy as np
-import pandas as pd
-from sklearn.preprocessing import MinMaxScaler
+from typing import Dict, Optional, Tuple, Union, TYPE_CHECKING
+from metrics import timed
+
+if TYPE_CHECKING:
+    import pandas as pd
 
 # KPI calculators
 
-def road_cost_emissions(distance_km: float, fuel_economy_kmpl: float, fuel_price_inr: float, co2_g_per_km: float):
+def road_cost_emissions(distance_km, fuel_economy_kmpl: float, fuel_price_inr: float, co2_g_per_km: float):
+    # scalar in -> rounded floats; array in (e.g. a distance matrix) -> arrays of the same shape
+    if np.ndim(distance_km):
+        d = np.maximum(np.asarray(distance_km, dtype=np.float64), 0.0)
+        cost_inr = d * (fuel_price_inr / max(fuel_economy_kmpl, 0.0001))
+        emissions_kg = d * (co2_g_per_km / 1000.0)
+        return np.round(cost_inr, 2), np.round(emissions_kg, 3)
     litres = max(distance_km, 0.0) / max(fuel_economy_kmpl, 0.0001)
     cost_inr = litres * fuel_price_inr
     emissions_kg = (co2_g_per_km * max(distance_km, 0.0)) / 1000.0
     return round(cost_inr, 2), round(emissions_kg, 3)
 
-# Rail/Flight KPI models
-RAIL_SPEED_KMPH = 70.0
-RAIL_COST_PER_KM = 0.8
-RAIL_CO2_G_PER_KM = 30.0
+# Rail/Flight KPI models: per-mode parameter tables. MODE_PARAMS_PATH points at a JSON file such as
+# {"rail": {"speed_kmph": 80}, "flight": {"cost_per_km": 5.5}} that overrides individual entries.
+MODE_PARAMS: Dict[str, Dict[str, float]] = {
+    'rail': {'speed_kmph': 70.0, 'cost_per_km': 0.8, 'co2_g_per_km': 30.0},
+    'flight': {'speed_kmph': 650.0, 'cost_per_km': 6.0, 'co2_g_per_km': 120.0},
+}
+MODE_PARAMS_PATH = os.environ.get('MODE_PARAMS_PATH', '')
+
+
+def load_mode_params(path: str) -> Dict[str, Dict[str, float]]:
+    with open(path, encoding='utf-8') as fh:
+        overrides = json.load(fh)
+    for mode, params in overrides.items():
+        MODE_PARAMS.setdefault(mode, {}).update({k: float(v) for k, v in params.items()})
+    return MODE_PARAMS
+
+
+if MODE_PARAMS_PATH:
+    load_mode_params(MODE_PARAMS_PATH)
+
+
+def mode_kpis(mode: str, distance_km, params: Optional[Dict[str, float]]=None):
+    # (duration_min, cost_inr, emissions_kg) for one distance (floats) or an array of any shape (arrays)
+    p = params or MODE_PARAMS[mode]
+    d = np.maximum(np.asarray(distance_km, dtype=np.float64), 0.0)
+    out = (np.round(d * (60.0 / p['speed_kmph']), 2), np.round(d * p['cost_per_km'], 2),
+           np.round(d * (p['co2_g_per_km'] / 1000.0), 3))
+    return out if np.ndim(distance_km) else tuple(float(x) for x in out)
+
+
+def kpi_table(mode: str, distance_km, params: Optional[Dict[str, float]]=None) -> np.ndarray:
+    # distances of any shape -> (..., 4) KPIs in SCORE_COLUMNS order
+    d = np.maximum(np.asarray(distance_km, dtype=np.float64), 0.0)
+    return np.stack((d,) + mode_kpis(mode, d, params), axis=-1)
+
+
+def rail_kpis(distance_km):
+    return mode_kpis('rail', distance_km)
+
+
+def flight_kpis(distance_km):
+    return mode_kpis('flight', distance_km)
+
+
+# Scoring (pure NumPy; lower is better)
+SCORE_COLUMNS = ('distance_km', 'duration_min', 'cost_inr', 'emissions_kg')
+# Bound on the pairwise-comparison temporaries in pareto_front (bytes)
+PARETO_CHUNK_BYTES = 32 * 1024 * 1024
+
+
+def kpi_matrix(data) -> np.ndarray:
+    # (N,4) float64 view/copy from a 2-D array, a structured array with SCORE_COLUMNS fields,
+    # or a routes.RouteSet (its KPI matrix, returned as is)
+    if hasattr(data, 'kpi_matrix'):
+        return data.kpi_matrix()
+    arr = np.asarray(data)
+    if arr.dtype.names:
+        return np.column_stack([arr[c].astype(np.float64, copy=False) for c in SCORE_COLUMNS])
+    return np.asarray(arr, dtype=np.float64).reshape(-1, len(SCORE_COLUMNS))
+
 
-FLIGHT_SPEED_KMPH = 650.0
-FLIGHT_COST_PER_KM = 6.0
-FLIGHT_CO2_G_PER_KM = 120.0
+def weight_vector(weights: Union[Dict[str,float], np.ndarray, None]) -> np.ndarray:
+    if weights is None:
+        return np.ones(len(SCORE_COLUMNS))
+    if isinstance(weights, dict):
+        return np.array([weights.get(c, 1.0) for c in SCORE_COLUMNS], dtype=np.float64)
+    return np.asarray(weights, dtype=np.float64)
 
 
-def rail_kpis(distance_km: float):
-    duration_min = (max(distance_km, 0.0) / RAIL_SPEED_KMPH) * 60.0
-    cost_inr = max(distance_km, 0.0) * RAIL_COST_PER_KM
-    emissions_kg = (RAIL_CO2_G_PER_KM * max(distance_km, 0.0)) / 1000.0
-    return round(duration_min, 2), round(cost_inr, 2), round(emissions_kg, 3)
+def _group_index(groups, n: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    # (stable order sorting rows by group, start offset of each group in that order, group id per row)
+    if groups is None:
+        return np.arange(n), np.zeros(1 if n else 0, dtype=np.int64), np.zeros(n, dtype=np.int64)
+    _, gid = np.unique(np.asarray(groups), return_inverse=True)
+    gid = gid.reshape(-1)
+    order = np.argsort(gid, kind='stable')
+    starts = np.flatnonzero(np.r_[True, np.diff(gid[order]) != 0]) if n else np.zeros(0, dtype=np.int64)
+    return order, starts, gid
 
 
-def flight_kpis(distance_km: float):
-    duration_min = (max(distance_km, 0.0) / FLIGHT_SPEED_KMPH) * 60.0
-    cost_inr = max(distance_km, 0.0) * FLIGHT_COST_PER_KM
-    emissions_kg = (FLIGHT_CO2_G_PER_KM * max(distance_km, 0.0)) / 1000.0
-    return round(duration_min, 2), round(cost_inr, 2), round(emissions_kg, 3)
+def normalize_minmax(X, groups=None) -> np.ndarray:
+    # Per-column (and per-group) min-max scaling to [0,1]; a constant column maps to 0 (as sklearn's MinMaxScaler)
+    X = kpi_matrix(X)
+    if not len(X):
+        return X.copy()
+    order, starts, gid = _group_index(groups, len(X))
+    Xs = X[order]
+    lo = np.minimum.reduceat(Xs, starts, axis=0)
+    hi = np.maximum.reduceat(Xs, starts, axis=0)
+    span = hi - lo
+    span[span == 0] = 1.0
+    return (X - lo[gid]) / span[gid]
 
 
-def score_df(df: pd.DataFrame, weights: dict):
+def pareto_front(X, groups=None) -> np.ndarray:
+    # Boolean mask of non-dominated rows (minimizing every column), evaluated within each group
+    X = kpi_matrix(X)
+    n, d = X.shape
+    if not n:
+        return np.zeros(0, dtype=bool)
+    order, starts, gid = _group_index(groups, n)
+    sizes = np.diff(np.r_[starts, n])
+    k = int(sizes.max())
+    # pad groups to (G,K,d); +inf rows never dominate anything
+    pos = np.arange(n) - np.repeat(starts, sizes)
+    padded = np.full((len(starts), k, d), np.inf)
+    padded[gid[order], pos] = X[order]
+    dominated = np.zeros((len(starts), k), dtype=bool)
+    # j dominates i iff j <= i everywhere and not i <= j everywhere (i.e. not identical)
+    if k * k * d <= PARETO_CHUNK_BYTES:
+        rows = max(1, int(PARETO_CHUNK_BYTES // (k * k * d)))
+        for g0 in range(0, len(starts), rows):
+            P = padded[g0:g0 + rows]
+            le = np.all(P[:, :, None, :] <= P[:, None, :, :], axis=3)
+            dominated[g0:g0 + rows] = np.any(le & ~le.transpose(0, 2, 1), axis=1)
+    else:
+        # a single huge group: compare row blocks against the whole group
+        step = max(1, int(PARETO_CHUNK_BYTES // (k * d)))
+        for g in range(len(starts)):
+            P = padded[g]
+            for i0 in range(0, k, step):
+                B = P[i0:i0 + step]
+                le = np.all(P[:, None, :] <= B[None, :, :], axis=2)
+                ge = np.all(P[:, None, :] >= B[None, :, :], axis=2)
+                dominated[g, i0:i0 + step] = np.any(le & ~ge, axis=0)
+    mask = np.empty(n, dtype=bool)
+    mask[order] = ~dominated[gid[order], pos]
+    return mask
+
+
+def score_batch(X, weights=None, groups=None, with_pareto: bool=True) -> Tuple[np.ndarray, np.ndarray, Optional[np.ndarray]]:
+    # Scores for every row, the best row index per group (groups in sorted label order), Pareto mask
+    X = kpi_matrix(X)
+    norm = normalize_minmax(X, groups)
+    scores = norm @ weight_vector(weights)
+    if not len(X):
+        return scores, np.zeros(0, dtype=np.int64), (np.zeros(0, dtype=bool) if with_pareto else None)
+    order, starts, gid = _group_index(groups, len(X))
+    # first row (in original order) reaching its group's minimum score
+    ranked = scores[order]
+    is_min = ranked == np.repeat(np.minimum.reduceat(ranked, starts), np.diff(np.r_[starts, len(X)]))
+    hits = np.flatnonzero(is_min)
+    hit_groups = gid[order][hits]
+    best = order[hits[np.r_[True, np.diff(hit_groups) != 0]]]
+    return scores, best, (pareto_front(X, groups) if with_pareto else None)
+
+
+@timed('score_seconds')
+def score_df(df: 'pd.DataFrame', weights: dict, sweep: Optional['WeightSweep']=None):
+    # with a precomputed sweep for the same rows, rescoring reuses its normalized matrix
+    df = df.copy()
     if df.empty:
         df['score'] = []
         return df, -1
-    cols = ['distance_km', 'duration_min', 'cost_inr', 'emissions_kg']
-    scaler = MinMaxScaler()
-    norm = scaler.fit_transform(df[cols])
-    w = np.array([weights.get(c, 1.0) for c in cols])
-    scores = (norm @ w.reshape(-1,1)).flatten()
+    X = df[list(SCORE_COLUMNS)].to_numpy(dtype=np.float64)
+    if sweep is not None:
+        scores, pareto = sweep.scores(weights), pareto_front(X)
+        best_idx = int(np.argmin(scores))
+    else:
+        scores, best, pareto = score_batch(X, weights)
+        best_idx = int(best[0])
     df['score'] = scores
-    best_idx = int(np.argmin(scores))
+    df['pareto'] = pareto
     df['tag'] = ''
     df.loc[df.index[best_idx], 'tag'] = 'recommended'
     return df.sort_values(by='score').reset_index(drop=True), best_idx
+
+
+# Weight-sensitivity sweep: winners for a whole grid of weight vectors in one matrix multiply
+SWEEP_AXIS_VALUES = tuple(np.round(np.arange(0.0, 3.0001, 0.25), 2))
+
+
+def weight_grid(values=SWEEP_AXIS_VALUES) -> np.ndarray:
+    # Cartesian grid: every combination of `values` for the four weights -> (len(values)**4, 4)
+    axes = np.meshgrid(*([np.asarray(values, dtype=np.float64)] * len(SCORE_COLUMNS)), indexing='ij')
+    return np.column_stack([a.ravel() for a in axes])
+
+
+def simplex_weights(steps: int=20) -> np.ndarray:
+    # Lattice on the probability simplex (weights summing to 1); scores only depend on weight ratios
+    grid = weight_grid(np.arange(steps + 1))
+    return grid[grid.sum(axis=1) == steps] / float(steps)
+
+
+class WeightSweep:
+    def __init__(self, X, weights: Optional[np.ndarray]=None):
+        self.norm = normalize_minmax(X)
+        self.weights = weight_grid() if weights is None else np.asarray(weights, dtype=np.float64)
+        # (N routes, W weight vectors); argmin keeps the first route on ties, like score_df
+        self.winners = np.argmin(self.norm @ self.weights.T, axis=0) if len(self.norm) else np.zeros(len(self.weights), dtype=np.int64)
+
+    def scores(self, weights) -> np.ndarray:
+        return self.norm @ weight_vector(weights)
+
+    def lookup(self, weights) -> int:
+        # winner at the nearest swept weight vector
+        if not len(self.norm):
+            return -1
+        i = int(np.argmin(((self.weights - weight_vector(weights)) ** 2).sum(axis=1)))
+        return int(self.winners[i])
+
+    def shares(self) -> np.ndarray:
+        # fraction of the swept weight space each route wins
+        if not len(self.norm):
+            return np.zeros(0)
+        return np.bincount(self.winners, minlength=len(self.norm)) / float(len(self.winners))
+
+
+def weight_sweep(X, weights: Optional[np.ndarray]=None) -> WeightSweep:
+    return WeightSweep(X, weights)
@@ -0,0 +1,156 @@
+import copy
+from collections import Counter
+from typing import List, Dict, Any, Iterable, Tuple, Optional
+import numpy as np
+import pandas as pd
+
+from providers import fetch_mode_routes, road_steps_on_demand
+from metrics import inc, timer
+from routes import Route, RouteSet, as_route
+from warm import get_warm_store
+from optimization import road_cost_emissions, score_df, weight_sweep, kpi_matrix, SCORE_COLUMNS
+
+MODES = ('road', 'rail', 'flight')
+DEFAULT_WEIGHTS = {'distance_km': 1.0, 'duration_min': 1.0, 'cost_inr': 1.0, 'emissions_kg': 1.0}
+# The fetch stage always asks for the most alternatives the UI offers, so alt_target changes only re-slice
+MAX_ALT_TARGET = 4
+
+# Stages: fetch (network; origin, dest, modes, avoid_tolls) -> parse (alt_target) -> kpi (road fuel/CO2 inputs)
+# -> score (weights). Each stage is a pure function of its inputs plus the previous stage's output.
+
+
+def fetch_stage(origin, dest, modes: Iterable[str], ors_api_key: str, avoid_tolls: bool,
+                concurrent: bool=True) -> Dict[str, List[Route]]:
+    # modes precomputed by the warmer (warm.py) come from the store; only the rest hit the providers
+    modes = [m for m in MODES if m in set(modes)]
+    store = get_warm_store()
+    fetched = store.get_modes(origin, dest, modes, bool(ors_api_key), avoid_tolls) if store is not None else {}
+    if 'road' in fetched:
+        # entries warmed with ROUTE_STEPS=on_demand are stepless; their steps are fetched on first access
+        fetched['road'] = road_steps_on_demand(origin, dest, fetched['road'], MAX_ALT_TARGET, ors_api_key, avoid_tolls)
+    missing = [m for m in modes if m not in fetched]
+    if missing:
+        fetched.update(fetch_mode_routes(origin, dest, missing, MAX_ALT_TARGET, ors_api_key, avoid_tolls, concurrent=concurrent))
+    return {m: fetched[m] for m in modes if m in fetched}
+
+
+def parse_stage(fetched: Dict[str, List[Route]], alt_target: int) -> List[Route]:
+    routes = []
+    for mode in MODES:
+        routes.extend(fetched.get(mode, [])[:alt_target])
+    return routes
+
+
+def kpi_stage(routes: List[Route], fuel_economy: float, fuel_price: float, co2_g_per_km: float) -> RouteSet:
+    # Only road routes depend on these inputs; rail/flight KPIs come from the builders.
+    # Routes are shallow-copied (own KPI row, shared geometry/steps) so earlier stages' cached output is never mutated.
+    out = RouteSet(copy.copy(as_route(r)) for r in routes)
+    road = out.modes == 'road'
+    if road.any():
+        cost, emissions = road_cost_emissions(out.column('distance_km')[road], fuel_economy, fuel_price, co2_g_per_km)
+        out.kpi[road, 2] = cost
+        out.kpi[road, 3] = emissions
+    # the frame shows distance/duration to 2 decimals; rounding the matrix itself keeps it identical to the frame
+    out.kpi[:, :2] = np.round(out.kpi[:, :2], 2)
+    return out
+
+
+def routes_frame(routes) -> pd.DataFrame:
+    if not isinstance(routes, RouteSet):
+        routes = RouteSet(copy.copy(as_route(r)) for r in routes)
+        routes.kpi[:, :2] = np.round(routes.kpi[:, :2], 2)
+    return pd.DataFrame({
+        'Route': np.arange(len(routes)),
+        'mode': routes.modes,
+        'distance_km': routes.column('distance_km'),
+        'duration_min': routes.column('duration_min'),
+        'cost_inr': routes.column('cost_inr'),
+        'emissions_kg': routes.column('emissions_kg'),
+        'roads_summary': [r.roads_summary for r in routes],
+    }, columns=['Route', 'mode'] + list(SCORE_COLUMNS) + ['roads_summary'])
+
+
+def build_routes(origin, dest, modes: Iterable[str], alt_target: int, ors_api_key: str, avoid_tolls: bool,
+                 fuel_economy: float, fuel_price: float, co2_g_per_km: float, concurrent: bool=True) -> RouteSet:
+    fetched = fetch_stage(origin, dest, modes, ors_api_key, avoid_tolls, concurrent=concurrent)
+    return kpi_stage(parse_stage(fetched, alt_target), fuel_economy, fuel_price, co2_g_per_km)
+
+
+def compute_and_score(origin, dest, modes: Iterable[str], alt_target: int, ors_api_key: str, avoid_tolls: bool,
+                      fuel_economy: float, fuel_price: float, co2_g_per_km: float, weights: Optional[Dict[str,float]]=None,
+                      concurrent: bool=True) -> Tuple[RouteSet, Optional[pd.DataFrame], Optional[pd.DataFrame], int]:
+    # routes, unscored frame, scored frame (sorted by score), index of the best row in the unscored frame
+    if tuple(origin) == tuple(dest):
+        raise ValueError('Origin and destination are identical. Choose different points.')
+    routes = build_routes(origin, dest, modes, alt_target, ors_api_key, avoid_tolls, fuel_economy, fuel_price,
+                          co2_g_per_km, concurrent=concurrent)
+    if not routes:
+        return routes, None, None, -1
+    df = routes_frame(routes)
+    scored_df, best_idx = score_df(df, weights or DEFAULT_WEIGHTS)
+    return routes, df, scored_df, best_idx
+
+
+def fetch_complete(fetched: Dict[str, List[Route]], modes: Iterable[str]) -> bool:
+    # every requested mode answered and road has at least one route; anything less is an outage or a missed deadline
+    modes = set(modes)
+    return all(m in fetched for m in modes) and ('road' not in modes or bool(fetched['road']))
+
+
+class StagedPipeline:
+    # Per-session memo: a stage reruns only when its own inputs or an upstream stage changed
+    STAGES = ('fetch', 'parse', 'kpi', 'score')
+
+    def __init__(self):
+        self._memo: Dict[str, Tuple[Any, Any]] = {}
+        self.runs: Counter = Counter()
+
+    def _stage(self, name: str, key, fn, keep=None):
+        hit = self._memo.get(name)
+        if hit is not None and hit[0] == key:
+            inc('pipeline_stage_reuse_total', stage=name)
+            return hit[1]
+        with timer('pipeline_stage_seconds', stage=name):
+            value = fn()
+        # a recomputed stage invalidates everything downstream of it
+        for later in self.STAGES[self.STAGES.index(name):]:
+            self._memo.pop(later, None)
+        if keep is None or keep(value):
+            self._memo[name] = (key, value)
+        self.runs[name] += 1
+        return value
+
+    @staticmethod
+    def fetch_key(origin, dest, modes: Iterable[str], ors_api_key: str, avoid_tolls: bool):
+        return (tuple(origin), tuple(dest), tuple(m for m in MODES if m in set(modes)), bool(ors_api_key), bool(avoid_tolls))
+
+    def has_fetched(self, fetch_key) -> bool:
+        hit = self._memo.get('fetch')
+        return hit is not None and hit[0] == fetch_key
+
+    def run(self, origin, dest, modes: Iterable[str], alt_target: int, ors_api_key: str, avoid_tolls: bool,
+            fuel_economy: float, fuel_price: float, co2_g_per_km: float, weights: Dict[str,float],
+            refetch: bool=False) -> Dict[str,Any]:
+        # refetch (an explicit Compute) always goes back to the providers; automatic reruns reuse the fetch.
+        # Incomplete fetches are never kept, so the next Compute retries them.
+        if refetch:
+            self._memo.clear()
+        fkey = self.fetch_key(origin, dest, modes, ors_api_key, avoid_tolls)
+        fetched = self._stage('fetch', fkey, lambda: fetch_stage(origin, dest, modes, ors_api_key, avoid_tolls),
+                              keep=lambda value: fetch_complete(value, fkey[2]))
+        pkey = (fkey, alt_target)
+        parsed = self._stage('parse', pkey, lambda: parse_stage(fetched, alt_target))
+        kkey = (pkey, fuel_economy, fuel_price, co2_g_per_km)
+
+        def kpis():
+            routes = kpi_stage(parsed, fuel_economy, fuel_price, co2_g_per_km)
+            df = routes_frame(routes)
+            sweep = weight_sweep(kpi_matrix(routes)) if len(routes) else None
+            return routes, df, sweep
+
+        routes, df, sweep = self._stage('kpi', kkey, kpis)
+        skey = (kkey, tuple(float(weights.get(c, 1.0)) for c in SCORE_COLUMNS))
+        if not routes:
+            return {'routes': routes, 'df': None, 'scored_df': None, 'best_idx': -1, 'sweep': None}
+        scored_df, best_idx = self._stage('score', skey, lambda: score_df(df, weights, sweep=sweep))
+        return {'routes': routes, 'df': df, 'scored_df': scored_df, 'best_idx': best_idx, 'sweep': sweep}
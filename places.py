@@ -0,0 +1,75 @@
+# Fixed origin/destination choices for the sidebar (city neighbourhoods served by the hub tables).
+# Module-level so they are built once per process, not on every Streamlit rerun.
+CITY_POINTS = {
+    "Garia": (22.4629, 88.3968),
+    "Behala": (22.49814, 88.31084),
+    "Jadavpur": (22.50251, 88.36761),
+    "Alipore": (22.53917, 88.32728),
+    "Connaught Place": (28.63278, 77.21972),
+    "Karol Bagh": (28.6629, 77.2100),
+    "Hauz Khas": (28.5471, 77.2040),
+    "Dwarka": (28.58452, 77.04918),
+    "Rohini": (28.7383, 77.0822),
+    "New Delhi (city core)": (28.6448, 77.21672),
+    "Lajpat Nagar": (28.56927, 77.24411),
+    "Chandni Chowk": (28.656, 77.2310),
+    "Greater Kailash": (28.54434, 77.23971),
+    "Janakpuri": (28.62, 77.09444),
+    "Bandra": (19.054444, 72.840556),
+    "Andheri": (19.114424, 72.867943),
+    "Juhu": (19.1, 72.83),
+    "Colaba": (18.91, 72.81),
+    "Dadar": (19.021, 72.841),
+    "Malad": (19.186111, 72.848611),
+    "Powai": (19.1164, 72.9047),
+    "Borivali": (19.23, 72.86),
+    "Chembur": (19.051, 72.894),
+    "Kurla": (19.059984, 72.889999),
+    "Banjara Hills": (17.415, 78.440),
+    "Gachibowli": (17.4372, 78.3444),
+    "Jubilee Hills": (17.4165, 78.4382),
+    "HITEC City": (17.44155, 78.38264),
+    "Secunderabad": (17.43993, 78.49828),
+    "Madhapur": (17.44167, 78.39167),
+    "Kondapur": (17.483, 78.417),
+    "Ameerpet": (17.437462, 78.448288),
+    "Koti": (17.38564, 78.48371),
+    "Mehdipatnam": (17.3959, 78.4312),
+    "Koramangala": (12.934533, 77.626579),
+    "Indiranagar": (12.971891, 77.641151),
+    "Whitefield": (12.971389, 77.750130),
+    "Jayanagar": (12.925, 77.595),
+    "Bellandur": (12.94721, 77.57894),
+    "M G Road": (12.973801, 77.611885),
+    "Electronic City": (12.840711, 77.676369),
+    "Malleshwaram": (13.0031, 77.5643),
+    "Yelahanka": (13.1007, 77.5963),
+    "HSR Layout": (12.94722, 77.57895),
+    "Kochi": (9.931194, 76.267306),
+    "Thiruvananthapuram": (8.524111, 76.936611),
+    "Kozhikode": (11.24802, 75.7804),
+    "Thrissur": (10.51667, 76.21667),
+    "Alappuzha": (9.49004, 76.3264),
+    "Kannur": (11.8689, 75.35546),
+    "Kollam": (8.88113, 76.58469),
+    "Kottayam": (9.58692, 76.52132),
+    "Malappuram": (11.04019, 76.08237),
+    "Varkala": (8.7333, 76.7167),
+}
+
+STATIC_FROM = {
+    "Kolkata (Esplanade)": (22.5667, 88.3667),
+    "Howrah Maidan": (22.5892, 88.3475),
+    **CITY_POINTS,
+}
+
+STATIC_TO = {
+    "Salt Lake (Sector V)": (22.5792, 88.4317),
+    "Kharagpur": (22.3400, 87.3250),
+    "Bhubaneswar": (20.2961, 85.8250),
+    "Delhi": (28.6315, 77.2167),
+    **CITY_POINTS,
+}
+
+FROM_LABELS = tuple(STATIC_FROM)
+TO_LABELS = tuple(STATIC_TO)
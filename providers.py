@@ -1,17 +1,239 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 import requests
-from typing import List, Dict, Any, Tuple
-from geometry_utils import haversine_km
+from typing import List, Dict, Any, Tuple, Optional, Union, Iterable
+import numpy as np
+from geometry_utils import haversine_km, decode_polyline
 from optimization import rail_kpis, flight_kpis
+from transport import get_transport
+from hubs import HubCatalog, get_catalog, catalog_hubs
+from hub_graph import get_graph, ACCESS_LEG_FACTOR, KPI_WEIGHTS
+from road_graph import get_road_graph
+from metrics import inc, observe, timed, BYTES_BUCKETS
+from routes import Route, Steps, Deferred, RemoteDeferred, LoadFailed
+from dedupe import dedupe_routes, dedupe_candidates
+import fastjson
+
+# OSRM public demo server (OSRM_BASE_URL / ORS_BASE_URL point the clients elsewhere, e.g. a local stub)
+OSRM_BASE_URL = os.environ.get('OSRM_BASE_URL', 'https://router.project-osrm.org')
+OSRM_URL = OSRM_BASE_URL + '/route/v1/driving/{coords}?alternatives=true&overview=full&steps=true'
+ORS_BASE_URL = os.environ.get('ORS_BASE_URL', 'https://api.openrouteservice.org')
+OSRM_TABLE_URL = OSRM_BASE_URL + '/table/v1/driving/{coords}?sources={sources}&destinations={destinations}&annotations=distance,duration'
+
+# Matrix request limits: OSRM default max-table-size (coordinates per request), ORS sources x destinations
+OSRM_TABLE_MAX_COORDS = int(os.environ.get('OSRM_TABLE_MAX_COORDS', 100))
+ORS_MATRIX_MAX_ELEMENTS = int(os.environ.get('ORS_MATRIX_MAX_ELEMENTS', 3500))
+
+# Route response cache (memory LRU + SQLite); ROUTE_CACHE_PATH='' keeps it in memory only
+ROUTE_CACHE_PATH = os.environ.get('ROUTE_CACHE_PATH', os.path.join(os.path.expanduser('~'), '.cache', 'multimodal_routes.sqlite'))
+ROUTE_CACHE_TTL_S = float(os.environ.get('ROUTE_CACHE_TTL_S', 7 * 24 * 3600))
+
+# Lean parsing keeps only KPIs per alternative and defers geometry decoding, steps and road summaries to
+# first access (the app shows steps for one route). PARSE_LEAN=0 materializes everything at parse time.
+PARSE_LEAN = os.environ.get('PARSE_LEAN', '1') != '0'
+# ROUTE_STEPS=on_demand requests routes without steps/instructions (smaller responses) and fetches the full
+# response only when a route's steps are read; OSRM summaries then come from its leg summaries, ORS has none.
+ROUTE_STEPS = os.environ.get('ROUTE_STEPS', 'full')
+# on-demand steps come from the stepped response's alternative with the same distance and duration (relative)
+STEPS_MATCH_RTOL = 1e-3
+
+
+class _Flight:
+    __slots__ = ('event', 'result', 'error')
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error: Optional[BaseException] = None
+
+
+class SingleFlight:
+    # Concurrent callers with the same key share one in-flight call and all receive its result
+    def __init__(self):
+        self._flights: Dict[str, _Flight] = {}
+        self._lock = threading.Lock()
+        self.calls = self.coalesced = 0
+
+    def do(self, key: str, fn):
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+                self.calls += 1
+            else:
+                self.coalesced += 1
+        if not leader:
+            flight.event.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+        try:
+            flight.result = fn()
+            return flight.result
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.event.set()
+
+    def stats(self) -> Dict[str,Any]:
+        total = self.calls + self.coalesced
+        return {'upstream_calls': self.calls, 'coalesced': self.coalesced, 'in_flight': len(self._flights),
+                'coalesced_ratio': (self.coalesced / total) if total else 0.0}
+
+
+ROUTE_FLIGHTS = SingleFlight()
+
+# Concurrent fan-out: per-provider deadline (seconds from submission) and worker pools.
+# Providers and modes get separate pools so a mode task never waits on its own provider calls.
+PROVIDER_DEADLINE_S = float(os.environ.get('PROVIDER_DEADLINE_S', 45.0))
+_PROVIDER_POOL = ThreadPoolExecutor(max_workers=8, thread_name_prefix='route-provider')
+_MODE_POOL = ThreadPoolExecutor(max_workers=6, thread_name_prefix='route-mode')
+
+
+class RouteCache:
+    def __init__(self, path: Optional[str]=ROUTE_CACHE_PATH, ttl_s: float=ROUTE_CACHE_TTL_S,
+                 max_memory: int=256, max_disk: int=20000, precision: int=4):
+        self.ttl_s = ttl_s
+        self.max_memory = max_memory
+        self.max_disk = max_disk
+        self.precision = precision
+        self.hits = self.disk_hits = self.misses = self.evictions = 0
+        self._mem: 'OrderedDict[str, Tuple[float, Any]]' = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = self._open(path) if path else None
+
+    @staticmethod
+    def _open(path: str):
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            db = sqlite3.connect(path, check_same_thread=False, timeout=5)
+            db.execute('PRAGMA journal_mode=WAL')
+            db.execute('CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, value TEXT NOT NULL, '
+                       'expires REAL NOT NULL, accessed REAL NOT NULL)')
+            db.execute('CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed)')
+            db.commit()
+            return db
+        except (sqlite3.Error, OSError):
+            return None
+
+    def key(self, provider: str, origin: Tuple[float,float], dest: Tuple[float,float], **options) -> str:
+        q = lambda p: [round(float(p[0]), self.precision), round(float(p[1]), self.precision)]
+        return json.dumps([provider, q(origin), q(dest), sorted(options.items())], separators=(',', ':'))
+
+    def get(self, key: str):
+        now = time.time()
+        with self._lock:
+            hit = self._mem.get(key)
+            if hit is not None:
+                if hit[0] > now:
+                    self._mem.move_to_end(key)
+                    self.hits += 1
+                    inc('route_cache_lookups_total', result='memory_hit')
+                    return hit[1]
+                del self._mem[key]
+            if self._db is not None:
+                try:
+                    row = self._db.execute('SELECT value, expires FROM responses WHERE key=?', (key,)).fetchone()
+                    if row is not None and row[1] > now:
+                        self._db.execute('UPDATE responses SET accessed=? WHERE key=?', (now, key))
+                        self._db.commit()
+                        value = fastjson.loads(row[0])
+                        self._remember(key, row[1], value)
+                        self.hits += 1
+                        self.disk_hits += 1
+                        inc('route_cache_lookups_total', result='disk_hit')
+                        return value
+                except sqlite3.Error:
+                    pass
+            self.misses += 1
+            inc('route_cache_lookups_total', result='miss')
+            return None
+
+    def put(self, key: str, value: Any, ttl_s: Optional[float]=None):
+        now = time.time()
+        expires = now + (self.ttl_s if ttl_s is None else ttl_s)
+        with self._lock:
+            self._remember(key, expires, value)
+            if self._db is None:
+                return
+            try:
+                self._db.execute('INSERT OR REPLACE INTO responses (key, value, expires, accessed) VALUES (?,?,?,?)',
+                                 (key, fastjson.dumps(value), expires, now))
+                self._db.execute('DELETE FROM responses WHERE expires<=?', (now,))
+                over = self._db.execute('SELECT COUNT(*) FROM responses').fetchone()[0] - self.max_disk
+                if over > 0:
+                    self._db.execute('DELETE FROM responses WHERE key IN '
+                                     '(SELECT key FROM responses ORDER BY accessed LIMIT ?)', (over,))
+                    self.evictions += over
+                self._db.commit()
+            except sqlite3.Error:
+                pass
+
+    def _remember(self, key: str, expires: float, value: Any):
+        self._mem[key] = (expires, value)
+        self._mem.move_to_end(key)
+        while len(self._mem) > self.max_memory:
+            self._mem.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._mem.clear()
+            if self._db is not None:
+                try:
+                    self._db.execute('DELETE FROM responses')
+                    self._db.commit()
+                except sqlite3.Error:
+                    pass
+
+    def stats(self) -> Dict[str,Any]:
+        lookups = self.hits + self.misses
+        return {'hits': self.hits, 'disk_hits': self.disk_hits, 'misses': self.misses,
+                'evictions': self.evictions, 'memory_entries': len(self._mem),
+                'hit_rate': (self.hits / lookups) if lookups else 0.0}
+
+
+_route_cache: Optional[RouteCache] = None
+_route_cache_lock = threading.Lock()
+
+
+def _record_response(provider: str, op: str, resp: requests.Response, start: float):
+    observe('provider_request_seconds', time.perf_counter() - start, provider=provider, op=op)
+    observe('provider_response_bytes', len(resp.content), buckets=BYTES_BUCKETS, provider=provider, op=op)
+    if not resp.ok:
+        inc('provider_errors_total', provider=provider, op=op, kind=f'http_{resp.status_code}')
+
+
+def _record_network_error(provider: str, op: str):
+    inc('provider_errors_total', provider=provider, op=op, kind='network')
+
+
+def get_route_cache() -> RouteCache:
+    global _route_cache
+    with _route_cache_lock:
+        if _route_cache is None:
+            _route_cache = RouteCache()
+        return _route_cache
 
-# OSRM public demo server
-OSRM_URL = 'https://router.project-osrm.org/route/v1/driving/{coords}?alternatives=true&overview=full&steps=true'
 
 class ORSClient:
-    def __init__(self, api_key: str):
+    def __init__(self, api_key: str, cache: Optional[RouteCache]=None, base_url: str=ORS_BASE_URL):
         self.api_key = api_key
-        self.url = 'https://api.openrouteservice.org/v2/directions/driving-car'
+        self.url = base_url + '/v2/directions/driving-car'
+        self.cache = cache
+        self.transport = get_transport('ors')
 
-    def fetch(self, origin: Tuple[float,float], dest: Tuple[float,float], alt_count: int, avoid_tolls: bool=False):
+    def fetch(self, origin: Tuple[float,float], dest: Tuple[float,float], alt_count: int, avoid_tolls: bool=False,
+              instructions: bool=True):
         if not self.api_key:
             return {'error': 'Missing ORS_API_KEY'}
         headers = {'Authorization': self.api_key, 'Content-Type': 'application/json'}
@@ -19,27 +241,45 @@ class ORSClient:
         use_alts = crow <= 100.0
         body = {
             'coordinates': [[origin[1], origin[0]],[dest[1], dest[0]]],
-            'instructions': True,
+            'instructions': instructions,
             'preference': 'recommended' if use_alts else 'fastest'
         }
         if use_alts:
             body['alternative_routes'] = {'share_factor':0.6,'target_count':max(1,alt_count),'weight_factor':1.4}
         if avoid_tolls:
             body['options'] = {'avoid_features':['tollways']}
+        cache = self.cache or get_route_cache()
+        key = cache.key('ors', origin, dest, alt_count=alt_count, avoid_tolls=bool(avoid_tolls), preference=body['preference'],
+                        **({} if instructions else {'instructions': False}))
+        cached = cache.get(key)
+        if cached is not None:
+            return cached
+        start = time.perf_counter()
         try:
-            resp = requests.post(self.url, json=body, headers=headers, timeout=60)
+            resp = self.transport.post(self.url, json=body, headers=headers, timeout=60)
         except requests.RequestException as e:
+            _record_network_error('ors', 'directions')
             return {'error': f'ORS network error: {e}'}
+        _record_response('ors', 'directions', resp, start)
         if resp.ok:
-            return resp.json()
+            data = fastjson.loads(resp.content)
+            cache.put(key, data)
+            return data
         if resp.status_code == 400 and use_alts:
+            # ORS rejects alternatives for some pairs; retry once without them
+            inc('ors_alternatives_fallback_total')
             body['alternative_routes'] = None
             body['preference'] = 'fastest'
+            start = time.perf_counter()
             try:
-                resp2 = requests.post(self.url, json=body, headers=headers, timeout=60)
+                resp2 = self.transport.post(self.url, json=body, headers=headers, timeout=60)
+                _record_response('ors', 'directions', resp2, start)
                 if resp2.ok:
-                    return resp2.json()
+                    data = fastjson.loads(resp2.content)
+                    cache.put(key, data)
+                    return data
             except requests.RequestException as e:
+                _record_network_error('ors', 'directions')
                 return {'error': f'ORS retry error: {e}'}
         try:
             msg = resp.json().get('error',{}).get('message') or resp.text
@@ -47,209 +287,394 @@ class ORSClient:
             msg = resp.text
         return {'error': f'ORS HTTP {resp.status_code}: {msg}'}
 
+    def matrix(self, sources, destinations) -> Dict[str,Any]:
+        if not self.api_key:
+            return {'error': 'Missing ORS_API_KEY'}
+        src, dst = np.asarray(sources, dtype=np.float64).reshape(-1, 2), np.asarray(destinations, dtype=np.float64).reshape(-1, 2)
+        body = {'locations': np.vstack((src, dst))[:, ::-1].tolist(),
+                'sources': list(range(len(src))), 'destinations': list(range(len(src), len(src) + len(dst))),
+                'metrics': ['distance', 'duration']}
+        headers = {'Authorization': self.api_key, 'Content-Type': 'application/json'}
+        url = self.url.replace('/directions/', '/matrix/')
+        start = time.perf_counter()
+        try:
+            resp = self.transport.post(url, json=body, headers=headers, timeout=60)
+        except requests.RequestException as e:
+            _record_network_error('ors', 'matrix')
+            return {'error': f'ORS matrix network error: {e}'}
+        _record_response('ors', 'matrix', resp, start)
+        if resp.ok:
+            return resp.json()
+        return {'error': f'ORS matrix HTTP {resp.status_code}: {resp.text}'}
+
     @staticmethod
-    def parse(resp: Dict[str,Any], alt_target:int=4) -> List[Dict[str,Any]]:
+    @timed('parse_seconds', provider='ors')
+    def parse(resp: Dict[str,Any], alt_target:int=4, lean: Optional[bool]=None) -> List[Route]:
         if not isinstance(resp, dict) or resp.get('error'):
             return []
-        routes = []
+        # GeoJSON responses carry 'features'; the plain JSON endpoint returns 'routes' with encoded polylines
         if 'features' in resp:
-            for feat in resp.get('features', [])[:alt_target]:
-                props = feat.get('properties', {})
-                segs = props.get('segments', [])
-                steps_all, road_names = [], []
-                for seg in segs:
-                    for s in seg.get('steps', []):
-                        nm = s.get('name') or s.get('instruction')
-                        if nm and nm != '-': road_names.append(nm)
-                        steps_all.append({'name': s.get('name'), 'instruction': s.get('instruction'),
-                                          'distance_m': s.get('distance',0), 'duration_s': s.get('duration',0)})
-                seen, summary = set(), []
-                for nm in road_names:
-                    if nm not in seen:
-                        summary.append(nm); seen.add(nm)
-                    if len(summary) >= 10: break
-                routes.append({
-                    'mode':'road',
-                    'distance_km': props.get('summary',{}).get('distance',0)/1000.0,
-                    'duration_min': props.get('summary',{}).get('duration',0)/60.0,
-                    'geometry': feat.get('geometry',{}),
-                    'steps': steps_all,
-                    'roads_summary': ', '.join(summary)
-                })
-        return routes
+            items = [(feat.get('properties', {}), feat.get('geometry')) for feat in resp.get('features', [])[:alt_target]]
+        else:
+            items = [(r, r.get('geometry')) for r in resp.get('routes', [])[:alt_target]]
+        routes = []
+        for props, geom in items:
+            segs = props.get('segments', [])
+            summary = props.get('summary', {})
+            routes.append(Route.lazy('road', summary.get('distance', 0)/1000.0, summary.get('duration', 0)/60.0, geom,
+                                     lambda segs=segs: _ors_steps(segs), lambda segs=segs: _ors_summary(segs)))
+        return routes if (PARSE_LEAN if lean is None else lean) else [r.materialize() for r in routes]
 
 class OSRMClient:
     @staticmethod
-    def fetch(origin: Tuple[float,float], dest: Tuple[float,float]) -> Dict[str,Any]:
+    def fetch(origin: Tuple[float,float], dest: Tuple[float,float], cache: Optional[RouteCache]=None,
+              url_template: Optional[str]=None, steps: bool=True) -> Dict[str,Any]:
+        cache = cache or get_route_cache()
+        key = cache.key('osrm', origin, dest, **({} if steps else {'steps': False}))
+        cached = cache.get(key)
+        if cached is not None:
+            return cached
         coords = f"{origin[1]},{origin[0]};{dest[1]},{dest[0]}"
-        url = OSRM_URL.format(coords=coords)
+        url = (url_template or OSRM_URL).format(coords=coords)
+        if not steps:
+            url = url.replace('steps=true', 'steps=false')
+        start = time.perf_counter()
         try:
-            resp = requests.get(url, timeout=60)
+            resp = get_transport('osrm').get(url, timeout=60)
+            _record_response('osrm', 'route', resp, start)
             if resp.ok:
-                return resp.json()
+                data = fastjson.loads(resp.content)
+                if data.get('code', 'Ok') == 'Ok':
+                    cache.put(key, data)
+                else:
+                    inc('provider_errors_total', provider='osrm', op='route', kind=str(data.get('code')))
+                return data
             return {'error': f'OSRM HTTP {resp.status_code}: {resp.text}'}
         except requests.RequestException as e:
+            _record_network_error('osrm', 'route')
             return {'error': f'OSRM network error: {e}'}
 
     @staticmethod
-    def parse(resp: Dict[str,Any], alt_target:int=4) -> List[Dict[str,Any]]:
+    def table(sources, destinations, url_template: Optional[str]=None) -> Dict[str,Any]:
+        src, dst = np.asarray(sources, dtype=np.float64).reshape(-1, 2), np.asarray(destinations, dtype=np.float64).reshape(-1, 2)
+        coords = ';'.join(f'{lon},{lat}' for lat, lon in np.vstack((src, dst)).tolist())
+        url = (url_template or OSRM_TABLE_URL).format(
+            coords=coords, sources=';'.join(map(str, range(len(src)))),
+            destinations=';'.join(map(str, range(len(src), len(src) + len(dst)))))
+        start = time.perf_counter()
+        try:
+            resp = get_transport('osrm').get(url, timeout=60)
+            _record_response('osrm', 'table', resp, start)
+            if resp.ok:
+                return resp.json()
+            return {'error': f'OSRM table HTTP {resp.status_code}: {resp.text}'}
+        except requests.RequestException as e:
+            _record_network_error('osrm', 'table')
+            return {'error': f'OSRM table network error: {e}'}
+
+    @staticmethod
+    @timed('parse_seconds', provider='osrm')
+    def parse(resp: Dict[str,Any], alt_target:int=4, precision:int=5, lean: Optional[bool]=None) -> List[Route]:
         if not isinstance(resp, dict) or resp.get('error'):
             return []
         routes = []
         for r in resp.get('routes', [])[:alt_target]:
-            distance_km = r.get('distance',0)/1000.0
-            duration_min = r.get('duration',0)/60.0
-            coords, steps_all, road_names = [], [], []
-            poly = r.get('geometry')
-            if isinstance(poly, str):
-                coords = OSRMClient._decode_polyline5(poly)
-            for leg in r.get('legs', []):
-                for s in leg.get('steps', []):
-                    nm = s.get('name') or s.get('ref') or s.get('mode')
-                    if nm and nm != '-': road_names.append(nm)
-                    steps_all.append({'name': s.get('name'), 'instruction': s.get('maneuver',{}).get('type'),
-                                      'distance_m': s.get('distance',0), 'duration_s': s.get('duration',0)})
-            seen, summary = set(), []
-            for nm in road_names:
-                if nm not in seen:
-                    summary.append(nm); seen.add(nm)
-                if len(summary) >= 10: break
-            routes.append({
-                'mode':'road',
-                'distance_km': distance_km,
-                'duration_min': duration_min,
-                'coords_latlon': coords,
-                'steps': steps_all,
-                'roads_summary': ', '.join(summary)
-            })
-        return routes
+            legs = r.get('legs', [])
+            routes.append(Route.lazy('road', r.get('distance', 0)/1000.0, r.get('duration', 0)/60.0, r.get('geometry'),
+                                     lambda legs=legs: _osrm_steps(legs), lambda legs=legs: _osrm_summary(legs), precision))
+        return routes if (PARSE_LEAN if lean is None else lean) else [r.materialize() for r in routes]
 
     @staticmethod
-    def _decode_polyline5(polyline_str: str):
-        coords = []
-        index, lat, lng = 0, 0, 0
-        while index < len(polyline_str):
-            result, shift = 0, 0
-            while True:
-                b = ord(polyline_str[index]) - 63
-                index += 1
-                result |= (b & 0x1f) << shift
-                shift += 5
-                if b < 0x20:
-                    break
-            dlat = ~(result >> 1) if result & 1 else result >> 1
-            lat += dlat
-            result, shift = 0, 0
-            while True:
-                b = ord(polyline_str[index]) - 63
-                index += 1
-                result |= (b & 0x1f) << shift
-                shift += 5
-                if b < 0x20:
-                    break
-            dlng = ~(result >> 1) if result & 1 else result >> 1
-            lng += dlng
-            coords.append((lat / 1e5, lng / 1e5))
-        return coords
-
-# Rail & Flight hubs (India) — simplified
-RAIL_HUBS = {
-    'Howrah (HWH)': (22.5893, 88.3570),
-    'Sealdah (SDAH)': (22.5697, 88.3736),
-    'New Delhi (NDLS)': (28.6430, 77.2215),
-    'Chennai Central (MAS)': (13.0823, 80.2750),
-    'Mumbai CSMT (CSMT)': (18.9398, 72.8356),
-    'Secunderabad (SC)': (17.4350, 78.5011),
-}
-
-AIR_HUBS = {
-    'Kolkata CCU': (22.6547, 88.4467),
-    'Delhi DEL': (28.5562, 77.1000),
-    'Mumbai BOM': (19.0952, 72.8741),
-    'Bengaluru BLR': (13.1992, 77.7063),
-    'Chennai MAA': (12.9941, 80.1809),
-    'Hyderabad HYD': (17.2400, 78.4294),
-}
-
-
-def _nearest_hubs(point: Tuple[float,float], hubs: Dict[str,Tuple[float,float]], topn=4):
-    dlist = []
-    for name, coord in hubs.items():
-        d = haversine_km(point, coord)
-        dlist.append((name, coord, d))
-    dlist.sort(key=lambda x: x[2])
-    return dlist[:topn]
-
-
-def build_rail_routes(origin, dest, alt_target:int=4) -> List[Dict[str,Any]]:
-    origin_near = _nearest_hubs(origin, RAIL_HUBS, topn=alt_target)
-    dest_near = _nearest_hubs(dest, RAIL_HUBS, topn=alt_target)
-    candidates = []
-    for on in origin_near:
-        for dn in dest_near:
-            total = on[2] + dn[2]
-            candidates.append((on[0], on[1], dn[0], dn[1], total))
-    candidates.sort(key=lambda x: x[4])
-    routes = []
-    for i, (on_name, on_coord, dn_name, dn_coord, _) in enumerate(candidates[:alt_target]):
-        coords = [origin, on_coord, dn_coord, dest]
-        seg_d = haversine_km(origin, on_coord) + haversine_km(on_coord, dn_coord) + haversine_km(dn_coord, dest)
-        duration_min, cost_inr, emissions_kg = rail_kpis(seg_d)
-        routes.append({
-            'mode':'rail',
-            'distance_km': round(seg_d,2),
-            'duration_min': duration_min,
-            'cost_inr': round(cost_inr,2),
-            'emissions_kg': emissions_kg,
-            'stations': f"{on_name} → {dn_name}",
-            'coords_latlon': coords,
-            'steps': [
-                {'name': on_name, 'instruction': 'Board train', 'distance_m': 0, 'duration_s': 0},
-                {'name': dn_name, 'instruction': 'Alight train', 'distance_m': 0, 'duration_s': 0},
-            ],
-            'roads_summary': f"{on_name}, {dn_name}"
-        })
+    def _decode_polyline5(polyline_str: str) -> np.ndarray:
+        return decode_polyline(polyline_str, 5)
+
+def _road_summary(names: Iterable[Optional[str]], limit: int=10) -> str:
+    # first `limit` distinct road names in travel order
+    seen, summary = set(), []
+    for nm in names:
+        if nm and nm != '-' and nm not in seen:
+            summary.append(nm); seen.add(nm)
+            if len(summary) >= limit:
+                break
+    return ', '.join(summary)
+
+
+def _ors_steps(segs) -> Steps:
+    raw_steps = [s for seg in segs for s in seg.get('steps', [])]
+    return Steps.from_columns([s.get('name') for s in raw_steps], [s.get('instruction') for s in raw_steps],
+                              [s.get('distance',0) for s in raw_steps], [s.get('duration',0) for s in raw_steps])
+
+
+def _ors_summary(segs) -> str:
+    return _road_summary(s.get('name') or s.get('instruction') for seg in segs for s in seg.get('steps', []))
+
+
+def _osrm_steps(legs) -> Steps:
+    raw_steps = [s for leg in legs for s in leg.get('steps', [])]
+    return Steps.from_columns([s.get('name') for s in raw_steps], [s.get('maneuver',{}).get('type') for s in raw_steps],
+                              [s.get('distance',0) for s in raw_steps], [s.get('duration',0) for s in raw_steps])
+
+
+def _osrm_summary(legs) -> str:
+    # responses fetched with steps=false still carry per-leg summaries
+    if not any(leg.get('steps') for leg in legs):
+        return _road_summary(nm.strip() for leg in legs for nm in (leg.get('summary') or '').split(','))
+    return _road_summary(s.get('name') or s.get('ref') or s.get('mode') for leg in legs for s in leg.get('steps', []))
+
+
+def _matrix_blocks(n_src: int, n_dst: int, provider: str):
+    # Split an n_src x n_dst matrix into blocks that respect the provider's request limits
+    if provider == 'ors':
+        dst_step = max(1, min(n_dst, int(ORS_MATRIX_MAX_ELEMENTS ** 0.5)))
+        src_step = max(1, min(n_src, ORS_MATRIX_MAX_ELEMENTS // dst_step))
+    else:
+        dst_step = max(1, min(n_dst, OSRM_TABLE_MAX_COORDS // 2))
+        src_step = max(1, min(n_src, OSRM_TABLE_MAX_COORDS - dst_step))
+    for i in range(0, n_src, src_step):
+        for j in range(0, n_dst, dst_step):
+            yield i, min(i + src_step, n_src), j, min(j + dst_step, n_dst)
+
+
+def fetch_road_matrix(sources, destinations, provider: str='osrm', ors_api_key: str='') -> Dict[str,Any]:
+    # Many-to-many road distance (km) / duration (min) via the OSRM table or ORS matrix service.
+    # Blocks run concurrently; cells of failed blocks stay NaN and the errors are reported.
+    src = np.asarray(sources, dtype=np.float64).reshape(-1, 2)
+    dst = np.asarray(destinations, dtype=np.float64).reshape(-1, 2)
+    distance_km = np.full((len(src), len(dst)), np.nan)
+    duration_min = np.full((len(src), len(dst)), np.nan)
+    ors = ORSClient(ors_api_key) if provider == 'ors' else None
+
+    def run(block):
+        i0, i1, j0, j1 = block
+        return ors.matrix(src[i0:i1], dst[j0:j1]) if ors is not None else OSRMClient.table(src[i0:i1], dst[j0:j1])
+
+    blocks = list(_matrix_blocks(len(src), len(dst), provider))
+    futures = [(_PROVIDER_POOL.submit(run, b), b) for b in blocks]
+    errors = []
+    for fut, (i0, i1, j0, j1) in futures:
+        try:
+            resp = fut.result()
+        except Exception as e:
+            resp = {'error': f'{type(e).__name__}: {e}'}
+        if resp.get('error') or resp.get('code', 'Ok') != 'Ok':
+            errors.append(resp.get('error') or resp.get('message') or resp.get('code'))
+            continue
+        dist = np.array(resp.get('distances') or np.full((i1 - i0, j1 - j0), np.nan), dtype=np.float64)
+        dur = np.array(resp.get('durations') or np.full((i1 - i0, j1 - j0), np.nan), dtype=np.float64)
+        distance_km[i0:i1, j0:j1] = dist / 1000.0
+        duration_min[i0:i1, j0:j1] = dur / 60.0
+    return {'distance_km': distance_km, 'duration_min': duration_min, 'blocks': len(blocks), 'errors': errors}
+
+
+def _nearest_hubs(point: Tuple[float,float], hubs, topn=4):
+    catalog = hubs if isinstance(hubs, HubCatalog) else HubCatalog.from_dict(hubs)
+    idx, d = catalog.nearest(point, k=topn)
+    return [(name, coord, dist) for (name, coord), dist in zip(catalog_hubs(catalog, idx), d.tolist())]
+
+
+def _hub_routes(mode: str, origin, dest, alt_target: int, kpis, verb: str, weight: str='distance_km') -> List[Route]:
+    # k best origin -> hub ... hub -> dest itineraries over the mode's hub graph (direct hops and transfers);
+    # extra candidates backfill itineraries dropped as near-duplicates (e.g. via neighbouring stations)
+    catalog = get_catalog(mode)
+    graph = get_graph(mode, kpis)
+    rate = graph.leg_rates[weight] * ACCESS_LEG_FACTOR
+    rates = np.array([graph.leg_rates[k] for k in KPI_WEIGHTS])
+
+    def candidates(pool: int) -> List[Route]:
+        o_idx, o_km = catalog.nearest(origin, k=pool)
+        d_idx, d_km = catalog.nearest(dest, k=pool)
+        access_km = dict(zip(o_idx.tolist(), o_km.tolist()))
+        egress_km = dict(zip(d_idx.tolist(), d_km.tolist()))
+        itineraries = graph.k_best_itineraries({h: d * rate for h, d in access_km.items()},
+                                               {h: d * rate for h, d in egress_km.items()}, pool, weight)
+        paths = [hubs for _, hubs in itineraries]
+        if not paths:
+            return []
+        # access/egress legs at the mode's per-km rates plus the trunk edges, for all candidates at once
+        leg_km = np.array([access_km[hubs[0]] + egress_km[hubs[-1]] for hubs in paths])
+        kpi = leg_km[:, None] * rates[None, :] + graph.path_kpis(paths)
+        routes = []
+        for hubs, (distance_km, duration_min, cost_inr, emissions_kg) in zip(paths, kpi.tolist()):
+            names = [catalog.label(h) for h in hubs]
+            coords = np.vstack(([origin], catalog.coords[hubs], [dest]))
+            stops = [names[0]] + names[1:-1] + [names[-1]]
+            instructions = [f'Board {verb}'] + [f'Change {verb}'] * (len(stops) - 2) + [f'Alight {verb}']
+            zeros = np.zeros(len(stops))
+            routes.append(Route.build(mode, round(distance_km,2), round(duration_min,2), coords,
+                                      Steps.from_columns(stops, instructions, zeros, zeros), ', '.join(names),
+                                      cost_inr=round(cost_inr,2), emissions_kg=round(emissions_kg,3),
+                                      stations=' → '.join(names)))
+        return routes
+    return dedupe_candidates(candidates, alt_target)
+
+
+@timed('hub_routes_seconds', mode='rail')
+def build_rail_routes(origin, dest, alt_target:int=4) -> List[Route]:
+    return _hub_routes('rail', origin, dest, alt_target, rail_kpis, 'train')
+
+
+@timed('hub_routes_seconds', mode='flight')
+def build_flight_routes(origin, dest, alt_target:int=4) -> List[Route]:
+    return _hub_routes('flight', origin, dest, alt_target, flight_kpis, 'flight')
+
+
+def _matching_steps(kpi: np.ndarray, fulls: Dict[str, Deferred]) -> Steps:
+    # the stepped response is a separate request, so alternatives are matched by distance and duration, not index
+    for full in fulls.values():
+        try:
+            alternatives = full.get()
+        except LoadFailed:
+            continue
+        for alt in alternatives:
+            if np.allclose(alt.kpi[:2], kpi, rtol=STEPS_MATCH_RTOL, atol=0.01):
+                return alt.steps
+    raise LoadFailed('no full response has this alternative')
+
+
+def _steps_on_demand(routes: List[Route], fetch_full: Dict[str, Any]) -> List[Route]:
+    # One full (cached, single-flight) request per provider serves the steps of every alternative, on the first
+    # steps access. A failed request or an unmatched alternative leaves the steps empty but pending, so the next
+    # access retries instead of keeping nothing.
+    def loader(provider, fetch):
+        def load():
+            inc('on_demand_steps_total', provider=provider)
+            try:
+                full = fetch()
+            except requests.RequestException as e:
+                full, reason = [], str(e)
+            else:
+                reason = 'no routes'
+            if not full:
+                inc('on_demand_steps_failed_total', provider=provider)
+                raise LoadFailed(f'{provider} full response failed: {reason}')
+            return full
+        return Deferred(load)
+    fulls = {provider: loader(provider, fetch) for provider, fetch in fetch_full.items()}
+    empty = Steps.from_records([])
+    for r in routes:
+        r.steps = RemoteDeferred(lambda kpi=r.kpi[:2].copy(): _matching_steps(kpi, fulls), empty)
     return routes
 
 
-def build_flight_routes(origin, dest, alt_target:int=4) -> List[Dict[str,Any]]:
-    origin_near = _nearest_hubs(origin, AIR_HUBS, topn=alt_target)
-    dest_near = _nearest_hubs(dest, AIR_HUBS, topn=alt_target)
-    candidates = []
-    for on in origin_near:
-        for dn in dest_near:
-            total = on[2] + dn[2]
-            candidates.append((on[0], on[1], dn[0], dn[1], total))
-    candidates.sort(key=lambda x: x[4])
-    routes = []
-    for i, (on_name, on_coord, dn_name, dn_coord, _) in enumerate(candidates[:alt_target]):
-        coords = [origin, on_coord, dn_coord, dest]
-        seg_d = haversine_km(origin, on_coord) + haversine_km(on_coord, dn_coord) + haversine_km(dn_coord, dest)
-        duration_min, cost_inr, emissions_kg = flight_kpis(seg_d)
-        routes.append({
-            'mode':'flight',
-            'distance_km': round(seg_d,2),
-            'duration_min': duration_min,
-            'cost_inr': round(cost_inr,2),
-            'emissions_kg': emissions_kg,
-            'stations': f"{on_name} → {dn_name}",
-            'coords_latlon': coords,
-            'steps': [
-                {'name': on_name, 'instruction': 'Board flight', 'distance_m': 0, 'duration_s': 0},
-                {'name': dn_name, 'instruction': 'Alight flight', 'distance_m': 0, 'duration_s': 0},
-            ],
-            'roads_summary': f"{on_name}, {dn_name}"
-        })
+def _ors_fetch(origin, dest, alt_target, ors_api_key, avoid_tolls, instructions: bool) -> List[Route]:
+    # identical in-flight queries share the raw response; each caller parses its own routes
+    opts = {} if instructions else {'instructions': False}
+    key = get_route_cache().key('ors', origin, dest, alt_count=alt_target, avoid_tolls=bool(avoid_tolls), **opts)
+    r = ROUTE_FLIGHTS.do(key, lambda: ORSClient(ors_api_key).fetch(origin, dest, alt_target, avoid_tolls, instructions))
+    return ORSClient.parse(r, alt_target=alt_target)
+
+
+def _osrm_fetch(origin, dest, alt_target, steps: bool) -> List[Route]:
+    key = get_route_cache().key('osrm', origin, dest, **({} if steps else {'steps': False}))
+    return OSRMClient.parse(ROUTE_FLIGHTS.do(key, lambda: OSRMClient.fetch(origin, dest, steps=steps)), alt_target=alt_target)
+
+
+def _ors_routes(origin, dest, alt_target, ors_api_key, avoid_tolls) -> List[Route]:
+    if ROUTE_STEPS == 'on_demand':
+        return _steps_on_demand(_ors_fetch(origin, dest, alt_target, ors_api_key, avoid_tolls, False),
+                                {'ors': lambda: _ors_fetch(origin, dest, alt_target, ors_api_key, avoid_tolls, True)})
+    return _ors_fetch(origin, dest, alt_target, ors_api_key, avoid_tolls, True)
+
+
+def _osrm_routes(origin, dest, alt_target) -> List[Route]:
+    if ROUTE_STEPS == 'on_demand':
+        return _steps_on_demand(_osrm_fetch(origin, dest, alt_target, False),
+                                {'osrm': lambda: _osrm_fetch(origin, dest, alt_target, True)})
+    return _osrm_fetch(origin, dest, alt_target, True)
+
+
+def road_steps_on_demand(origin, dest, routes: List[Route], alt_target: int, ors_api_key: str,
+                         avoid_tolls=False) -> List[Route]:
+    # road routes restored without steps (warm store, ROUTE_STEPS=on_demand) get them from whichever provider's
+    # full response has the same alternative; ORS is only asked when a key is set
+    pending = [r for r in routes if r.steps_pending]
+    if pending:
+        fetch_full = {'ors': lambda: _ors_fetch(origin, dest, alt_target, ors_api_key, avoid_tolls, True)} if ors_api_key else {}
+        fetch_full['osrm'] = lambda: _osrm_fetch(origin, dest, alt_target, True)
+        _steps_on_demand(pending, fetch_full)
     return routes
 
 
-def fetch_road_routes(origin, dest, alt_target:int, ors_api_key:str, avoid_tolls=False) -> List[Dict[str,Any]]:
-    routes: List[Dict[str,Any]] = []
+@timed('local_route_seconds')
+def _local_routes(origin, dest, alt_target) -> List[Route]:
+    # offline router over ROAD_GRAPH_PATH; contributes nothing when no graph is configured
+    graph = get_road_graph()
+    return graph.routes(origin, dest, alt_target) if graph is not None else []
+
+
+def _gather(tasks: Dict[str,Any], deadlines: Dict[str,float], enough=None) -> Dict[str,Any]:
+    # Collect provider results as they complete; a provider past its deadline is dropped
+    # (its thread still finishes in the background and warms the cache).
+    start = time.monotonic()
+    pending = {fut: name for name, fut in tasks.items()}
+    results: Dict[str,Any] = {}
+    while pending:
+        elapsed = time.monotonic() - start
+        for fut, name in list(pending.items()):
+            if deadlines[name] - elapsed <= 0 and not fut.done():
+                del pending[fut]
+        if not pending:
+            break
+        timeout = min(deadlines[name] for name in pending.values()) - elapsed
+        done, _ = wait(list(pending), timeout=max(timeout, 0.0), return_when=FIRST_COMPLETED)
+        for fut in done:
+            name = pending.pop(fut)
+            try:
+                results[name] = fut.result()
+            except Exception:
+                results[name] = []
+        if enough is not None and enough(results):
+            break
+    return results
+
+
+def road_provider_results(origin, dest, alt_target:int, ors_api_key:str, avoid_tolls=False,
+                          deadline_s: Union[float, Dict[str,float]]=PROVIDER_DEADLINE_S) -> Dict[str, List[Route]]:
+    # ORS/OSRM/local router concurrently; a provider that failed is [] and one past its deadline is missing
+    tasks = {}
     if ors_api_key:
-        ors = ORSClient(ors_api_key)
-        r = ors.fetch(origin, dest, alt_target, avoid_tolls)
-        routes.extend(ORSClient.parse(r, alt_target=alt_target))
-    if len(routes) < alt_target:
-        osrm = OSRMClient.fetch(origin, dest)
-        routes.extend(OSRMClient.parse(osrm, alt_target=alt_target))
-    return routes[:alt_target]
+        tasks['ors'] = _PROVIDER_POOL.submit(_ors_routes, origin, dest, alt_target, ors_api_key, avoid_tolls)
+    tasks['osrm'] = _PROVIDER_POOL.submit(_osrm_routes, origin, dest, alt_target)
+    if get_road_graph() is not None:
+        tasks['local'] = _PROVIDER_POOL.submit(_local_routes, origin, dest, alt_target)
+    if isinstance(deadline_s, dict):
+        deadlines = {name: float(deadline_s.get(name, PROVIDER_DEADLINE_S)) for name in tasks}
+    else:
+        deadlines = {name: float(deadline_s) for name in tasks}
+    # ORS alone satisfying alt_target ends the wait early
+    return _gather(tasks, deadlines, enough=lambda res: len(dedupe_routes(res.get('ors', []), alt_target)) >= alt_target)
+
+
+def merge_road_results(results: Dict[str, List[Route]], alt_target: int) -> List[Route]:
+    # merge order is ORS, OSRM, then the local router, with near-duplicates across providers dropped and
+    # backfilled from the later ones
+    return dedupe_routes(results.get('ors', []) + results.get('osrm', []) + results.get('local', []), alt_target)
+
+
+def fetch_road_routes(origin, dest, alt_target:int, ors_api_key:str, avoid_tolls=False, concurrent:bool=True,
+                      deadline_s: Union[float, Dict[str,float]]=PROVIDER_DEADLINE_S) -> List[Route]:
+    if not concurrent:
+        routes: List[Route] = []
+        sources = [lambda: _ors_routes(origin, dest, alt_target, ors_api_key, avoid_tolls)] if ors_api_key else []
+        sources += [lambda: _osrm_routes(origin, dest, alt_target), lambda: _local_routes(origin, dest, alt_target)]
+        for source in sources:
+            if len(routes) >= alt_target:
+                break
+            # near-duplicates across providers are dropped; the next provider backfills
+            routes = dedupe_routes(routes + source(), alt_target)
+        return routes
+    return merge_road_results(road_provider_results(origin, dest, alt_target, ors_api_key, avoid_tolls, deadline_s), alt_target)
+
+
+def fetch_mode_routes(origin, dest, modes: Iterable[str], alt_target:int, ors_api_key:str, avoid_tolls=False,
+                      concurrent:bool=True) -> Dict[str, List[Route]]:
+    builders = {
+        'road': lambda: fetch_road_routes(origin, dest, alt_target, ors_api_key, avoid_tolls, concurrent=concurrent),
+        'rail': lambda: build_rail_routes(origin, dest, alt_target=alt_target),
+        'flight': lambda: build_flight_routes(origin, dest, alt_target=alt_target),
+    }
+    modes = [m for m in builders if m in set(modes)]
+    if not concurrent:
+        return {m: builders[m]() for m in modes}
+    futures = {m: _MODE_POOL.submit(builders[m]) for m in modes}
+    return {m: futures[m].result() for m in modes}
@@ -0,0 +1,496 @@
+import os
+import sys
+import json
+import math
+import heapq
+import argparse
+import threading
+from typing import Dict, List, Optional, Tuple, Iterable
+import numpy as np
+from geometry_utils import EARTH_RADIUS_KM, haversine_pairwise, haversine_one_to_many
+from routes import Route, Steps
+
+# Local road router over a preprocessed OSM extract, used as the last road provider when ORS/OSRM
+# are slow or unreachable. Build once:   python road_graph.py build region.osm.pbf data/road_graph
+# then point ROAD_GRAPH_PATH at the output directory. Arrays are memory-mapped, so load is near-instant
+# and worker processes share pages.
+ROAD_GRAPH_PATH = os.environ.get('ROAD_GRAPH_PATH', '')
+
+# Free-flow speeds (km/h) for drivable OSM highway classes when a way has no usable maxspeed
+HIGHWAY_SPEEDS = {
+    'motorway': 100, 'motorway_link': 60, 'trunk': 80, 'trunk_link': 50,
+    'primary': 60, 'primary_link': 45, 'secondary': 50, 'secondary_link': 40,
+    'tertiary': 40, 'tertiary_link': 30, 'unclassified': 30, 'residential': 25,
+    'living_street': 10, 'service': 15, 'road': 30,
+}
+# Spatial grid for snapping points to graph nodes
+GRID_CELL_DEG = 0.01
+# Points further than this from any node are treated as outside the extract
+MAX_SNAP_KM = float(os.environ.get('LOCAL_ROUTER_MAX_SNAP_KM', 5.0))
+# Alternatives by the penalty method: each found route's edges get slower by ALT_PENALTY; a candidate is kept if it
+# shares at most ALT_MAX_SHARE of its length with accepted routes and is at most ALT_MAX_STRETCH x the fastest
+ALT_PENALTY = 1.4
+ALT_MAX_SHARE = 0.6
+ALT_MAX_STRETCH = 1.5
+# ALT (A*, landmarks, triangle inequality): durations to/from LANDMARKS nodes are precomputed at build time;
+# each query uses the ALT_ACTIVE landmarks giving the tightest bound for its origin/destination
+LANDMARKS = 8
+ALT_ACTIVE = 4
+
+_ARRAYS = ('indptr', 'head', 'length_m', 'duration_s', 'name_id', 'rindptr', 'rhead', 'redge', 'rduration_s',
+           'lat', 'lon', 'cell_keys', 'cell_nodes')
+# landmark duration tables, (n_nodes, LANDMARKS): lm_from[v, i] = landmark i -> v, lm_to[v, i] = v -> landmark i
+_LANDMARK_ARRAYS = ('lm_from', 'lm_to')
+
+
+def _cell_keys(lat, lon) -> np.ndarray:
+    ilat = np.floor((np.asarray(lat, dtype=np.float64) + 90.0) / GRID_CELL_DEG).astype(np.int64)
+    ilon = np.floor((np.asarray(lon, dtype=np.float64) + 180.0) / GRID_CELL_DEG).astype(np.int64)
+    return (ilat << 32) | ilon
+
+
+class RoadGraph:
+    def __init__(self, arrays: Dict[str, np.ndarray], names: List[str], max_speed_kmh: float):
+        # plain ndarray views: slicing a np.memmap is several times slower and this is the search inner loop
+        for name in _ARRAYS + _LANDMARK_ARRAYS:
+            setattr(self, name, np.asarray(arrays[name]) if arrays.get(name) is not None else None)
+        self.names = names
+        self.max_speed_mps = max_speed_kmh / 3.6
+
+    def __len__(self) -> int:
+        return len(self.lat)
+
+    @classmethod
+    def from_edges(cls, lat, lon, src, dst, speed_kmh, names: Optional[List[str]]=None, name_id=None) -> 'RoadGraph':
+        # Directed edges between node indices; length from node coordinates, duration from speed
+        lat = np.asarray(lat, dtype=np.float64)
+        lon = np.asarray(lon, dtype=np.float64)
+        src = np.asarray(src, dtype=np.int64)
+        dst = np.asarray(dst, dtype=np.int64)
+        n = len(lat)
+        length = haversine_pairwise(np.column_stack((lat[src], lon[src])), np.column_stack((lat[dst], lon[dst]))) * 1000.0
+        speed = np.broadcast_to(np.asarray(speed_kmh, dtype=np.float64), src.shape)
+        duration = length / (speed / 3.6)
+        name_id = np.full(len(src), -1, dtype=np.int32) if name_id is None else np.asarray(name_id, dtype=np.int32)
+        order = np.argsort(src, kind='stable')
+        src, dst, length, duration, name_id = src[order], dst[order], length[order], duration[order], name_id[order]
+        indptr = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(np.bincount(src, minlength=n), out=indptr[1:])
+        rorder = np.argsort(dst, kind='stable')
+        rindptr = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(np.bincount(dst, minlength=n), out=rindptr[1:])
+        keys = _cell_keys(lat, lon)
+        cell_nodes = np.argsort(keys, kind='stable').astype(np.int32)
+        arrays = {
+            'indptr': indptr, 'head': dst.astype(np.int32),
+            'length_m': length.astype(np.float32), 'duration_s': duration.astype(np.float32), 'name_id': name_id,
+            'rindptr': rindptr, 'rhead': src[rorder].astype(np.int32), 'redge': rorder.astype(np.int32),
+            'rduration_s': duration[rorder].astype(np.float32),
+            'lat': lat, 'lon': lon, 'cell_keys': keys[cell_nodes], 'cell_nodes': cell_nodes,
+        }
+        max_speed = float(speed.max()) if len(speed) else 1.0
+        return cls(arrays, list(names or []), max_speed)
+
+    def save(self, path: str):
+        os.makedirs(path, exist_ok=True)
+        for name in _ARRAYS + _LANDMARK_ARRAYS:
+            if getattr(self, name) is not None:
+                np.save(os.path.join(path, name + '.npy'), np.ascontiguousarray(getattr(self, name)))
+        with open(os.path.join(path, 'meta.json'), 'w', encoding='utf-8') as fh:
+            json.dump({'names': self.names, 'max_speed_kmh': self.max_speed_mps * 3.6,
+                       'nodes': len(self), 'edges': len(self.head)}, fh, ensure_ascii=False)
+
+    @classmethod
+    def load(cls, path: str, mmap: bool=True) -> 'RoadGraph':
+        with open(os.path.join(path, 'meta.json'), encoding='utf-8') as fh:
+            meta = json.load(fh)
+        arrays = {name: np.load(os.path.join(path, name + '.npy'), mmap_mode='r' if mmap else None)
+                  for name in _ARRAYS + _LANDMARK_ARRAYS if os.path.exists(os.path.join(path, name + '.npy'))}
+        return cls(arrays, meta['names'], meta['max_speed_kmh'])
+
+    def nearest_node(self, point: Tuple[float,float], max_km: float=MAX_SNAP_KM) -> Tuple[int, float]:
+        # Expanding square rings of grid cells; one ring past the first hit guarantees the true nearest
+        if not len(self):
+            return -1, math.inf
+        lat, lon = float(point[0]), float(point[1])
+        ilat = int(math.floor((lat + 90.0) / GRID_CELL_DEG))
+        ilon = int(math.floor((lon + 180.0) / GRID_CELL_DEG))
+        km_per_cell = GRID_CELL_DEG * math.pi * EARTH_RADIUS_KM / 180.0 * max(math.cos(math.radians(lat)), 0.05)
+        max_ring = int(math.ceil(max_km / km_per_cell)) + 1
+        found_at, best = None, (-1, math.inf)
+        for ring in range(0, max_ring + 1):
+            if found_at is not None and ring > found_at + 1:
+                break
+            r = np.arange(-ring, ring + 1)
+            dlat, dlon = np.meshgrid(r, r, indexing='ij')
+            on_ring = np.maximum(np.abs(dlat), np.abs(dlon)) == ring
+            keys = ((ilat + dlat[on_ring]).astype(np.int64) << 32) | (ilon + dlon[on_ring]).astype(np.int64)
+            lo = np.searchsorted(self.cell_keys, keys, 'left')
+            hi = np.searchsorted(self.cell_keys, keys, 'right')
+            if np.any(hi > lo):
+                cand = np.concatenate([self.cell_nodes[a:b] for a, b in zip(lo.tolist(), hi.tolist()) if b > a])
+                d = haversine_one_to_many(point, np.column_stack((self.lat[cand], self.lon[cand])))
+                i = int(np.argmin(d))
+                if d[i] < best[1]:
+                    best = (int(cand[i]), float(d[i]))
+                if found_at is None:
+                    found_at = ring
+        if found_at is None or best[1] > max_km:
+            return -1, math.inf
+        return best
+
+    def _dijkstra_all(self, source: int, reverse: bool=False, adj=None) -> np.ndarray:
+        # single-source durations to every node (or from every node with reverse=True)
+        indptr, head, dur = adj or self._adjacency(reverse)
+        dist = [math.inf] * (len(indptr) - 1)
+        dist[source] = 0.0
+        heap = [(0.0, source)]
+        while heap:
+            du, u = heapq.heappop(heap)
+            if du > dist[u]:
+                continue
+            for e in range(indptr[u], indptr[u + 1]):
+                nd = du + dur[e]
+                v = head[e]
+                if nd < dist[v]:
+                    dist[v] = nd
+                    heapq.heappush(heap, (nd, v))
+        return np.asarray(dist)
+
+    def _adjacency(self, reverse: bool):
+        if reverse:
+            return self.rindptr.tolist(), self.rhead.tolist(), self.rduration_s.tolist()
+        return self.indptr.tolist(), self.head.tolist(), self.duration_s.tolist()
+
+    def add_landmarks(self, count: int=LANDMARKS, seed: int=0):
+        # farthest-point selection: each new landmark maximizes its minimum duration from those already chosen
+        n = len(self)
+        if not n or count <= 0:
+            return
+        fwd, rev = self._adjacency(False), self._adjacency(True)
+        rng = np.random.default_rng(seed)
+        d0 = self._dijkstra_all(int(rng.integers(n)), adj=fwd)
+        score = np.where(np.isfinite(d0), d0, -1.0)
+        lm_from, lm_to = [], []
+        for _ in range(min(count, n)):
+            lm = int(np.argmax(score))
+            f = self._dijkstra_all(lm, adj=fwd)
+            lm_from.append(f)
+            lm_to.append(self._dijkstra_all(lm, reverse=True, adj=rev))
+            score = np.minimum(score, np.where(np.isfinite(f), f, -1.0))
+            score[lm] = -1.0
+        self.lm_from = np.column_stack(lm_from).astype(np.float32)
+        self.lm_to = np.column_stack(lm_to).astype(np.float32)
+
+    def _potential_fn(self, s: int, t: int):
+        # pf(v) = (h_t(v) - h_s(v)) / 2 from haversine-time and landmark lower bounds; averaging keeps it
+        # consistent for both the forward and the reverse search
+        lat_r, lon_r = np.radians(self.lat[[s, t]]), np.radians(self.lon[[s, t]])
+        s_lat, t_lat = float(lat_r[0]), float(lat_r[1])
+        s_lon, t_lon = float(lon_r[0]), float(lon_r[1])
+        cos_s, cos_t = math.cos(s_lat), math.cos(t_lat)
+        scale = 2.0 * EARTH_RADIUS_KM * 1000.0 / self.max_speed_mps
+        lat_arr, lon_arr = self.lat, self.lon
+        lm_from, lm_to = self.lm_from, self.lm_to
+        active: List[int] = []
+        if lm_from is not None:
+            Fs, Ft, Ts, Tt = lm_from[s].astype(np.float64), lm_from[t].astype(np.float64), lm_to[s].astype(np.float64), lm_to[t].astype(np.float64)
+            with np.errstate(invalid='ignore'):
+                bound = np.nan_to_num(np.maximum(Ft - Fs, Ts - Tt), nan=-np.inf)
+            active = np.argsort(-bound, kind='stable')[:ALT_ACTIVE].tolist()
+            Fs, Ft, Ts, Tt = Fs.tolist(), Ft.tolist(), Ts.tolist(), Tt.tolist()
+        cache: Dict[int, float] = {}
+
+        def pot(v: int) -> float:
+            p = cache.get(v)
+            if p is None:
+                la, lo = math.radians(float(lat_arr[v])), math.radians(float(lon_arr[v]))
+                cl = math.cos(la)
+                hs = math.sin((la - s_lat) * 0.5) ** 2 + cos_s * cl * math.sin((lo - s_lon) * 0.5) ** 2
+                ht = math.sin((la - t_lat) * 0.5) ** 2 + cl * cos_t * math.sin((lo - t_lon) * 0.5) ** 2
+                hs = scale * math.asin(math.sqrt(min(hs, 1.0)))
+                ht = scale * math.asin(math.sqrt(min(ht, 1.0)))
+                if active:
+                    Fv, Tv = lm_from[v].tolist(), lm_to[v].tolist()
+                    # d(v,t) >= d(L,t) - d(L,v) and d(v,L) - d(t,L); d(s,v) >= d(L,v) - d(L,s) and d(s,L) - d(v,L)
+                    # (NaN from unreachable landmarks never wins a max)
+                    for i in active:
+                        ht = max(ht, Ft[i] - Fv[i], Tv[i] - Tt[i])
+                        hs = max(hs, Fv[i] - Fs[i], Ts[i] - Tv[i])
+                p = 0.5 * (ht - hs)
+                if not math.isfinite(p):
+                    p = 0.0
+                cache[v] = p
+            return p
+        return pot
+
+    def shortest_path(self, s: int, t: int, penalty: Optional[Dict[int, float]]=None) -> Optional[List[int]]:
+        # Bidirectional A* on duration; returns the forward edge ids from s to t
+        if s == t:
+            return []
+        penalty = penalty or {}
+        pot = self._potential_fn(s, t)
+        indptr, head, dur = self.indptr, self.head, self.duration_s
+        rindptr, rhead, redge, rdur = self.rindptr, self.rhead, self.redge, self.rduration_s
+        dist = ({s: 0.0}, {t: 0.0})
+        parent: Tuple[Dict[int, Tuple[int,int]], Dict[int, Tuple[int,int]]] = ({s: (-1, -1)}, {t: (-1, -1)})
+        done = (set(), set())
+        heaps = ([(pot(s), s)], [(-pot(t), t)])
+        mu, meet = math.inf, -1
+        while heaps[0] and heaps[1]:
+            if heaps[0][0][0] + heaps[1][0][0] >= mu:
+                break
+            side = 0 if heaps[0][0][0] <= heaps[1][0][0] else 1
+            _, u = heapq.heappop(heaps[side])
+            if u in done[side]:
+                continue
+            done[side].add(u)
+            du = dist[side][u]
+            mine, other = dist[side], dist[1 - side]
+            if side == 0:
+                a, b = int(indptr[u]), int(indptr[u + 1])
+                nbrs, edges, weights = head[a:b].tolist(), range(a, b), dur[a:b].tolist()
+            else:
+                a, b = int(rindptr[u]), int(rindptr[u + 1])
+                nbrs, edges, weights = rhead[a:b].tolist(), redge[a:b].tolist(), rdur[a:b].tolist()
+            sign = 1.0 if side == 0 else -1.0
+            for v, e, w in zip(nbrs, edges, weights):
+                w = w * penalty.get(e, 1.0)
+                nd = du + w
+                if nd < mine.get(v, math.inf):
+                    mine[v] = nd
+                    parent[side][v] = (u, e)
+                    heapq.heappush(heaps[side], (nd + sign * pot(v), v))
+                    if v in other and nd + other[v] < mu:
+                        mu, meet = nd + other[v], v
+        if meet < 0:
+            return None
+        fwd, v = [], meet
+        while parent[0][v][0] >= 0:
+            v, e = parent[0][v]
+            fwd.append(e)
+        fwd.reverse()
+        v = meet
+        while parent[1][v][0] >= 0:
+            v, e = parent[1][v]
+            fwd.append(e)
+        return fwd
+
+    def k_paths(self, s: int, t: int, k: int) -> List[List[int]]:
+        accepted: List[List[int]] = []
+        penalty: Dict[int, float] = {}
+        fastest = None
+        for _ in range(max(1, k) * 3):
+            edges = self.shortest_path(s, t, penalty)
+            if edges is None:
+                break
+            idx = np.asarray(edges, dtype=np.int64)
+            duration = float(self.duration_s[idx].sum()) if len(idx) else 0.0
+            if fastest is None:
+                fastest = duration
+            elif duration > fastest * ALT_MAX_STRETCH:
+                break
+            length = self.length_m[idx].astype(np.float64)
+            total = float(length.sum()) or 1.0
+            if all(float(length[np.isin(idx, prev)].sum()) / total <= ALT_MAX_SHARE for prev in accepted):
+                accepted.append(edges)
+                if len(accepted) >= k:
+                    break
+            for e in edges:
+                penalty[e] = penalty.get(e, 1.0) * ALT_PENALTY
+        return accepted
+
+    def edge_tails(self, edges: Iterable[int]) -> np.ndarray:
+        idx = np.asarray(list(edges), dtype=np.int64)
+        return (np.searchsorted(self.indptr, idx, side='right') - 1).astype(np.int64)
+
+    def route_from_edges(self, edges: List[int], origin, dest, snap_km: Tuple[float, float]) -> Route:
+        # Same shape as OSRMClient.parse output; access legs to/from the snapped nodes are added as straight segments
+        idx = np.asarray(edges, dtype=np.int64)
+        nodes = np.concatenate((self.edge_tails(idx[:1]), self.head[idx].astype(np.int64))) if len(idx) else np.empty(0, dtype=np.int64)
+        coords = np.vstack(([origin], np.column_stack((self.lat[nodes], self.lon[nodes])), [dest]))
+        length = self.length_m[idx].astype(np.float64)
+        duration = self.duration_s[idx].astype(np.float64)
+        names = self.name_id[idx]
+        access_m = (snap_km[0] + snap_km[1]) * 1000.0
+        # consecutive edges with the same name become one step
+        step_names, seg_len, seg_dur = [], np.empty(0), np.empty(0)
+        if len(idx):
+            cut = np.flatnonzero(np.diff(names)) + 1
+            starts = np.concatenate(([0], cut))
+            seg_len = np.add.reduceat(length, starts)
+            seg_dur = np.add.reduceat(duration, starts)
+            step_names = [self.names[nid] if 0 <= nid < len(self.names) else '' for nid in names[starts].tolist()]
+        road_names = [nm for nm in step_names if nm]
+        instructions = ['depart'] + ['turn'] * (len(step_names) - 1) if step_names else []
+        steps = Steps.from_columns(step_names + [''], instructions + ['arrive'], np.append(seg_len, 0.0), np.append(seg_dur, 0.0))
+        seen, summary = set(), []
+        for nm in road_names:
+            if nm not in seen:
+                summary.append(nm); seen.add(nm)
+            if len(summary) >= 10: break
+        return Route.build('road', (float(length.sum()) + access_m) / 1000.0,
+                           (float(duration.sum()) + access_m / (HIGHWAY_SPEEDS['residential'] / 3.6)) / 60.0,
+                           coords, steps, ', '.join(summary))
+
+    def routes(self, origin, dest, k: int=3) -> List[Route]:
+        s, s_km = self.nearest_node(origin)
+        t, t_km = self.nearest_node(dest)
+        if s < 0 or t < 0:
+            return []
+        return [self.route_from_edges(edges, origin, dest, (s_km, t_km)) for edges in self.k_paths(s, t, k)]
+
+
+def _speed(tags: Dict[str,str]) -> Optional[float]:
+    hw = tags.get('highway')
+    if hw not in HIGHWAY_SPEEDS:
+        return None
+    raw = tags.get('maxspeed', '').split(';')[0].strip().lower()
+    try:
+        v = float(raw.replace('mph', '').strip()) * (1.609 if 'mph' in raw else 1.0)
+        return v if v > 0 else float(HIGHWAY_SPEEDS[hw])
+    except ValueError:
+        return float(HIGHWAY_SPEEDS[hw])
+
+
+def _direction(tags: Dict[str,str]) -> int:
+    # 1 forward only, -1 reverse only, 0 both ways
+    oneway = tags.get('oneway', '').lower()
+    if oneway in ('yes', 'true', '1'):
+        return 1
+    if oneway == '-1':
+        return -1
+    if oneway == 'no':
+        return 0
+    return 1 if tags.get('highway') == 'motorway' or tags.get('junction') == 'roundabout' else 0
+
+
+def _iter_osm_xml(path: str):
+    # yields ('node', id, lat, lon) and ('way', node_ids, tags); nodes precede ways in OSM files
+    import xml.etree.ElementTree as ET
+    if path.endswith('.bz2'):
+        import bz2
+        fh = bz2.open(path, 'rb')
+    elif path.endswith('.gz'):
+        import gzip
+        fh = gzip.open(path, 'rb')
+    else:
+        fh = open(path, 'rb')
+    with fh:
+        for _, el in ET.iterparse(fh, events=('end',)):
+            if el.tag == 'node':
+                yield 'node', int(el.get('id')), float(el.get('lat')), float(el.get('lon'))
+                el.clear()
+            elif el.tag == 'way':
+                tags = {t.get('k'): t.get('v') for t in el.iter('tag')}
+                if tags.get('highway') in HIGHWAY_SPEEDS:
+                    yield 'way', [int(nd.get('ref')) for nd in el.iter('nd')], tags
+                el.clear()
+
+
+def _iter_osm_pbf(path: str):
+    try:
+        import osmium
+    except ImportError:
+        raise ImportError('reading .pbf extracts needs the osmium package (pip install osmium); '
+                          'or convert to .osm XML with osmium/osmconvert') from None
+    items = []
+
+    class Handler(osmium.SimpleHandler):
+        def node(self, n):
+            items.append(('node', n.id, n.location.lat, n.location.lon))
+
+        def way(self, w):
+            if w.tags.get('highway') in HIGHWAY_SPEEDS:
+                items.append(('way', [nd.ref for nd in w.nodes], {t.k: t.v for t in w.tags}))
+
+    Handler().apply_file(path)
+    return items
+
+
+def build_from_osm(path: str) -> RoadGraph:
+    items = _iter_osm_pbf(path) if path.endswith('.pbf') else _iter_osm_xml(path)
+    node_pos: Dict[int, Tuple[float,float]] = {}
+    src_ids, dst_ids, speeds, name_ids = [], [], [], []
+    names: Dict[str, int] = {}
+    for item in items:
+        if item[0] == 'node':
+            node_pos[item[1]] = (item[2], item[3])
+            continue
+        _, refs, tags = item
+        speed = _speed(tags)
+        if speed is None or len(refs) < 2:
+            continue
+        label = tags.get('name') or tags.get('ref') or ''
+        nid = names.setdefault(label, len(names)) if label else -1
+        direction = _direction(tags)
+        a, b = refs[:-1], refs[1:]
+        if direction >= 0:
+            src_ids += a; dst_ids += b
+        if direction <= 0:
+            src_ids += b; dst_ids += a
+        count = len(a) * (2 if direction == 0 else 1)
+        speeds += [speed] * count
+        name_ids += [nid] * count
+    src_ids, dst_ids = np.asarray(src_ids, dtype=np.int64), np.asarray(dst_ids, dtype=np.int64)
+    keep = np.fromiter((s in node_pos and d in node_pos for s, d in zip(src_ids.tolist(), dst_ids.tolist())),
+                       dtype=bool, count=len(src_ids))
+    src_ids, dst_ids = src_ids[keep], dst_ids[keep]
+    used, inverse = np.unique(np.concatenate((src_ids, dst_ids)), return_inverse=True)
+    pos = np.array([node_pos[i] for i in used.tolist()], dtype=np.float64).reshape(-1, 2)
+    m = len(src_ids)
+    return RoadGraph.from_edges(pos[:, 0], pos[:, 1], inverse[:m], inverse[m:], np.asarray(speeds)[keep],
+                                names=list(names), name_id=np.asarray(name_ids, dtype=np.int32)[keep])
+
+
+_graph: Optional[RoadGraph] = None
+_graph_loaded = False
+_graph_lock = threading.Lock()
+
+
+def get_road_graph() -> Optional[RoadGraph]:
+    # None when no graph is configured; the local provider then contributes nothing
+    global _graph, _graph_loaded
+    with _graph_lock:
+        if not _graph_loaded:
+            _graph_loaded = True
+            if ROAD_GRAPH_PATH and os.path.exists(os.path.join(ROAD_GRAPH_PATH, 'meta.json')):
+                _graph = RoadGraph.load(ROAD_GRAPH_PATH)
+        return _graph
+
+
+def set_road_graph(graph: Optional[RoadGraph]):
+    global _graph, _graph_loaded
+    with _graph_lock:
+        _graph, _graph_loaded = graph, True
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description='Build or query the local road graph')
+    sub = ap.add_subparsers(dest='cmd', required=True)
+    b = sub.add_parser('build', help='preprocess an OSM extract (.osm, .osm.bz2, .osm.gz, .pbf)')
+    b.add_argument('extract')
+    b.add_argument('output')
+    b.add_argument('--landmarks', type=int, default=LANDMARKS, help='ALT landmarks (0 disables)')
+    q = sub.add_parser('route', help='query a built graph: lat,lon lat,lon')
+    q.add_argument('graph')
+    q.add_argument('origin')
+    q.add_argument('dest')
+    q.add_argument('-k', type=int, default=3)
+    args = ap.parse_args(argv)
+    if args.cmd == 'build':
+        g = build_from_osm(args.extract)
+        if args.landmarks > 0:
+            g.add_landmarks(args.landmarks)
+        g.save(args.output)
+        print(f'{len(g)} nodes, {len(g.head)} edges, {len(g.names)} names -> {args.output}')
+        return 0
+    g = RoadGraph.load(args.graph)
+    point = lambda s: tuple(float(x) for x in s.split(','))
+    for r in g.routes(point(args.origin), point(args.dest), args.k):
+        print(f"{r['distance_km']:.1f} km  {r['duration_min']:.1f} min  {r['roads_summary']}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,340 @@
+import threading
+from collections.abc import Sequence
+from dataclasses import dataclass
+from typing import Dict, Any, List, Optional, Iterable, Iterator, Union
+import numpy as np
+from geometry_utils import as_latlon_array, encode_polyline, decode_polyline
+
+# Compact route representation: KPIs in a 4-float array (a row of the RouteSet matrix once grouped),
+# coordinates as one (N,2) float64 array, turn-by-turn steps column-wise with interned strings.
+# Routes still answer r['distance_km'] / r.get('steps') so dict-based callers keep working.
+# Lean-parsed routes (Route.lazy) hold coordinates, steps and the road summary behind Deferred loaders
+# that run on first access, so scoring touches only the KPIs.
+KPI_FIELDS = ('distance_km', 'duration_min', 'cost_inr', 'emissions_kg')
+_KPI_INDEX = {k: i for i, k in enumerate(KPI_FIELDS)}
+STEP_FIELDS = ('name', 'instruction', 'distance_m', 'duration_s')
+# to_record/from_record store coordinates as a precision-6 polyline (~0.1 m)
+RECORD_PRECISION = 6
+
+
+class StringTable:
+    # Append-only process-wide intern table; steps keep int32 indices into it
+    def __init__(self):
+        self._strings: List[str] = ['']
+        self._index: Dict[str, int] = {'': 0}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._strings)
+
+    def intern_many(self, values: Iterable[Optional[str]]) -> np.ndarray:
+        values = ['' if v is None else str(v) for v in values]
+        with self._lock:
+            index = self._index
+            for v in values:
+                if v not in index:
+                    index[v] = len(self._strings)
+                    self._strings.append(v)
+            return np.fromiter((index[v] for v in values), dtype=np.int32, count=len(values))
+
+    def lookup(self, idx) -> List[str]:
+        strings = self._strings
+        return [strings[i] for i in np.asarray(idx).tolist()]
+
+
+ROAD_NAMES = StringTable()
+INSTRUCTIONS = StringTable()
+
+
+class Steps(Sequence):
+    __slots__ = ('name_idx', 'instruction_idx', 'distance_m', 'duration_s')
+
+    def __init__(self, name_idx, instruction_idx, distance_m, duration_s):
+        self.name_idx = np.asarray(name_idx, dtype=np.int32)
+        self.instruction_idx = np.asarray(instruction_idx, dtype=np.int32)
+        self.distance_m = np.asarray(distance_m, dtype=np.float64)
+        self.duration_s = np.asarray(duration_s, dtype=np.float64)
+
+    @classmethod
+    def from_columns(cls, names, instructions, distance_m, duration_s) -> 'Steps':
+        return cls(ROAD_NAMES.intern_many(names), INSTRUCTIONS.intern_many(instructions), distance_m, duration_s)
+
+    @classmethod
+    def from_records(cls, records: Iterable[Dict[str,Any]]) -> 'Steps':
+        if isinstance(records, Steps):
+            return records
+        records = list(records or [])
+        return cls.from_columns([s.get('name') for s in records], [s.get('instruction') for s in records],
+                                [s.get('distance_m', 0) or 0 for s in records], [s.get('duration_s', 0) or 0 for s in records])
+
+    def __len__(self) -> int:
+        return len(self.name_idx)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return Steps(self.name_idx[i], self.instruction_idx[i], self.distance_m[i], self.duration_s[i])
+        return {'name': ROAD_NAMES.lookup([self.name_idx[i]])[0] or None,
+                'instruction': INSTRUCTIONS.lookup([self.instruction_idx[i]])[0] or None,
+                'distance_m': float(self.distance_m[i]), 'duration_s': float(self.duration_s[i])}
+
+    def __iter__(self) -> Iterator[Dict[str,Any]]:
+        return iter(self.to_records())
+
+    def __repr__(self) -> str:
+        return f'Steps({len(self)} steps)'
+
+    def __reduce__(self):
+        # indices are only meaningful in this process's string tables; pickle the strings
+        return (Steps.from_columns, (self.names, self.instructions, self.distance_m, self.duration_s))
+
+    @property
+    def names(self) -> List[str]:
+        return ROAD_NAMES.lookup(self.name_idx)
+
+    @property
+    def instructions(self) -> List[str]:
+        return INSTRUCTIONS.lookup(self.instruction_idx)
+
+    def to_records(self) -> List[Dict[str,Any]]:
+        return [{'name': n or None, 'instruction': ins or None, 'distance_m': d, 'duration_s': t}
+                for n, ins, d, t in zip(self.names, self.instructions, self.distance_m.tolist(), self.duration_s.tolist())]
+
+    def to_frame(self):
+        import pandas as pd
+        return pd.DataFrame({'name': self.names, 'instruction': self.instructions,
+                             'distance_m': self.distance_m, 'duration_s': self.duration_s})
+
+    @property
+    def nbytes(self) -> int:
+        return self.name_idx.nbytes + self.instruction_idx.nbytes + self.distance_m.nbytes + self.duration_s.nbytes
+
+
+class LoadFailed(Exception):
+    # raised by a loader that may succeed on a later access, e.g. after a failed provider request
+    pass
+
+
+class Deferred:
+    # Memoized zero-argument loader; a race may run fn twice, never zero times. A loader raising LoadFailed
+    # stays pending; with a fallback, get() returns it meanwhile instead of raising.
+    __slots__ = ('fn', 'value', 'fallback')
+
+    def __init__(self, fn, fallback=None):
+        self.fn = fn
+        self.value = None
+        self.fallback = fallback
+
+    def get(self):
+        fn = self.fn
+        if fn is not None:
+            try:
+                self.value = fn()
+            except LoadFailed:
+                if self.fallback is None:
+                    raise
+                return self.fallback
+            self.fn = None
+        return self.value
+
+    @property
+    def loaded(self) -> bool:
+        return self.fn is None
+
+    def __reduce__(self):
+        return (_identity, (self.get(),))
+
+
+class RemoteDeferred(Deferred):
+    # the loader makes a provider request (ROUTE_STEPS=on_demand); to_record leaves it out until loaded
+    __slots__ = ()
+
+
+def _identity(value):
+    return value
+
+
+def _steps_not_fetched():
+    raise LoadFailed('steps were not fetched')
+
+
+def _resolve(value):
+    return value.get() if isinstance(value, Deferred) else value
+
+
+def _defer(value):
+    return Deferred(value) if callable(value) else value
+
+
+_ROUTE_KEYS = ('mode',) + KPI_FIELDS + ('coords_latlon', 'steps', 'roads_summary', 'stations')
+
+
+@dataclass(slots=True, eq=False)
+class Route:
+    mode: str
+    kpi: np.ndarray
+    _coords: Union[np.ndarray, Deferred]
+    _steps: Union[Steps, Deferred]
+    _roads_summary: Union[str, Deferred] = ''
+    stations: Optional[str] = None
+    extra: Optional[Dict[str,Any]] = None
+
+    @classmethod
+    def build(cls, mode: str, distance_km: float, duration_min: float, coords, steps=None, roads_summary: str='',
+              cost_inr: float=0.0, emissions_kg: float=0.0, stations: Optional[str]=None) -> 'Route':
+        return cls(mode, np.array([distance_km, duration_min, cost_inr, emissions_kg], dtype=np.float64),
+                   as_latlon_array(coords), Steps.from_records(steps), roads_summary, stations)
+
+    @classmethod
+    def lazy(cls, mode: str, distance_km: float, duration_min: float, geometry, steps, roads_summary,
+             precision: int=5) -> 'Route':
+        # geometry is kept as the provider sent it (polyline / GeoJSON) and decoded on first coords_latlon access;
+        # steps and roads_summary may be zero-argument callables, run on first access
+        return cls(mode, np.array([distance_km, duration_min, 0.0, 0.0], dtype=np.float64),
+                   Deferred(lambda: as_latlon_array(geometry, precision)), _defer(steps), _defer(roads_summary))
+
+    @classmethod
+    def from_dict(cls, d: Dict[str,Any]) -> 'Route':
+        r = cls.build(d.get('mode', 'road'), d.get('distance_km', 0.0), d.get('duration_min', 0.0),
+                      d.get('coords_latlon', d.get('geometry')), d.get('steps'), d.get('roads_summary', ''),
+                      d.get('cost_inr', 0.0), d.get('emissions_kg', 0.0), d.get('stations'))
+        rest = {k: v for k, v in d.items() if k not in _ROUTE_KEYS and k != 'geometry'}
+        r.extra = rest or None
+        return r
+
+    @property
+    def steps_pending(self) -> bool:
+        # steps still behind a provider request
+        return isinstance(self._steps, RemoteDeferred) and not self._steps.loaded
+
+    def to_record(self) -> Dict[str,Any]:
+        # JSON-serializable form (route stores, caches); Route.from_record inverts it. Steps still behind a provider
+        # request are stored as None rather than fetched.
+        steps = None if self.steps_pending else self.steps
+        return {'mode': self.mode, 'kpi': self.kpi.tolist(), 'polyline': encode_polyline(self.coords_latlon, RECORD_PRECISION),
+                'steps': None if steps is None else [steps.names, steps.instructions, steps.distance_m.tolist(), steps.duration_s.tolist()],
+                'roads_summary': self.roads_summary, 'stations': self.stations, 'extra': self.extra}
+
+    @classmethod
+    def from_record(cls, rec: Dict[str,Any]) -> 'Route':
+        # a stepless record comes back with pending steps (empty until providers.road_steps_on_demand attaches them)
+        steps = (Deferred(lambda: Steps.from_columns(*rec['steps'])) if rec.get('steps') is not None
+                 else RemoteDeferred(_steps_not_fetched, Steps.from_records([])))
+        return cls(rec['mode'], np.array(rec['kpi'], dtype=np.float64),
+                   Deferred(lambda: decode_polyline(rec['polyline'], RECORD_PRECISION)), steps,
+                   rec.get('roads_summary', ''), rec.get('stations'), rec.get('extra'))
+
+    coords_latlon = property(lambda self: _resolve(self._coords), lambda self, v: setattr(self, '_coords', v))
+    steps = property(lambda self: _resolve(self._steps), lambda self, v: setattr(self, '_steps', v))
+    roads_summary = property(lambda self: _resolve(self._roads_summary), lambda self, v: setattr(self, '_roads_summary', v))
+
+    def materialize(self) -> 'Route':
+        # run every pending loader now (eager parse mode)
+        self.coords_latlon, self.steps, self.roads_summary = self.coords_latlon, self.steps, self.roads_summary
+        return self
+
+    distance_km = property(lambda self: float(self.kpi[0]), lambda self, v: self.kpi.__setitem__(0, v))
+    duration_min = property(lambda self: float(self.kpi[1]), lambda self, v: self.kpi.__setitem__(1, v))
+    cost_inr = property(lambda self: float(self.kpi[2]), lambda self, v: self.kpi.__setitem__(2, v))
+    emissions_kg = property(lambda self: float(self.kpi[3]), lambda self, v: self.kpi.__setitem__(3, v))
+
+    # dict-compatible view
+    def __getitem__(self, key: str):
+        if key in _KPI_INDEX:
+            return float(self.kpi[_KPI_INDEX[key]])
+        if key in _ROUTE_KEYS:
+            value = getattr(self, key)
+            if value is None:
+                raise KeyError(key)
+            return value
+        if self.extra and key in self.extra:
+            return self.extra[key]
+        raise KeyError(key)
+
+    def __setitem__(self, key: str, value):
+        if key in _KPI_INDEX:
+            self.kpi[_KPI_INDEX[key]] = value
+        elif key == 'steps':
+            self.steps = Steps.from_records(value)
+        elif key == 'coords_latlon':
+            self.coords_latlon = as_latlon_array(value)
+        elif key in _ROUTE_KEYS:
+            setattr(self, key, value)
+        else:
+            if self.extra is None:
+                self.extra = {}
+            self.extra[key] = value
+
+    def __contains__(self, key) -> bool:
+        try:
+            self[key]
+            return True
+        except KeyError:
+            return False
+
+    def get(self, key: str, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def keys(self) -> List[str]:
+        return [k for k in _ROUTE_KEYS if k in self] + list(self.extra or ())
+
+    def items(self):
+        return [(k, self[k]) for k in self.keys()]
+
+    def to_dict(self, steps_as_records: bool=True) -> Dict[str,Any]:
+        d = dict(self.items())
+        if steps_as_records:
+            d['steps'] = self.steps.to_records()
+        return d
+
+    def __copy__(self) -> 'Route':
+        # KPIs are per-copy; coordinates, steps and pending loaders are treated as immutable and shared
+        return Route(self.mode, self.kpi.copy(), self._coords, self._steps, self._roads_summary, self.stations,
+                     dict(self.extra) if self.extra else None)
+
+    @property
+    def nbytes(self) -> int:
+        # materialized arrays only; a pending loader references the provider response, which the route cache owns
+        held = lambda v: 0 if isinstance(v, Deferred) and not v.loaded else _resolve(v).nbytes
+        return self.kpi.nbytes + held(self._coords) + held(self._steps)
+
+
+def as_route(r) -> Route:
+    return r if isinstance(r, Route) else Route.from_dict(r)
+
+
+class RouteSet(Sequence):
+    # Routes whose KPI arrays are rows of one (n, 4) matrix in KPI_FIELDS order, so scoring reads it without copying
+    __slots__ = ('routes', 'kpi')
+
+    def __init__(self, routes: Iterable[Any]=()):
+        self.routes = [as_route(r) for r in routes]
+        self.kpi = np.empty((len(self.routes), len(KPI_FIELDS)), dtype=np.float64)
+        for i, r in enumerate(self.routes):
+            self.kpi[i] = r.kpi
+            r.kpi = self.kpi[i]
+
+    def __len__(self) -> int:
+        return len(self.routes)
+
+    def __getitem__(self, i):
+        return self.routes[i]
+
+    def __iter__(self):
+        return iter(self.routes)
+
+    @property
+    def modes(self) -> np.ndarray:
+        return np.array([r.mode for r in self.routes], dtype=object)
+
+    def column(self, name: str) -> np.ndarray:
+        return self.kpi[:, _KPI_INDEX[name]]
+
+    def kpi_matrix(self) -> np.ndarray:
+        return self.kpi
+
+    @property
+    def nbytes(self) -> int:
+        return self.kpi.nbytes + sum(r.nbytes - r.kpi.nbytes for r in self.routes)
@@ -0,0 +1,100 @@
+import os
+import re
+import sys
+import time
+import argparse
+import importlib
+import subprocess
+import threading
+from typing import Dict, List, Sequence, Tuple
+from metrics import observe
+
+# Heavy dependencies (pandas, altair, folium, the routing pipeline) are imported on the first code path that
+# needs them; lazy_import records how long each first import took. IMPORT_PROFILE=1 adds an import-time
+# report (python -X importtime in a subprocess) to the app's debug sidebar.
+IMPORT_PROFILE = os.environ.get('IMPORT_PROFILE', '0') != '0'
+
+# What app.py needs before the first Compute vs. what it defers
+EAGER_MODULES = ('streamlit', 'metrics', 'places', 'startup', 'warm')
+LAZY_MODULES = ('pandas', 'numpy', 'altair', 'pipeline', 'map_utils', 'routes', 'optimization')
+
+_import_seconds: Dict[str, float] = {}
+_import_lock = threading.Lock()
+
+
+def lazy_import(name: str):
+    module = sys.modules.get(name)
+    if module is not None:
+        return module
+    with _import_lock:
+        start = time.perf_counter()
+        module = importlib.import_module(name)
+        elapsed = time.perf_counter() - start
+    if name not in _import_seconds:
+        _import_seconds[name] = elapsed
+        observe('lazy_import_seconds', elapsed, module=name)
+    return module
+
+
+def lazy_import_times() -> Dict[str, float]:
+    return dict(_import_seconds)
+
+
+_LINE = re.compile(r'^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)')
+
+
+def import_profile(modules: Sequence[str], cwd: str=None) -> List[Tuple[str, float, float, int]]:
+    # (module, self_s, cumulative_s, depth) for every module a fresh interpreter imports, in import order
+    cwd = cwd or os.path.dirname(os.path.abspath(__file__))
+    code = ''.join(f'import {m}\n' for m in modules)
+    proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], cwd=cwd, capture_output=True, text=True)
+    rows = []
+    for line in proc.stderr.splitlines():
+        m = _LINE.match(line)
+        if m:
+            rows.append((m.group(4), int(m.group(1)) / 1e6, int(m.group(2)) / 1e6, (len(m.group(3)) - 1) // 2))
+    return rows
+
+
+def profile_report(eager: Sequence[str]=EAGER_MODULES, lazy: Sequence[str]=LAZY_MODULES, top: int=15) -> Dict[str, object]:
+    # Cold-start cost of the eager set, the extra cost of the lazy set on top of it, and the slowest top-level imports
+    eager_rows = import_profile(eager)
+    all_rows = import_profile(list(eager) + list(lazy))
+    total = lambda rows: sum(r[1] for r in rows)
+    top_level = sorted((r for r in all_rows if r[3] == 0), key=lambda r: -r[2])[:top]
+    return {'eager_s': total(eager_rows), 'eager_modules': len(eager_rows),
+            'lazy_s': total(all_rows) - total(eager_rows), 'lazy_modules': len(all_rows) - len(eager_rows),
+            'top': [{'module': r[0], 'cumulative_s': r[2], 'self_s': r[1]} for r in top_level]}
+
+
+_report = None
+
+
+def cached_profile_report() -> Dict[str, object]:
+    # one subprocess profile per process; the app shows it on every rerun
+    global _report
+    if _report is None:
+        _report = profile_report()
+    return _report
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description='Import-time profile of the app start path (python -X importtime)')
+    ap.add_argument('modules', nargs='*', help='profile these modules instead of the app eager/lazy sets')
+    ap.add_argument('--top', type=int, default=15)
+    args = ap.parse_args(argv)
+    if args.modules:
+        rows = sorted((r for r in import_profile(args.modules) if r[3] == 0), key=lambda r: -r[2])[:args.top]
+        for name, self_s, cum_s, _ in rows:
+            print(f'{name:40s} {cum_s * 1000:10.1f} ms  (self {self_s * 1000:.1f} ms)')
+        return 0
+    rep = profile_report(top=args.top)
+    print(f"eager (before first Compute): {rep['eager_s'] * 1000:8.1f} ms  {rep['eager_modules']} modules")
+    print(f"lazy (first Compute adds):    {rep['lazy_s'] * 1000:8.1f} ms  {rep['lazy_modules']} modules")
+    for row in rep['top']:
+        print(f"  {row['module']:38s} {row['cumulative_s'] * 1000:10.1f} ms")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,188 @@
+import json
+import math
+import time
+import argparse
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from typing import List, Tuple
+from urllib.parse import urlsplit, parse_qs
+from geometry_utils import haversine_km, haversine_matrix, encode_polyline
+
+# Local stand-in for the OSRM demo server and ORS directions API. Routes are synthetic
+# (bent great-circle-ish polylines) but use the real response shapes, so provider code,
+# transport retries and rate limiting can be exercised offline.
+
+
+def synth_path(origin: Tuple[float,float], dest: Tuple[float,float], n_points: int, bend: float=0.0) -> List[Tuple[float,float]]:
+    pts = []
+    for i in range(n_points):
+        t = i / max(n_points - 1, 1)
+        off = bend * math.sin(math.pi * t)
+        lat = origin[0] + (dest[0] - origin[0]) * t + off * (dest[1] - origin[1])
+        lon = origin[1] + (dest[1] - origin[1]) * t - off * (dest[0] - origin[0])
+        pts.append((lat, lon))
+    return pts
+
+
+def _bearing(a, b) -> int:
+    return int(math.degrees(math.atan2(b[1] - a[1], b[0] - a[0]))) % 360
+
+
+def _alternatives(origin, dest, count: int, points_per_km: float, km_per_step: float=5.0):
+    # Steps are sized like real responses (one every few km, with per-step geometry and intersections),
+    # so the parse benchmarks see realistic step payloads on long trips
+    crow = max(haversine_km(origin, dest), 0.01)
+    n_points = max(2, int(crow * points_per_km))
+    n_steps = max(4, int(crow / km_per_step))
+    for k in range(count):
+        bend = (0.0, 0.08, -0.08, 0.15)[k % 4]
+        path = synth_path(origin, dest, n_points, bend)
+        distance_m = crow * 1000.0 * (1.25 + 0.07 * k)
+        duration_s = distance_m / (13.0 - 0.8 * k)
+        steps = []
+        for j in range(n_steps):
+            a, b = j * (n_points - 1) // n_steps, (j + 1) * (n_points - 1) // n_steps
+            seg = path[a:b + 1] if b > a else [path[a], path[a]]
+            bearing = _bearing(seg[0], seg[-1])
+            loc = [round(seg[0][1], 6), round(seg[0][0], 6)]
+            steps.append({
+                'name': f'Stub Road {k}-{j}', 'ref': f'SH{j % 97}', 'mode': 'driving', 'way_points': [a, b],
+                'maneuver': {'type': 'turn' if j else 'depart', 'modifier': 'right' if j % 2 else 'left',
+                             'location': loc, 'bearing_before': bearing, 'bearing_after': bearing},
+                'intersections': [{'location': loc, 'bearings': [bearing, (bearing + 90) % 360, (bearing + 180) % 360],
+                                   'entry': [True, False, True], 'out': 0, 'in': 2}] * 3,
+                'geometry': encode_polyline(seg), 'distance': distance_m / n_steps, 'duration': duration_s / n_steps,
+            })
+        yield path, distance_m, duration_s, steps
+
+
+def osrm_route_response(origin, dest, count: int=3, points_per_km: float=2.0, steps: bool=True):
+    routes = []
+    for path, distance_m, duration_s, route_steps in _alternatives(origin, dest, count, points_per_km):
+        leg = {'distance': distance_m, 'duration': duration_s, 'summary': ', '.join(s['name'] for s in route_steps[:2])}
+        if steps:
+            leg['steps'] = route_steps
+        routes.append({'distance': distance_m, 'duration': duration_s, 'geometry': encode_polyline(path), 'legs': [leg]})
+    return {'code': 'Ok', 'routes': routes}
+
+
+def ors_directions_response(origin, dest, count: int=1, points_per_km: float=2.0, instructions: bool=True):
+    features = []
+    for path, distance_m, duration_s, steps in _alternatives(origin, dest, count, points_per_km):
+        props = {'summary': {'distance': distance_m, 'duration': duration_s}, 'way_points': [0, len(path) - 1]}
+        if instructions:
+            props['segments'] = [{'distance': distance_m, 'duration': duration_s, 'steps': [
+                {'name': s['name'], 'instruction': f"Continue on {s['name']}", 'type': 6, 'distance': s['distance'],
+                 'duration': s['duration'], 'way_points': s['way_points']} for s in steps]}]
+        features.append({'type': 'Feature',
+                         'geometry': {'type': 'LineString', 'coordinates': [[lon, lat] for lat, lon in path]},
+                         'properties': props})
+    return {'type': 'FeatureCollection', 'features': features}
+
+
+def matrix_response(sources, destinations):
+    # road distance ~1.25x great-circle at ~47 km/h, in metres / seconds like both providers
+    dist_m = haversine_matrix(sources, destinations) * 1250.0
+    return {'distances': dist_m.tolist(), 'durations': (dist_m / 13.0).tolist()}
+
+
+class StubConfig:
+    def __init__(self, latency_s: float=0.0, fail_first: int=0, fail_status: int=503, points_per_km: float=2.0,
+                 alternatives: int=3):
+        self.latency_s = latency_s
+        self.fail_first = fail_first
+        self.fail_status = fail_status
+        self.points_per_km = points_per_km
+        self.alternatives = alternatives
+        self.calls = 0
+        self.lock = threading.Lock()
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    config: StubConfig = StubConfig()
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, fmt, *args):
+        pass
+
+    def _send(self, status: int, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _gate(self) -> bool:
+        cfg = self.config
+        with cfg.lock:
+            cfg.calls += 1
+            failing = cfg.calls <= cfg.fail_first
+        if cfg.latency_s:
+            time.sleep(cfg.latency_s)
+        if failing:
+            self._send(cfg.fail_status, {'message': 'stub failure'})
+            return False
+        return True
+
+    def do_GET(self):
+        parsed = urlsplit(self.path)
+        if not parsed.path.startswith(('/route/v1/', '/table/v1/')):
+            return self._send(404, {'message': 'not found'})
+        if not self._gate():
+            return
+        pts = [tuple(map(float, p.split(','))) for p in parsed.path.rsplit('/', 1)[-1].split(';')]
+        if parsed.path.startswith('/table/v1/'):
+            qs = parse_qs(parsed.query)
+            pick = lambda name: [pts[int(i)] for i in qs[name][0].split(';')] if name in qs else pts
+            latlon = lambda ps: [(p[1], p[0]) for p in ps]
+            return self._send(200, dict(matrix_response(latlon(pick('sources')), latlon(pick('destinations'))), code='Ok'))
+        qs = parse_qs(parsed.query)
+        count = self.config.alternatives if qs.get('alternatives', ['false'])[0] == 'true' else 1
+        self._send(200, osrm_route_response((pts[0][1], pts[0][0]), (pts[-1][1], pts[-1][0]), count,
+                                            self.config.points_per_km, qs.get('steps', ['false'])[0] == 'true'))
+
+    def do_POST(self):
+        parsed = urlsplit(self.path)
+        length = int(self.headers.get('Content-Length') or 0)
+        body = json.loads(self.rfile.read(length) or b'{}')
+        if not parsed.path.startswith(('/v2/directions/', '/v2/matrix/')):
+            return self._send(404, {'error': {'message': 'not found'}})
+        if not self._gate():
+            return
+        if parsed.path.startswith('/v2/matrix/'):
+            locs = [(lat, lon) for lon, lat in body['locations']]
+            src = [locs[i] for i in body.get('sources', range(len(locs)))]
+            dst = [locs[i] for i in body.get('destinations', range(len(locs)))]
+            return self._send(200, matrix_response(src, dst))
+        (olon, olat), (dlon, dlat) = body['coordinates'][0], body['coordinates'][-1]
+        alt = body.get('alternative_routes') or {}
+        count = min(int(alt.get('target_count', 1)), self.config.alternatives)
+        self._send(200, ors_directions_response((olat, olon), (dlat, dlon), count, self.config.points_per_km,
+                                                bool(body.get('instructions', True))))
+
+
+def start_stub_server(host: str='127.0.0.1', port: int=0, config: StubConfig=None):
+    handler = type('ConfiguredStubHandler', (StubHandler,), {'config': config or StubConfig()})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f'http://{host}:{server.server_address[1]}'
+
+
+if __name__ == '__main__':
+    ap = argparse.ArgumentParser(description='Local OSRM/ORS stub server')
+    ap.add_argument('--host', default='127.0.0.1')
+    ap.add_argument('--port', type=int, default=5005)
+    ap.add_argument('--latency', type=float, default=0.0)
+    ap.add_argument('--fail-first', type=int, default=0)
+    ap.add_argument('--points-per-km', type=float, default=2.0)
+    args = ap.parse_args()
+    srv, url = start_stub_server(args.host, args.port, StubConfig(args.latency, args.fail_first,
+                                                                  points_per_km=args.points_per_km))
+    print(f'stub server on {url} (set OSRM_BASE_URL / ORS_BASE_URL to this)')
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        srv.shutdown()
@@ -0,0 +1,182 @@
+import os
+import time
+import random
+import threading
+from typing import Dict, Optional
+import requests
+from requests.adapters import HTTPAdapter
+from metrics import inc
+
+# Status codes worth retrying (and counting against the provider's circuit)
+RETRY_STATUS = frozenset({429, 500, 502, 503, 504})
+
+
+class ProviderUnavailable(requests.RequestException):
+    pass
+
+
+class TokenBucket:
+    def __init__(self, rate_per_s: float, burst: float=1.0):
+        self.rate = float(rate_per_s)
+        self.capacity = max(float(burst), 1.0)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, timeout: Optional[float]=None) -> bool:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1.0:
+                    self._tokens -= 1.0
+                    return True
+                wait_s = (1.0 - self._tokens) / self.rate if self.rate > 0 else float('inf')
+            if deadline is not None and now + wait_s > deadline:
+                return False
+            time.sleep(min(wait_s, 1.0))
+
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold: int=5, reset_after_s: float=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_after_s = reset_after_s
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        # start of the single half-open probe in flight, if any
+        self.probe_at: Optional[float] = None
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return 'closed'
+        return 'half-open' if time.monotonic() - self.opened_at >= self.reset_after_s else 'open'
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            now = time.monotonic()
+            if now - self.opened_at < self.reset_after_s:
+                return False
+            # half-open admits one probe; everyone else fails fast until it resolves. A probe that never
+            # reports back (e.g. an unexpected exception) frees the slot after another reset window.
+            if self.probe_at is not None and now - self.probe_at < self.reset_after_s:
+                return False
+            self.probe_at = now
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self.probe_at = None
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.failures >= self.failure_threshold or self.opened_at is not None:
+                # a failed half-open probe re-opens the circuit for another reset window
+                self.opened_at = time.monotonic()
+            self.probe_at = None
+
+    def release(self):
+        # the admitted call ended without reaching the provider; let another caller probe
+        with self._lock:
+            self.probe_at = None
+
+
+class ProviderTransport:
+    def __init__(self, name: str, rate_per_s: float=1.0, burst: float=2.0, max_retries: int=2,
+                 backoff_base_s: float=0.5, backoff_max_s: float=8.0, failure_threshold: int=5,
+                 reset_after_s: float=30.0, pool_size: int=16, max_queue_s: float=30.0):
+        self.name = name
+        self.max_retries = max_retries
+        self.backoff_base_s = backoff_base_s
+        self.backoff_max_s = backoff_max_s
+        self.max_queue_s = max_queue_s
+        self.limiter = TokenBucket(rate_per_s, burst)
+        self.breaker = CircuitBreaker(failure_threshold, reset_after_s)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.requests = self.retries = self.throttled = self.rejected = 0
+
+    def backoff(self, attempt: int) -> float:
+        # full jitter: uniform in [0, min(max, base * 2**attempt)]
+        return random.uniform(0.0, min(self.backoff_max_s, self.backoff_base_s * (2 ** attempt)))
+
+    def request(self, method: str, url: str, **kwargs) -> requests.Response:
+        if not self.breaker.allow():
+            self.rejected += 1
+            inc('transport_rejected_total', provider=self.name)
+            raise ProviderUnavailable(f'{self.name} circuit open after {self.breaker.failures} failures')
+        attempt = 0
+        while True:
+            if not self.limiter.acquire(timeout=self.max_queue_s):
+                self.throttled += 1
+                self.breaker.release()
+                inc('transport_throttled_total', provider=self.name)
+                raise ProviderUnavailable(f'{self.name} rate limit queue exceeded {self.max_queue_s:.0f}s')
+            self.requests += 1
+            resp = None
+            try:
+                resp = self.session.request(method, url, **kwargs)
+            except (requests.ConnectionError, requests.Timeout):
+                if attempt >= self.max_retries:
+                    self.breaker.record_failure()
+                    raise
+            else:
+                if resp.status_code not in RETRY_STATUS:
+                    self.breaker.record_success()
+                    return resp
+                if attempt >= self.max_retries:
+                    self.breaker.record_failure()
+                    return resp
+                retry_after = resp.headers.get('Retry-After', '')
+                if retry_after.isdigit():
+                    time.sleep(min(float(retry_after), self.backoff_max_s))
+                    attempt += 1
+                    self.retries += 1
+                    inc('transport_retries_total', provider=self.name, reason=str(resp.status_code))
+                    continue
+            inc('transport_retries_total', provider=self.name, reason='network' if resp is None else str(resp.status_code))
+            time.sleep(self.backoff(attempt))
+            attempt += 1
+            self.retries += 1
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> requests.Response:
+        return self.request('POST', url, **kwargs)
+
+    def stats(self) -> Dict[str,object]:
+        return {'requests': self.requests, 'retries': self.retries, 'throttled': self.throttled,
+                'rejected': self.rejected, 'circuit': self.breaker.state, 'failures': self.breaker.failures}
+
+
+# Process-wide defaults per provider (OSRM demo policy is ~1 req/s; ORS free tier ~40 directions/min)
+TRANSPORT_DEFAULTS = {
+    'osrm': {'rate_per_s': float(os.environ.get('OSRM_RATE_PER_S', 1.0)), 'burst': 2.0},
+    'ors': {'rate_per_s': float(os.environ.get('ORS_RATE_PER_S', 0.66)), 'burst': 2.0},
+}
+
+_transports: Dict[str, ProviderTransport] = {}
+_transports_lock = threading.Lock()
+
+
+def get_transport(name: str) -> ProviderTransport:
+    with _transports_lock:
+        if name not in _transports:
+            _transports[name] = ProviderTransport(name, **TRANSPORT_DEFAULTS.get(name, {}))
+        return _transports[name]
+
+
+def set_transport(name: str, transport: ProviderTransport):
+    with _transports_lock:
+        _transports[name] = transport
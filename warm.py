@@ -0,0 +1,281 @@
+import os
+import sys
+import json
+import time
+import sqlite3
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from itertools import product
+from typing import Dict, Any, List, Tuple, Optional, Iterable, Iterator, TYPE_CHECKING
+
+from metrics import inc, observe
+import fastjson
+if TYPE_CHECKING:
+    from routes import Route
+
+# Precomputed fetch-stage output (per mode) for popular OD pairs, by default the sidebar's static catalog.
+# pipeline.fetch_stage reads it before calling any provider; `python warm.py` (or WARM_ON_START=1 in the app)
+# fills it. WARM_STORE_PATH='' disables the store.
+WARM_STORE_PATH = os.environ.get('WARM_STORE_PATH', os.path.join(os.path.expanduser('~'), '.cache', 'multimodal_warm.sqlite'))
+WARM_TTL_S = float(os.environ.get('WARM_TTL_S', 24 * 3600))
+# Few workers: provider calls still go through transport rate limits, and the warmer should not crowd out users
+WARM_WORKERS = int(os.environ.get('WARM_WORKERS', 2))
+WARM_ON_START = os.environ.get('WARM_ON_START', '0') != '0'
+# Seconds between incremental refresh passes of the background warmer
+WARM_INTERVAL_S = float(os.environ.get('WARM_INTERVAL_S', 3600))
+
+WARM_MODES = ('road', 'rail', 'flight')
+
+
+def entry_key(mode: str, origin, dest, has_ors_key: bool, avoid_tolls: bool, precision: int=5) -> str:
+    # rail/flight itineraries do not depend on the road provider options
+    q = lambda p: [round(float(p[0]), precision), round(float(p[1]), precision)]
+    opts = [bool(has_ors_key), bool(avoid_tolls)] if mode == 'road' else []
+    return json.dumps([mode, q(origin), q(dest), opts], separators=(',', ':'))
+
+
+class WarmStore:
+    def __init__(self, path: str=WARM_STORE_PATH, ttl_s: float=WARM_TTL_S):
+        self.path = path
+        self.ttl_s = ttl_s
+        self._lock = threading.Lock()
+        self._db = self._open(path)
+
+    @staticmethod
+    def _open(path: str):
+        try:
+            if path != ':memory:':
+                os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            db = sqlite3.connect(path, check_same_thread=False, timeout=5)
+            db.execute('PRAGMA journal_mode=WAL')
+            db.execute('CREATE TABLE IF NOT EXISTS warm (key TEXT PRIMARY KEY, value TEXT NOT NULL, '
+                       'expires REAL NOT NULL, updated REAL NOT NULL)')
+            db.commit()
+            return db
+        except (sqlite3.Error, OSError):
+            return None
+
+    def get(self, key: str) -> Optional[List['Route']]:
+        if self._db is None:
+            return None
+        with self._lock:
+            try:
+                row = self._db.execute('SELECT value, expires FROM warm WHERE key=?', (key,)).fetchone()
+            except sqlite3.Error:
+                row = None
+        if row is None or row[1] <= time.time():
+            inc('warm_store_lookups_total', result='miss' if row is None else 'expired')
+            return None
+        inc('warm_store_lookups_total', result='hit')
+        from routes import Route
+        return [Route.from_record(rec) for rec in fastjson.loads(row[0])]
+
+    def get_modes(self, origin, dest, modes: Iterable[str], has_ors_key: bool, avoid_tolls: bool) -> Dict[str, List['Route']]:
+        out = {}
+        for mode in modes:
+            routes = self.get(entry_key(mode, origin, dest, has_ors_key, avoid_tolls))
+            if routes is not None:
+                out[mode] = routes
+        return out
+
+    def put(self, key: str, routes: List['Route'], ttl_s: Optional[float]=None):
+        if self._db is None:
+            return
+        now = time.time()
+        value = fastjson.dumps([r.to_record() for r in routes])
+        with self._lock:
+            try:
+                self._db.execute('INSERT OR REPLACE INTO warm (key, value, expires, updated) VALUES (?,?,?,?)',
+                                 (key, value, now + (self.ttl_s if ttl_s is None else ttl_s), now))
+                self._db.commit()
+            except sqlite3.Error:
+                pass
+
+    def stale(self, keys: Iterable[str]) -> List[str]:
+        # keys that are missing or expired, in input order
+        keys = list(keys)
+        if self._db is None:
+            return keys
+        now, fresh = time.time(), set()
+        with self._lock:
+            try:
+                for i in range(0, len(keys), 500):
+                    chunk = keys[i:i + 500]
+                    rows = self._db.execute(f'SELECT key FROM warm WHERE expires>? AND key IN ({",".join("?" * len(chunk))})',
+                                            [now] + chunk).fetchall()
+                    fresh.update(r[0] for r in rows)
+            except sqlite3.Error:
+                pass
+        return [k for k in keys if k not in fresh]
+
+    def purge_expired(self) -> int:
+        if self._db is None:
+            return 0
+        with self._lock:
+            try:
+                n = self._db.execute('DELETE FROM warm WHERE expires<=?', (time.time(),)).rowcount
+                self._db.commit()
+                return n
+            except sqlite3.Error:
+                return 0
+
+    def stats(self) -> Dict[str,Any]:
+        if self._db is None:
+            return {'entries': 0, 'fresh': 0}
+        with self._lock:
+            total, fresh = self._db.execute('SELECT COUNT(*), SUM(expires>?) FROM warm', (time.time(),)).fetchone()
+        return {'entries': total, 'fresh': fresh or 0}
+
+
+_store: Optional[WarmStore] = None
+_store_lock = threading.Lock()
+
+
+def get_warm_store() -> Optional[WarmStore]:
+    global _store
+    if not WARM_STORE_PATH:
+        return None
+    with _store_lock:
+        if _store is None:
+            _store = WarmStore()
+        return _store
+
+
+def set_warm_store(store: Optional[WarmStore]):
+    global _store
+    with _store_lock:
+        _store = store
+
+
+def catalog_pairs() -> Iterator[Tuple[Tuple[float,float], Tuple[float,float]]]:
+    from places import STATIC_FROM, STATIC_TO
+    for o, d in product(STATIC_FROM.values(), STATIC_TO.values()):
+        if tuple(o) != tuple(d):
+            yield tuple(o), tuple(d)
+
+
+def read_pairs(path: str) -> Iterator[Tuple[Tuple[float,float], Tuple[float,float]]]:
+    # same input formats as batch.py
+    from batch import read_pairs as read_batch_pairs
+    for rec in read_batch_pairs(path):
+        o, d = (float(rec['origin_lat']), float(rec['origin_lon'])), (float(rec['dest_lat']), float(rec['dest_lon']))
+        if o != d:
+            yield o, d
+
+
+def warm(pairs: Iterable[Tuple[Tuple[float,float], Tuple[float,float]]], modes: Iterable[str]=WARM_MODES,
+         ors_api_key: str='', avoid_tolls: bool=False, store: Optional[WarmStore]=None, workers: int=WARM_WORKERS,
+         force: bool=False) -> Dict[str,int]:
+    # Incremental: only (pair, mode) entries that are missing or expired are fetched, unless force
+    from providers import fetch_mode_routes, road_provider_results, merge_road_results
+    from pipeline import MAX_ALT_TARGET
+    store = store or get_warm_store()
+    modes = [m for m in WARM_MODES if m in set(modes)]
+    jobs: Dict[Tuple, List[str]] = {}
+    keys = {}
+    for o, d in pairs:
+        for m in modes:
+            keys[entry_key(m, o, d, bool(ors_api_key), avoid_tolls)] = (o, d, m)
+    todo = list(keys) if force else store.stale(keys)
+    for k in todo:
+        o, d, m = keys[k]
+        jobs.setdefault((o, d), []).append(m)
+    counts = {'entries': len(keys), 'fresh': len(keys) - len(todo), 'stored': 0, 'partial': 0, 'empty': 0, 'failed': 0}
+    lock = threading.Lock()
+
+    def fetch(pair, pair_modes) -> Tuple[Dict[str, List], bool]:
+        # road comes per provider so the entry is kept only when the provider that owns the key answered
+        # (ORS when a key is set, else OSRM); a fallback-only result would otherwise shadow it for WARM_TTL_S
+        other = [m for m in pair_modes if m != 'road']
+        fetched = fetch_mode_routes(pair[0], pair[1], other, MAX_ALT_TARGET, ors_api_key, avoid_tolls) if other else {}
+        owner_answered = False
+        if 'road' in pair_modes:
+            results = road_provider_results(pair[0], pair[1], MAX_ALT_TARGET, ors_api_key, avoid_tolls)
+            fetched['road'] = merge_road_results(results, MAX_ALT_TARGET)
+            owner_answered = bool(results.get('ors' if ors_api_key else 'osrm'))
+        return fetched, owner_answered
+
+    def run(pair, pair_modes):
+        start = time.perf_counter()
+        try:
+            fetched, owner_answered = fetch(pair, pair_modes)
+        except Exception:
+            with lock:
+                counts['failed'] += len(pair_modes)
+            return
+        for m in pair_modes:
+            routes = fetched.get(m, [])
+            # empty or partial results are usually provider errors; leave them stale so the next pass retries
+            if not routes:
+                outcome = 'empty'
+            elif m == 'road' and (not owner_answered or len(routes) < MAX_ALT_TARGET):
+                outcome = 'partial'
+            else:
+                outcome = 'stored'
+                store.put(entry_key(m, pair[0], pair[1], bool(ors_api_key), avoid_tolls), routes)
+            with lock:
+                counts[outcome] += 1
+        observe('warm_pair_seconds', time.perf_counter() - start)
+
+    with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix='route-warm') as pool:
+        list(pool.map(lambda job: run(*job), jobs.items()))
+    inc('warm_entries_stored_total', counts['stored'])
+    return counts
+
+
+def warm_forever(pairs_fn=catalog_pairs, interval_s: float=WARM_INTERVAL_S, stop: Optional[threading.Event]=None, **kwargs):
+    stop = stop or threading.Event()
+    while not stop.is_set():
+        warm(pairs_fn(), **kwargs)
+        stop.wait(interval_s)
+
+
+_warmer: Optional[threading.Thread] = None
+_warmer_lock = threading.Lock()
+
+
+def ensure_background_warmer(ors_api_key: str='') -> bool:
+    # Started once per process, only when WARM_ON_START is set and the store is enabled
+    global _warmer
+    if not WARM_ON_START or get_warm_store() is None:
+        return False
+    with _warmer_lock:
+        if _warmer is None:
+            _warmer = threading.Thread(target=warm_forever, kwargs={'ors_api_key': ors_api_key}, daemon=True, name='route-warmer')
+            _warmer.start()
+    return True
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description='Precompute routes for the static OD catalog (or a pairs file) into the warm store')
+    ap.add_argument('--pairs', default=None, help='CSV/JSONL with origin_lat, origin_lon, dest_lat, dest_lon (default: static catalog)')
+    ap.add_argument('--modes', default=','.join(WARM_MODES))
+    ap.add_argument('--avoid-tolls', action='store_true')
+    ap.add_argument('--workers', type=int, default=WARM_WORKERS)
+    ap.add_argument('--force', action='store_true', help='refetch fresh entries too')
+    ap.add_argument('--loop', type=float, default=0.0, help='repeat every N seconds (incremental refresh)')
+    ap.add_argument('--purge', action='store_true', help='delete expired entries first')
+    args = ap.parse_args(argv)
+    store = get_warm_store()
+    if store is None:
+        print('WARM_STORE_PATH is empty; nothing to do', file=sys.stderr)
+        return 1
+    if args.purge:
+        print(f'purged {store.purge_expired()} expired entries', file=sys.stderr)
+    pairs_fn = (lambda: read_pairs(args.pairs)) if args.pairs else catalog_pairs
+    opts = {'modes': [m.strip() for m in args.modes.split(',') if m.strip()], 'ors_api_key': os.environ.get('ORS_API_KEY', ''),
+            'avoid_tolls': args.avoid_tolls, 'store': store, 'workers': args.workers}
+    while True:
+        start = time.monotonic()
+        counts = warm(pairs_fn(), force=args.force, **opts)
+        print(f"[warm] entries={counts['entries']} fresh={counts['fresh']} stored={counts['stored']} "
+              f"partial={counts['partial']} empty={counts['empty']} failed={counts['failed']} elapsed={time.monotonic() - start:.1f}s", file=sys.stderr)
+        if args.loop <= 0:
+            return 1 if counts['failed'] and not counts['stored'] else 0
+        args.force = False
+        time.sleep(args.loop)
+
+
+if __name__ == '__main__':
+    sys.exit(main())